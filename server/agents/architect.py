@@ -4,7 +4,7 @@ Generates personalized practice questions based on weak areas
 Uses gemini-2.5-pro for complex reasoning
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import json
 import logging
 
@@ -122,3 +122,69 @@ Generate questions that will help this specific student improve. Make them CAT-w
     except Exception as e:
         logger.error(f"Architect Agent error: {e}")
         return fallback_response("architect", str(e))
+
+
+async def generate_batch(
+    section: str,
+    difficulty: str,
+    count: int,
+    topics: Optional[List[str]] = None,
+    exemplars: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Generate a fixed-size batch of questions for one section (one shard of a test)
+    
+    Args:
+        section: CAT section (VARC, DILR, QA)
+        difficulty: easy, medium or hard
+        count: Number of questions to generate
+        topics: Preferred topics (only those belonging to the section are used)
+        exemplars: Relevant stored questions shown as format/quality examples
+        
+    Returns:
+        Generated questions with status
+    """
+    
+    topic_line = ", ".join(topics) if topics else "Common CAT topics for this section"
+    example_block = ""
+    if exemplars:
+        example_block = f"""
+### Example Questions (match this format and quality, do not copy)
+```json
+{json.dumps(exemplars, indent=2, default=str)}
+```
+"""
+    
+    prompt = f"""## YOUR TASK
+
+Generate exactly **{count} CAT practice questions**.
+
+### Constraints
+- **Section**: {section} (every question must belong to this section)
+- **Difficulty**: {difficulty}
+- **Topics**: {topic_line} (ignore any topic that does not belong to {section})
+- Include at least 1 TITA question if the section allows it
+- Each question must have a detailed explanation and plausible distractors
+{example_block}
+Return the JSON structure described in your instructions with exactly {count} questions."""
+
+    try:
+        result = await generate_with_retry(
+            model=get_model_for_task("question_generation"),
+            prompt=prompt,
+            system_instruction=ARCHITECT_SYSTEM_PROMPT,
+            temperature=0.75,
+            max_retries=3,
+            response_format="json"
+        )
+        
+        if "questions" not in result or not isinstance(result["questions"], list):
+            result["questions"] = []
+        result["generatedQuestions"] = len(result["questions"])
+        result["status"] = "success"
+        logger.info(f"Architect: Generated {result['generatedQuestions']}/{count} {section} questions")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Architect batch generation error ({section}): {e}")
+        return fallback_response("architect", str(e))
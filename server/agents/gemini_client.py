@@ -35,6 +35,11 @@ class RateLimiter:
         self.last_update = time.time()
         self.lock = asyncio.Lock()
     
+    def available(self) -> float:
+        """Tokens available right now, including the refill since the last acquire (read-only)"""
+        time_passed = time.time() - self.last_update
+        return min(self.burst_limit, self.tokens + (time_passed * self.rpm / 60))
+    
     async def acquire(self):
         """Wait until a token is available"""
         async with self.lock:
@@ -0,0 +1,82 @@
+"""
+API Dependencies
+Shared FastAPI dependencies: cached JWT verification and current-user loading
+"""
+
+import time
+from typing import Dict, Any, Optional
+
+from fastapi import Depends, HTTPException, Request
+from jose import jwt, JWTError
+
+from config.settings import get_settings
+from services.lru_cache import LRUCache
+from services.user_cache import get_user
+
+settings = get_settings()
+
+# token -> verified payload; entries are honoured only until the token's `exp`
+_verified_tokens = LRUCache(maxsize=settings.token_cache_size)
+
+
+def verify_token(token: str) -> dict:
+    """Verify JWT token and return payload (cached until it expires)"""
+    payload = _verified_tokens.get(token)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return payload
+        _verified_tokens.pop(token)
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    try:
+        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if "exp" in payload:
+        _verified_tokens.set(token, payload)
+    return payload
+
+
+def _bearer_token(request: Request) -> Optional[str]:
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return None
+    _, _, token = auth_header.partition(" ")
+    return token.strip() or None
+
+
+def token_payload(request: Request) -> Dict[str, Any]:
+    """Verified JWT payload of the request (401 without a valid bearer token)"""
+    token = _bearer_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return verify_token(token)
+
+
+def optional_token_payload(request: Request) -> Optional[Dict[str, Any]]:
+    """Verified JWT payload, or None for anonymous or invalid requests"""
+    token = _bearer_token(request)
+    if not token:
+        return None
+    try:
+        return verify_token(token)
+    except HTTPException:
+        return None
+
+
+def current_user_id(payload: Dict[str, Any] = Depends(token_payload)) -> str:
+    """Id of the authenticated user"""
+    return payload["sub"]
+
+
+async def current_user(user_id: str = Depends(current_user_id)) -> Dict[str, Any]:
+    """Authenticated user's document (short-lived cache; treat as read-only)"""
+    user = await get_user(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+def token_cache_stats() -> Dict[str, Any]:
+    return _verified_tokens.stats()
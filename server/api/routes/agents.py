@@ -3,16 +3,19 @@ AI Agents Routes
 Endpoints for running and monitoring AI agent analysis
 """
 
-from fastapi import APIRouter, HTTPException, Request, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
 
 from db.mongodb import get_attempts_collection
-from api.routes.auth import verify_token
+from api.dependencies import current_user_id, token_payload
 # Import centralized service
 from services.analysis_service import run_analysis_pipeline, analysis_jobs, init_job_status
+from services.answer_keys import get_answer_key
+from services.test_snapshot import get_snapshot
+from services.agent_outputs import hydrate_analysis
 
 router = APIRouter()
 
@@ -29,17 +32,8 @@ class AgentStatus(BaseModel):
 
 
 @router.post("/analyze")
-async def run_analysis(req: AnalyzeRequest, request: Request, background_tasks: BackgroundTasks):
+async def run_analysis(req: AnalyzeRequest, background_tasks: BackgroundTasks, user_id: str = Depends(current_user_id)):
     """Start AI agent analysis for a test attempt"""
-    # Verify auth
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
-    user_id = payload["sub"]
-    
     # Get attempt
     attempts_col = get_attempts_collection()
     attempt = await attempts_col.find_one({"_id": ObjectId(req.attemptId)})
@@ -65,29 +59,23 @@ async def run_analysis(req: AnalyzeRequest, request: Request, background_tasks:
 
 
 @router.get("/status/{job_id}")
-async def get_analysis_status(job_id: str, request: Request):
+async def get_analysis_status(job_id: str, payload: dict = Depends(token_payload)):
     """Get status of an analysis job"""
-    # Verify auth
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    verify_token(auth_header.split(" ")[1])
-    
     if job_id not in analysis_jobs:
         # Check if analysis is stored in attempt
         attempts_col = get_attempts_collection()
-        attempt = await attempts_col.find_one({"_id": ObjectId(job_id)})
+        attempt = await attempts_col.find_one({"_id": ObjectId(job_id)}, {"aiAnalysis": 1})
         
         if attempt and attempt.get("aiAnalysis"):
+            analysis = await hydrate_analysis(attempt["aiAnalysis"])
             return {
                 "jobId": job_id,
                 "status": "completed",
                 "agents": {
-                    "architect": {"status": "completed", "output": attempt["aiAnalysis"].get("architect")},
-                    "detective": {"status": "completed", "output": attempt["aiAnalysis"].get("detective")},
-                    "tutor": {"status": "completed", "output": attempt["aiAnalysis"].get("tutor")},
-                    "strategist": {"status": "completed", "output": attempt["aiAnalysis"].get("strategist")},
+                    "architect": {"status": "completed", "output": analysis.get("architect")},
+                    "detective": {"status": "completed", "output": analysis.get("detective")},
+                    "tutor": {"status": "completed", "output": analysis.get("tutor")},
+                    "strategist": {"status": "completed", "output": analysis.get("strategist")},
                 }
             }
         
@@ -108,19 +96,10 @@ class TutorChatRequest(BaseModel):
 
 
 @router.post("/tutor/chat")
-async def tutor_chat(req: TutorChatRequest, request: Request):
+async def tutor_chat(req: TutorChatRequest, user_id: str = Depends(current_user_id)):
     """Interactive chat with AI Tutor for a specific question"""
     from agents import tutor
     
-    # Verify auth
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
-    user_id = payload["sub"]
-    
     # Get attempt
     attempts_col = get_attempts_collection()
     attempt = await attempts_col.find_one({"_id": ObjectId(req.attemptId)})
@@ -137,20 +116,33 @@ async def tutor_chat(req: TutorChatRequest, request: Request):
         raise HTTPException(status_code=400, detail="Invalid question index")
     
     question_response = responses[req.questionIndex]
+    question_id = str(question_response.get("questionId"))
+    
+    # Correct answer from the cached answer key, question text from the test snapshot
+    answer_key = await get_answer_key(str(attempt["testId"]), [question_id])
+    key_entry = answer_key.get(question_id, {})
+    snapshot = await get_snapshot(str(attempt["testId"]))
+    snapshot_question = {}
+    snapshot_passage = None
+    if snapshot:
+        snapshot_question = next(
+            (q for q in snapshot.payload["questions"] if q["id"] == question_id), {}
+        )
+        snapshot_passage = snapshot.payload.get("passages", {}).get(snapshot_question.get("passageId"))
     
     # Build question object for tutor
     question_data = {
-        "section": question_response.get("section", "General"),
-        "topic": question_response.get("topic", "General"),
-        "difficulty": question_response.get("difficulty", "medium"),
-        "type": question_response.get("type", "MCQ"),
-        "passage": question_response.get("passage"),
-        "question": question_response.get("questionText", ""),
-        "options": question_response.get("options"),
-        "correctAnswer": question_response.get("correctAnswer"),
+        "section": key_entry.get("section", question_response.get("section", "General")),
+        "topic": key_entry.get("topic", question_response.get("topic", "General")),
+        "difficulty": key_entry.get("difficulty", question_response.get("difficulty", "medium")),
+        "type": key_entry.get("type", question_response.get("type", "MCQ")),
+        "passage": snapshot_passage or question_response.get("passage"),
+        "question": snapshot_question.get("question", question_response.get("questionText", "")),
+        "options": snapshot_question.get("options", question_response.get("options")),
+        "correctAnswer": key_entry.get("correctAnswer", question_response.get("correctAnswer")),
     }
     
-    student_answer = question_response.get("selectedAnswer", "Not answered")
+    student_answer = question_response.get("answer") or question_response.get("selectedAnswer") or "Not answered"
     
     # Call tutor agent
     result = await tutor.explain_question(question_data, student_answer)
@@ -6,7 +6,7 @@ Google OAuth 2.0 + JWT token management
 from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from fastapi.responses import RedirectResponse
 from datetime import datetime, timedelta
-from jose import jwt, JWTError
+from jose import jwt
 from authlib.integrations.starlette_client import OAuth
 from pydantic import BaseModel
 from typing import Optional
@@ -14,6 +14,8 @@ from bson import ObjectId
 
 from config.settings import get_settings
 from db.mongodb import get_users_collection
+from api.dependencies import current_user, current_user_id, verify_token  # verify_token re-exported for older imports
+from services.user_cache import invalidate_user
 
 router = APIRouter()
 settings = get_settings()
@@ -51,15 +53,6 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_algorithm)
 
 
-def verify_token(token: str) -> dict:
-    """Verify JWT token and return payload"""
-    try:
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        return payload
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-
 @router.get("/google")
 async def google_login(request: Request):
     """Initiate Google OAuth flow"""
@@ -88,6 +81,7 @@ async def google_callback(request: Request):
                 {"_id": existing_user["_id"]},
                 {"$set": {"updatedAt": datetime.utcnow()}}
             )
+            await invalidate_user(user_id)
         else:
             # Create new user
             new_user = {
@@ -121,21 +115,8 @@ async def google_callback(request: Request):
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(request: Request):
+async def get_current_user(user: dict = Depends(current_user)):
     """Get current authenticated user"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
-    
-    users = get_users_collection()
-    user = await users.find_one({"_id": ObjectId(payload["sub"])})
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     return UserResponse(
         id=str(user["_id"]),
         email=user["email"],
@@ -153,23 +134,17 @@ async def logout():
 
 # Dummy unlock for development
 @router.post("/unlock/{plan}")
-async def dummy_unlock(plan: str, request: Request):
+async def dummy_unlock(plan: str, user_id: str = Depends(current_user_id)):
     """Dummy unlock Pro/Premium for development"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
-    
     if plan not in ["pro", "premium", "free"]:
         raise HTTPException(status_code=400, detail="Invalid plan")
     
     users = get_users_collection()
     await users.update_one(
-        {"_id": ObjectId(payload["sub"])},
+        {"_id": ObjectId(user_id)},
         {"$set": {"subscription": plan, "updatedAt": datetime.utcnow()}}
     )
+    await invalidate_user(user_id)
     
     return {"message": f"Unlocked {plan} plan", "subscription": plan}
 
@@ -199,6 +174,7 @@ async def dev_login(data: DevLoginRequest):
             {"_id": existing_user["_id"]},
             {"$set": {"updatedAt": datetime.utcnow()}}
         )
+        await invalidate_user(user_id)
         user_data = existing_user
     else:
         new_user = {
@@ -10,10 +10,21 @@ from typing import List, Optional
 from datetime import datetime
 import json
 import logging
+from bson import ObjectId
 
 from db.mongodb import get_questions_collection
+from api.serialization import MongoJSONResponse
 from agents.gemini_client import generate_with_retry, get_model_for_task
 from agents.prompts import ARCHITECT_SYSTEM_PROMPT
+from services.answer_keys import prime_answer_key
+from services.question_inventory import draw_for_sections, consume_claim, release_claim, inventory_stats
+from services.question_bank import insert_questions, unique_ids
+from services.question_dedup import dedup_index
+from services.exemplar_index import exemplar_index, find_exemplars, EXEMPLAR_PROJECTION
+from services.question_catalog import question_catalog
+from services.passages import attach_passages
+from services.response_caches import tests_changed
+from services.topic_catalog import topic_catalog
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -30,17 +41,22 @@ class GenerateRequest(BaseModel):
 
 async def fetch_sample_questions_from_db(
     sections: Optional[List[str]] = None,
-    limit: int = 10
+    limit: int = 10,
+    topics: Optional[List[str]] = None,
+    difficulty: Optional[str] = None
 ) -> List[dict]:
-    """Fetch sample questions from MongoDB"""
+    """Fetch sample questions, ranked by topic relevance once the exemplar index is loaded"""
+    if exemplar_index.doc_ids:
+        return await find_exemplars(sections, topics, difficulty, limit)
+    
     questions_col = get_questions_collection()
     
     query = {}
     if sections:
         query["section"] = {"$in": [s.upper() for s in sections]}
     
-    cursor = questions_col.find(query).limit(limit)
-    questions = await cursor.to_list(length=limit)
+    cursor = questions_col.find(query, EXEMPLAR_PROJECTION).limit(limit)
+    questions = await attach_passages(await cursor.to_list(length=limit))
     
     # Convert ObjectId to string for JSON serialization
     for q in questions:
@@ -52,56 +68,49 @@ async def fetch_sample_questions_from_db(
 @router.get("/sample")
 async def get_sample_questions(
     section: Optional[str] = None,
+    topic: Optional[str] = None,
+    difficulty: Optional[str] = None,
     count: int = 5
 ):
-    """Get sample questions from database"""
+    """Get a random sample of questions from the database"""
     try:
-        sections = [section] if section else None
-        questions = await fetch_sample_questions_from_db(sections, count)
+        if question_catalog.loaded:
+            # Pick ids from the in-memory catalog, then fetch just those documents
+            matches = question_catalog.filter(section=section, topic=topic, difficulty=difficulty)
+            question_ids = question_catalog.sample(matches, count)
+            questions = await get_questions_collection().find(
+                {"_id": {"$in": [ObjectId(qid) for qid in question_ids]}},
+                EXEMPLAR_PROJECTION
+            ).to_list(length=count)
+            await attach_passages(questions)
+            for q in questions:
+                q["id"] = str(q.pop("_id"))
+        else:
+            sections = [section] if section else None
+            questions = await fetch_sample_questions_from_db(sections, count, [topic] if topic else None, difficulty)
         
-        return {
+        return MongoJSONResponse({
             "success": True,
             "source": "database",
             "count": len(questions),
             "questions": questions
-        }
+        })
     except Exception as e:
         logger.error(f"Error fetching sample questions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/generate")
-async def generate_questions(config: GenerateRequest):
+async def generate_with_llm(config: GenerateRequest, count: int, sample_questions: List[dict]) -> dict:
     """
-    Generate personalized practice questions using Gemini LLM
-    Uses sample questions from database as context
+    Generate `count` questions with a single Gemini call
+    Returns the raw LLM result with a normalized "questions" list
     """
-    
-    # Fetch sample questions from database for context
-    try:
-        sample_questions = await fetch_sample_questions_from_db(
-            sections=config.sections,
-            limit=6
-        )
-    except Exception as e:
-        logger.warning(f"Could not fetch samples from DB: {e}")
-        sample_questions = []
-    
-    # If AI disabled or no samples, return database samples
-    if not config.use_ai:
-        return {
-            "success": True,
-            "source": "database",
-            "count": len(sample_questions),
-            "questions": sample_questions[:config.count]
-        }
-    
     # Format samples for LLM context
-    # Take only 2 samples to keep prompt short
+    # Take only the 2 most relevant samples to keep prompt short
     sample_context = json.dumps(sample_questions[:2], indent=2, default=str) if sample_questions else "[]"
     
     # Build a concise generation prompt
-    prompt = f"""Generate {config.count} CAT exam practice questions.
+    prompt = f"""Generate {count} CAT exam practice questions.
 
 REQUIREMENTS:
 - Section(s): {', '.join(config.sections)}
@@ -127,138 +136,179 @@ OUTPUT: Return valid JSON with this structure:
       "explanation": "Solution explanation"
     }}
   ],
-  "message": "Generated {config.count} questions"
+  "message": "Generated {count} questions"
 }}"""
 
-    try:
-        logger.info("=" * 60)
-        logger.info("🤖 QUESTION GENERATION REQUEST")
-        logger.info("=" * 60)
-        logger.info(f"Sections: {config.sections}")
-        logger.info(f"Topics: {config.topics}")
-        logger.info(f"Difficulty: {config.difficulty}")
-        logger.info(f"Count: {config.count}")
-        logger.info(f"Sample questions from DB: {len(sample_questions)}")
-        logger.info("-" * 60)
-        logger.info("PROMPT SENT TO LLM:")
-        logger.info("-" * 60)
-        logger.info(prompt[:500] + "..." if len(prompt) > 500 else prompt)
-        logger.info("-" * 60)
-        
-        # Call Gemini API using existing infrastructure
-        model_name = get_model_for_task("question_generation")
-        logger.info(f"Using model: {model_name}")
-        
-        result = await generate_with_retry(
-            model=model_name,
-            prompt=prompt,
-            system_instruction=ARCHITECT_SYSTEM_PROMPT,
-            temperature=0.8,
-            max_retries=3,
-            response_format="json"
-        )
-        
-        # CRITICAL DEBUG: Print the entire result
-        print("=" * 60)
-        print("🔍 RAW LLM RESULT:")
-        print("=" * 60)
-        print(f"Result type: {type(result)}")
-        print(f"Result keys: {list(result.keys()) if isinstance(result, dict) else 'NOT A DICT'}")
-        print(f"Full result: {json.dumps(result, indent=2, default=str)[:3000]}")
-        print("=" * 60)
-        
-        logger.info("=" * 60)
-        logger.info("✅ LLM RESPONSE RECEIVED")
-        logger.info("=" * 60)
-        logger.info(f"Response keys: {list(result.keys())}")
-        logger.info(f"Generated questions count: {result.get('generatedQuestions', 'N/A')}")
-        logger.info(f"Target topics: {result.get('targetTopics', [])}")
-        logger.info(f"Message: {result.get('message', 'N/A')}")
-        
-        questions = result.get("questions", [])
-        print(f"Questions extracted: {len(questions)} questions")
-        
-        # If questions is empty, check for parsing issues or alternative structures
-        if not questions:
-            print("⚠️ No 'questions' key found or empty. Checking alternative structures...")
-            
-            # Handle case where JSON parsing failed and we have raw_response
-            if "raw_response" in result:
-                print("  Found 'raw_response' - attempting to parse...")
-                raw = result.get("raw_response", "")
-                try:
-                    # Try to extract JSON from the raw response
-                    import re
-                    # Find JSON object in the response
-                    json_match = re.search(r'\{[\s\S]*\}', raw)
-                    if json_match:
-                        parsed = json.loads(json_match.group())
-                        questions = parsed.get("questions", [])
-                        print(f"  Successfully parsed raw_response: {len(questions)} questions")
-                except Exception as parse_err:
-                    print(f"  Failed to parse raw_response: {parse_err}")
-            
-            # Try alternative keys
-            if not questions and "generated_questions" in result:
-                questions = result.get("generated_questions", [])
-                print(f"  Found 'generated_questions': {len(questions)}")
-            elif not questions and "data" in result and isinstance(result["data"], list):
-                questions = result["data"]
-                print(f"  Found 'data': {len(questions)}")
-            # Check if the whole result is an array
-            elif not questions and isinstance(result, list):
-                questions = result
-                print(f"  Result IS the questions array: {len(questions)}")
-        
-        logger.info(f"Questions array length: {len(questions)}")
+    logger.info("=" * 60)
+    logger.info("🤖 QUESTION GENERATION REQUEST")
+    logger.info("=" * 60)
+    logger.info(f"Sections: {config.sections}")
+    logger.info(f"Topics: {config.topics}")
+    logger.info(f"Difficulty: {config.difficulty}")
+    logger.info(f"Count: {count}")
+    logger.info(f"Sample questions from DB: {len(sample_questions)}")
+    logger.info("-" * 60)
+    logger.info("PROMPT SENT TO LLM:")
+    logger.info("-" * 60)
+    logger.info(prompt[:500] + "..." if len(prompt) > 500 else prompt)
+    logger.info("-" * 60)
+    
+    # Call Gemini API using existing infrastructure
+    model_name = get_model_for_task("question_generation")
+    logger.info(f"Using model: {model_name}")
+    
+    result = await generate_with_retry(
+        model=model_name,
+        prompt=prompt,
+        system_instruction=ARCHITECT_SYSTEM_PROMPT,
+        temperature=0.8,
+        max_retries=3,
+        response_format="json"
+    )
+    
+    # CRITICAL DEBUG: Print the entire result
+    print("=" * 60)
+    print("🔍 RAW LLM RESULT:")
+    print("=" * 60)
+    print(f"Result type: {type(result)}")
+    print(f"Result keys: {list(result.keys()) if isinstance(result, dict) else 'NOT A DICT'}")
+    print(f"Full result: {json.dumps(result, indent=2, default=str)[:3000]}")
+    print("=" * 60)
+    
+    logger.info("=" * 60)
+    logger.info("✅ LLM RESPONSE RECEIVED")
+    logger.info("=" * 60)
+    logger.info(f"Response keys: {list(result.keys())}")
+    logger.info(f"Generated questions count: {result.get('generatedQuestions', 'N/A')}")
+    logger.info(f"Target topics: {result.get('targetTopics', [])}")
+    logger.info(f"Message: {result.get('message', 'N/A')}")
+    
+    questions = result.get("questions", [])
+    print(f"Questions extracted: {len(questions)} questions")
+    
+    # If questions is empty, check for parsing issues or alternative structures
+    if not questions:
+        print("⚠️ No 'questions' key found or empty. Checking alternative structures...")
         
-        # Log each question briefly
-        for i, q in enumerate(questions):
-            logger.info(f"  Q{i+1}: [{q.get('section', '?')}] [{q.get('topic', '?')}] [{q.get('difficulty', '?')}] {q.get('type', '?')}")
-            logger.info(f"       {q.get('question', 'No question text')[:80]}...")
+        # Handle case where JSON parsing failed and we have raw_response
+        if "raw_response" in result:
+            print("  Found 'raw_response' - attempting to parse...")
+            raw = result.get("raw_response", "")
+            try:
+                # Try to extract JSON from the raw response
+                import re
+                # Find JSON object in the response
+                json_match = re.search(r'\{[\s\S]*\}', raw)
+                if json_match:
+                    parsed = json.loads(json_match.group())
+                    questions = parsed.get("questions", [])
+                    print(f"  Successfully parsed raw_response: {len(questions)} questions")
+            except Exception as parse_err:
+                print(f"  Failed to parse raw_response: {parse_err}")
         
-        logger.info("-" * 60)
-        logger.info("Full LLM response JSON:")
-        logger.info(json.dumps(result, indent=2, default=str)[:2000])
-        logger.info("=" * 60)
+        # Try alternative keys
+        if not questions and "generated_questions" in result:
+            questions = result.get("generated_questions", [])
+            print(f"  Found 'generated_questions': {len(questions)}")
+        elif not questions and "data" in result and isinstance(result["data"], list):
+            questions = result["data"]
+            print(f"  Found 'data': {len(questions)}")
+        # Check if the whole result is an array
+        elif not questions and isinstance(result, list):
+            questions = result
+            print(f"  Result IS the questions array: {len(questions)}")
+    
+    logger.info(f"Questions array length: {len(questions)}")
+    
+    # Log each question briefly
+    for i, q in enumerate(questions):
+        logger.info(f"  Q{i+1}: [{q.get('section', '?')}] [{q.get('topic', '?')}] [{q.get('difficulty', '?')}] {q.get('type', '?')}")
+        logger.info(f"       {q.get('question', 'No question text')[:80]}...")
+    
+    logger.info("-" * 60)
+    logger.info("Full LLM response JSON:")
+    logger.info(json.dumps(result, indent=2, default=str)[:2000])
+    logger.info("=" * 60)
+    
+    # Ensure proper IDs
+    for i, q in enumerate(questions):
+        if "id" not in q:
+            q["id"] = f"GEN-{datetime.now().strftime('%H%M%S')}-{i+1:03d}"
         
-        # Ensure proper IDs
-        for i, q in enumerate(questions):
-            if "id" not in q:
-                q["id"] = f"GEN-{datetime.now().strftime('%H%M%S')}-{i+1:03d}"
-            
-            # Format options if needed
-            if q.get("options") and isinstance(q["options"], list):
-                formatted_options = []
-                for j, opt in enumerate(q["options"]):
-                    if isinstance(opt, str):
-                        key = chr(65 + j)
-                        text = opt[3:] if len(opt) > 2 and opt[1:3] == ". " else opt
-                        formatted_options.append({"key": key, "text": text})
-                    elif isinstance(opt, dict):
-                        formatted_options.append(opt)
-                q["options"] = formatted_options
+        # Format options if needed
+        if q.get("options") and isinstance(q["options"], list):
+            formatted_options = []
+            for j, opt in enumerate(q["options"]):
+                if isinstance(opt, str):
+                    key = chr(65 + j)
+                    text = opt[3:] if len(opt) > 2 and opt[1:3] == ". " else opt
+                    formatted_options.append({"key": key, "text": text})
+                elif isinstance(opt, dict):
+                    formatted_options.append(opt)
+            q["options"] = formatted_options
+    
+    result["questions"] = questions
+    return result
+
+
+@router.post("/generate")
+async def generate_questions(config: GenerateRequest):
+    """
+    Generate personalized practice questions using Gemini LLM
+    Served from the pre-generated inventory first; only the shortfall is generated live
+    Uses sample questions from database as context
+    """
+    
+    # Fetch sample questions from database for context
+    try:
+        sample_questions = await fetch_sample_questions_from_db(
+            sections=config.sections,
+            limit=6,
+            topics=config.topics,
+            difficulty=config.difficulty
+        )
+    except Exception as e:
+        logger.warning(f"Could not fetch samples from DB: {e}")
+        sample_questions = []
+    
+    # If AI disabled or no samples, return database samples
+    if not config.use_ai:
+        return {
+            "success": True,
+            "source": "database",
+            "count": len(sample_questions),
+            "questions": sample_questions[:config.count]
+        }
+    
+    # Draw ready-made questions from the inventory; they stay claimed until stored
+    claim_id = ObjectId()
+    drawn = await draw_for_sections(
+        [s.upper() for s in config.sections] or ["QA"],
+        config.difficulty,
+        config.count,
+        claim_id,
+        config.topics
+    )
+    inventory_questions = [q for section_questions in drawn.values() for q in section_questions]
+    needed = config.count - len(inventory_questions)
+    logger.info(f"📦 Inventory supplied {len(inventory_questions)}/{config.count} questions")
+    
+    try:
+        result = {}
+        questions = []
+        if needed > 0:
+            try:
+                result = await generate_with_llm(config, needed, sample_questions)
+                questions = result.get("questions", [])
+            except Exception as llm_err:
+                if not inventory_questions:
+                    raise
+                logger.warning(f"Live generation failed, serving inventory questions only: {llm_err}")
+        questions = inventory_questions + questions
         
         logger.info(f"✅ Successfully processed {len(questions)} questions")
         print(f"✅ Successfully processed {len(questions)} questions")  # Console output
         
-        # Store generated questions in database for future reference
-        if questions:
-            try:
-                questions_col = get_questions_collection()
-                # Add metadata for stored questions
-                for q in questions:
-                    q["generated"] = True
-                    q["generatedAt"] = datetime.utcnow()
-                    q["source"] = "ai_generated"
-                # Insert into database
-                await questions_col.insert_many([{k: v for k, v in q.items() if k != "id"} for q in questions])
-                logger.info(f"💾 Stored {len(questions)} questions in database")
-                print(f"💾 Stored {len(questions)} questions in database")
-            except Exception as db_err:
-                logger.warning(f"Could not store questions in DB: {db_err}")
-                print(f"⚠️ Could not store questions in DB: {db_err}")
-        
         # Store generated questions in database and create a test
         test_id = None
         stored_question_ids = []
@@ -266,9 +316,8 @@ OUTPUT: Return valid JSON with this structure:
         if questions:
             try:
                 from db.mongodb import get_tests_collection
-                questions_col = get_questions_collection()
                 tests_col = get_tests_collection()
-                
+            
                 # Prepare questions for insertion (without the temp id)
                 questions_to_insert = []
                 for q in questions:
@@ -277,13 +326,13 @@ OUTPUT: Return valid JSON with this structure:
                     q_copy["generatedAt"] = datetime.utcnow()
                     q_copy["source"] = "ai_generated"
                     questions_to_insert.append(q_copy)
-                
-                # Insert questions into database
-                insert_result = await questions_col.insert_many(questions_to_insert)
-                stored_question_ids = [str(id) for id in insert_result.inserted_ids]
+            
+                # Insert questions into database (near-duplicates reuse existing questions)
+                stored_question_ids = unique_ids(await insert_questions(questions_to_insert))
+                await consume_claim(claim_id)
                 print(f"💾 Stored {len(stored_question_ids)} questions in database")
                 print(f"   Question IDs: {stored_question_ids}")
-                
+            
                 # Create a new test with these question IDs
                 test_name = f"AI Generated - {config.sections[0] if config.sections else 'Mixed'} - {datetime.now().strftime('%d %b %Y %H:%M')}"
                 test_doc = {
@@ -297,13 +346,17 @@ OUTPUT: Return valid JSON with this structure:
                     "createdAt": datetime.utcnow(),
                     "source": "ai_generated"
                 }
-                
+            
                 test_result = await tests_col.insert_one(test_doc)
                 test_id = str(test_result.inserted_id)
+                await tests_changed(test_id)
+                prime_answer_key(test_id, stored_question_ids, questions_to_insert)
                 print(f"📝 Created test: {test_name}")
                 print(f"   Test ID: {test_id}")
-                
+            
             except Exception as db_err:
+                if not stored_question_ids:
+                    await release_claim(claim_id)
                 logger.warning(f"Could not store in DB: {db_err}")
                 print(f"⚠️ Could not store in DB: {db_err}")
         
@@ -315,10 +368,12 @@ OUTPUT: Return valid JSON with this structure:
             "testId": test_id,
             "testName": test_name if test_id else None,
             "targetTopics": result.get("targetTopics", config.topics or []),
+            "fromInventory": len(inventory_questions),
             "message": f"Successfully generated {len(questions)} questions and created a practice test!"
         }
             
     except Exception as e:
+        await release_claim(claim_id)
         logger.error("=" * 60)
         logger.error("❌ LLM QUESTION GENERATION ERROR")
         logger.error("=" * 60)
@@ -340,17 +395,24 @@ OUTPUT: Return valid JSON with this structure:
         }
 
 
+@router.get("/inventory")
+async def get_inventory_stats():
+    """Pre-generated question inventory levels and draw/refill rates"""
+    return await inventory_stats()
+
+
+@router.get("/stats")
+async def get_question_bank_stats():
+    """Question bank growth, near-duplicate rates and catalog size"""
+    return {**dedup_index.stats(), "catalog": question_catalog.stats(), "topicCatalog": topic_catalog.stats()}
+
+
 @router.get("/topics")
 async def get_available_topics():
-    """Get available topics for each section from database"""
-    questions_col = get_questions_collection()
-    
+    """Get available topics for each section (served from the in-memory topic catalog)"""
     try:
-        # Get distinct topics per section
-        topics = {}
-        for section in ["VARC", "DILR", "QA"]:
-            section_topics = await questions_col.distinct("topic", {"section": section})
-            topics[section] = section_topics if section_topics else []
+        catalog_topics = await topic_catalog.topics()
+        topics = {section: sorted(catalog_topics.get(section, {})) for section in ["VARC", "DILR", "QA"]}
         
         # Add defaults if empty
         if not topics["VARC"]:
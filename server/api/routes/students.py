@@ -3,14 +3,27 @@ Students Routes
 Student profile and history management
 """
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+import base64
 
-from db.mongodb import get_users_collection, get_attempts_collection, get_roadmaps_collection
-from api.routes.auth import verify_token
+from db.mongodb import get_users_collection, get_attempts_collection, get_roadmaps_collection, get_questions_collection
+from api.dependencies import current_user_id, current_user
+from services.user_cache import get_user, invalidate_user
+from api.serialization import MongoJSONResponse, negotiated_response
+from services.irt import item_bank
+from services.question_catalog import question_catalog
+from services.test_snapshot import QUESTION_PROJECTION
+from services.percentiles import get_histograms, standing
+from services.test_names import get_test_names, DEFAULT_TEST_NAME
+from services.performance_rollups import performance_view
+from services.user_stats import profile_stats
+from services.agent_outputs import hydrate_analysis
+from services.passages import attach_passages
+from services.response_caches import roadmaps
 
 router = APIRouter()
 
@@ -28,28 +41,19 @@ class AttemptSummary(BaseModel):
     score: int
     totalMarks: int
     percentile: float
+    rank: Optional[int] = None
     sections: List[dict]
 
 
 @router.get("/profile")
-async def get_profile(request: Request):
+async def get_profile(user: dict = Depends(current_user)):
     """Get current user's full profile"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
-    
-    users_col = get_users_collection()
-    user = await users_col.find_one({"_id": ObjectId(payload["sub"])})
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Get attempt count
-    attempts_col = get_attempts_collection()
-    test_count = await attempts_col.count_documents({"userId": user["_id"]})
+    # Counters are maintained on the user document at submission
+    stats = profile_stats(user.get("stats") or {})
+    if "stats" not in user:
+        # Not yet backfilled (migration 4, user_stats)
+        stats["testsCompleted"] = await get_attempts_collection().count_documents({"userId": user["_id"]})
+    performance = performance_view(user)
     
     return {
         "id": str(user["_id"]),
@@ -60,64 +64,150 @@ async def get_profile(request: Request):
         "examType": "CAT",
         "targetYear": 2025,
         "stats": {
-            "testsCompleted": test_count,
-            "averageScore": user.get("performance", {}).get("averageScore", 0),
-            "studyHours": 0,  # TODO: Track study time
-            "currentStreak": 0  # TODO: Calculate streak
+            **stats,
+            "averageScore": performance.get("averageScore", 0),
         },
-        "performance": user.get("performance", {})
+        "performance": performance
     }
 
 
+# Summary fields only: never the responses array or agent output
+ATTEMPT_SUMMARY_PROJECTION = {
+    "testId": 1,
+    "submittedAt": 1,
+    "score.obtained": 1,
+    "score.total": 1,
+    "score.percentile": 1,
+    "score.rank": 1,
+    "score.sections": 1,
+}
+
+MAX_ATTEMPTS_PAGE = 100
+
+
+def encode_cursor(submitted_at: datetime, attempt_id: ObjectId) -> str:
+    """Opaque keyset cursor for the (submittedAt, _id) position of the last row"""
+    raw = f"{submitted_at.isoformat()}|{attempt_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        submitted_at, attempt_id = raw.split("|")
+        return datetime.fromisoformat(submitted_at), ObjectId(attempt_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/attempts", response_model=List[AttemptSummary])
-async def get_attempts(request: Request):
-    """Get user's test attempt history"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+async def get_attempts(
+    response: Response,
+    user_id: str = Depends(current_user_id),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_ATTEMPTS_PAGE)
+):
+    """
+    Get user's test attempt history, newest first
     
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
+    Pass the X-Next-Cursor header of a page as `cursor` to fetch the next one
+    """
+    query = {"userId": ObjectId(user_id)}
+    if cursor:
+        submitted_at, attempt_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"submittedAt": {"$lt": submitted_at}},
+            {"submittedAt": submitted_at, "_id": {"$lt": attempt_id}},
+        ]
     
     attempts_col = get_attempts_collection()
-    attempts = []
+    docs = await attempts_col.find(query, ATTEMPT_SUMMARY_PROJECTION).sort(
+        [("submittedAt", -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+    
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(docs[-1]["submittedAt"], docs[-1]["_id"])
+    
+    # Live standing from each test's score histogram and test names (one query each, names cached)
+    test_ids = [a.get("testId") for a in docs]
+    histograms = await get_histograms(test_ids)
+    names = await get_test_names(test_ids)
     
-    async for attempt in attempts_col.find(
-        {"userId": ObjectId(payload["sub"])}
-    ).sort("submittedAt", -1).limit(20):
+    attempts = []
+    for attempt in docs:
+        counts = histograms.get(str(attempt.get("testId")))
+        current = standing(counts, attempt["score"]["obtained"]) if counts else attempt["score"]
         attempts.append(AttemptSummary(
             id=str(attempt["_id"]),
-            testName=f"CAT Mock Test",  # TODO: Join with tests collection
+            testName=names.get(str(attempt.get("testId")), DEFAULT_TEST_NAME),
             date=attempt["submittedAt"].isoformat(),
             score=attempt["score"]["obtained"],
             totalMarks=attempt["score"]["total"],
-            percentile=attempt["score"].get("percentile", 0),
-            sections=[]  # TODO: Calculate section-wise
+            percentile=current.get("percentile", 0),
+            rank=current.get("rank"),
+            sections=[
+                {"name": s["section"], "score": s["obtained"], "total": s["total"]}
+                for s in attempt["score"].get("sections", [])
+            ]
         ))
     
     return attempts
 
 
+# Top-level attempt fields selectable with ?fields= (aiAnalysis.<agent> selects one panel)
+ATTEMPT_FIELDS = ("testId", "submittedAt", "score", "responses", "aiAnalysis")
+ANALYSIS_AGENTS = ("architect", "detective", "tutor", "strategist")
+
+
+def attempt_projection(fields: Optional[str]) -> Optional[dict]:
+    """Mongo projection for a comma-separated field list (None selects everything)"""
+    if not fields:
+        return None
+    
+    selected = {f.strip() for f in fields.split(",") if f.strip()}
+    for field in selected:
+        root, _, agent = field.partition(".")
+        if root not in ATTEMPT_FIELDS or (agent and (root != "aiAnalysis" or agent not in ANALYSIS_AGENTS)):
+            raise HTTPException(status_code=400, detail=f"Unknown field: {field}")
+    
+    # A whole-document field already covers its sub-fields (and Mongo rejects the overlap)
+    if "aiAnalysis" in selected:
+        selected = {f for f in selected if not f.startswith("aiAnalysis.")}
+    
+    projection = {field: 1 for field in selected}
+    projection["userId"] = 1
+    if "score" in selected:
+        projection["testId"] = 1  # Needed for the live percentile
+    return projection
+
+
+async def load_owned_attempt(attempt_id: str, user_id: str, projection: Optional[dict] = None) -> dict:
+    """Fetch an attempt (optionally projected) and check it belongs to the user"""
+    if not ObjectId.is_valid(attempt_id):
+        raise HTTPException(status_code=400, detail="Invalid attempt ID format")
+    
+    attempt = await get_attempts_collection().find_one({"_id": ObjectId(attempt_id)}, projection)
+    if not attempt:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    if str(attempt["userId"]) != user_id:
+        raise HTTPException(status_code=403, detail="Not your attempt")
+    return attempt
+
+
 @router.get("/attempts/{attempt_id}")
-async def get_attempt_detail(attempt_id: str, request: Request):
-    """Get detailed attempt with AI analysis"""
+async def get_attempt_detail(attempt_id: str, request: Request, user_id: str = Depends(current_user_id), fields: Optional[str] = None):
+    """
+    Get detailed attempt with AI analysis
+    
+    `fields` (e.g. "score,submittedAt") limits the response to those fields;
+    agent panels and responses can also be fetched separately via the
+    /analysis/{agent} and /responses sub-resources
+    """
     print(f"🔍 [GET] /attempts/{attempt_id} triggered")
     
     try:
-        # 1. Auth check
-        auth_header = request.headers.get("Authorization")
-        if not auth_header:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        token = auth_header.split(" ")[1]
-        try:
-            payload = verify_token(token)
-            print(f"✅ Token verified for user: {payload.get('sub')}")
-        except Exception as auth_err:
-             print(f"❌ Token verification failed: {auth_err}")
-             raise HTTPException(status_code=401, detail="Invalid token")
-
-        # 2. DB Connection
+        # 1. DB Connection (auth is handled by the current_user_id dependency)
         try:
             attempts_col = get_attempts_collection()
             print("✅ DB Collection accessed")
@@ -125,38 +215,46 @@ async def get_attempt_detail(attempt_id: str, request: Request):
             print(f"❌ DB Connection failed: {db_conn_err}")
             raise HTTPException(status_code=500, detail="Database connection error")
 
-        # 3. ID Validation
+        # 2. ID Validation
         try:
             oid = ObjectId(attempt_id)
         except Exception:
             print(f"❌ Invalid ObjectId: {attempt_id}")
             raise HTTPException(status_code=400, detail="Invalid attempt ID format")
             
-        # 4. Fetch Attempt
+        # 3. Fetch Attempt (only the requested fields)
+        projection = attempt_projection(fields)
         print(f"🔍 Searching for attempt _id: {oid}")
-        attempt = await attempts_col.find_one({"_id": oid})
+        attempt = await attempts_col.find_one({"_id": oid}, projection)
         
         if not attempt:
             print("❌ Attempt not found in DB")
             raise HTTPException(status_code=404, detail="Attempt not found")
         
-        # 5. Ownership Check
+        # 4. Ownership Check
         print(f"✅ Attempt found. Owner: {attempt.get('userId')}")
-        if str(attempt["userId"]) != payload["sub"]:
-            print(f"❌ Ownership mismatch. Requester: {payload['sub']}")
+        if str(attempt["userId"]) != user_id:
+            print(f"❌ Ownership mismatch. Requester: {user_id}")
             raise HTTPException(status_code=403, detail="Not your attempt")
         
-        # 6. Response Construction
-        response_data = {
-            "id": str(attempt["_id"]),
-            "testId": str(attempt["testId"]),
-            "submittedAt": attempt["submittedAt"].isoformat() if isinstance(attempt["submittedAt"], datetime) else str(attempt["submittedAt"]),
-            "score": attempt["score"],
-            "responses": attempt["responses"],
-            "aiAnalysis": attempt.get("aiAnalysis")
-        }
+        # 5. Live standing from the test's score histogram
+        if "score" in attempt:
+            counts = (await get_histograms([attempt["testId"]])).get(str(attempt["testId"]))
+            if counts:
+                attempt["score"] = {**attempt["score"], **standing(counts, attempt["score"]["obtained"])}
         
-        return serialize_mongo_doc(response_data)
+        # 6. Agent outputs stored out of line (only the selected panels are loaded)
+        if attempt.get("aiAnalysis"):
+            attempt["aiAnalysis"] = await hydrate_analysis(attempt["aiAnalysis"])
+        
+        # 7. Response Construction (ObjectIds/datetimes are encoded by orjson in one pass)
+        requested = {f.strip().partition(".")[0] for f in fields.split(",")} if projection else set(ATTEMPT_FIELDS)
+        response_data = {"id": attempt["_id"]}
+        for field in ATTEMPT_FIELDS:
+            if field in requested:
+                response_data[field] = attempt.get(field)
+        
+        return negotiated_response(request, response_data)
 
     except HTTPException:
         raise
@@ -167,71 +265,143 @@ async def get_attempt_detail(attempt_id: str, request: Request):
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
-def serialize_mongo_doc(data):
-    """Recursively convert ObjectIds to strings for JSON serialization"""
-    if isinstance(data, list):
-        return [serialize_mongo_doc(item) for item in data]
-    elif isinstance(data, dict):
-        return {k: serialize_mongo_doc(v) for k, v in data.items()}
-    elif isinstance(data, ObjectId):
-        return str(data)
-    elif isinstance(data, datetime):
-        return data.isoformat()
-    else:
-        return data
+@router.get("/attempts/{attempt_id}/analysis/{agent}")
+async def get_attempt_analysis(attempt_id: str, agent: str, request: Request, user_id: str = Depends(current_user_id)):
+    """One agent's analysis panel for an attempt (loaded on demand by the Analysis page)"""
+    if agent not in ANALYSIS_AGENTS:
+        raise HTTPException(status_code=404, detail=f"Unknown agent: {agent}")
+    
+    attempt = await load_owned_attempt(
+        attempt_id, user_id,
+        {"userId": 1, f"aiAnalysis.{agent}": 1, "aiAnalysis.completedAt": 1}
+    )
+    analysis = await hydrate_analysis(attempt.get("aiAnalysis"), [agent]) or {}
+    
+    return negotiated_response(request, {
+        "attemptId": attempt["_id"],
+        "agent": agent,
+        "status": "completed" if analysis.get("completedAt") else "pending",
+        "completedAt": analysis.get("completedAt"),
+        "data": analysis.get(agent)
+    })
 
 
-@router.get("/roadmap")
-async def get_roadmap(request: Request):
-    """Get user's personalized roadmap"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
-    
-    roadmaps_col = get_roadmaps_collection()
-    roadmap = await roadmaps_col.find_one(
-        {"userId": ObjectId(payload["sub"])},
-        sort=[("generatedAt", -1)]
-    )
+@router.get("/attempts/{attempt_id}/responses")
+async def get_attempt_responses(attempt_id: str, request: Request, user_id: str = Depends(current_user_id), section: Optional[str] = None):
+    """An attempt's scored responses, optionally only one section's (filtered in the database)"""
+    if not section:
+        attempt = await load_owned_attempt(attempt_id, user_id, {"userId": 1, "responses": 1})
+        return negotiated_response(request, {"attemptId": attempt["_id"], "section": None, "responses": attempt.get("responses", [])})
+    
+    if not ObjectId.is_valid(attempt_id):
+        raise HTTPException(status_code=400, detail="Invalid attempt ID format")
     
-    if not roadmap:
-        return {"success": False, "message": "No roadmap generated yet. Complete a test first!"}
+    rows = await get_attempts_collection().aggregate([
+        {"$match": {"_id": ObjectId(attempt_id)}},
+        {"$project": {
+            "userId": 1,
+            "responses": {"$filter": {
+                "input": {"$ifNull": ["$responses", []]},
+                "cond": {"$eq": ["$$this.section", section.upper()]}
+            }}
+        }}
+    ]).to_list(length=1)
     
-    # Use serializer to handle all nested ObjectIds and Datetimes
-    serialized_roadmap = serialize_mongo_doc(roadmap)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    if str(rows[0]["userId"]) != user_id:
+        raise HTTPException(status_code=403, detail="Not your attempt")
     
-    # Ensure ID is a string (already done by serializer, but good for explicit structure)
-    serialized_roadmap["id"] = serialized_roadmap["_id"]
-    del serialized_roadmap["_id"]
+    return negotiated_response(request, {"attemptId": rows[0]["_id"], "section": section.upper(), "responses": rows[0]["responses"]})
+
+
+@router.get("/roadmap")
+async def get_roadmap(user_id: str = Depends(current_user_id)):
+    """Get user's personalized roadmap (cached until a new one is generated)"""
+    async def load():
+        roadmaps_col = get_roadmaps_collection()
+        roadmap = await roadmaps_col.find_one(
+            {"userId": ObjectId(user_id)},
+            sort=[("generatedAt", -1)]
+        )
+        
+        if not roadmap:
+            return {"success": False, "message": "No roadmap generated yet. Complete a test first!"}
+        
+        # Nested ObjectIds and datetimes are encoded by the response class
+        roadmap["id"] = roadmap.pop("_id")
+        return {"success": True, "roadmap": roadmap}
     
-    return {
-        "success": True,
-        "roadmap": serialized_roadmap
-    }
+    return MongoJSONResponse(await roadmaps.get_or_load(user_id, load))
 
 
 @router.put("/performance")
-async def update_performance(request: Request):
+async def update_performance(request: Request, user_id: str = Depends(current_user_id)):
     """Update user performance metrics (called after test analysis)"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
-    
     body = await request.json()
     
     users_col = get_users_collection()
     await users_col.update_one(
-        {"_id": ObjectId(payload["sub"])},
+        {"_id": ObjectId(user_id)},
         {"$set": {
             "performance": body,
             "updatedAt": datetime.utcnow()
         }}
     )
+    await invalidate_user(user_id)
     
     return {"message": "Performance updated"}
+
+
+class PracticeAnswer(BaseModel):
+    questionId: str
+    correct: bool
+
+
+class NextQuestionRequest(BaseModel):
+    section: Optional[str] = None
+    topic: Optional[str] = None
+    answered: List[PracticeAnswer] = []  # Responses so far in this practice session
+
+
+@router.post("/practice/next")
+async def next_practice_question(body: NextQuestionRequest, user_id: str = Depends(current_user_id)):
+    """Pick the most informative unseen question for the student's current ability (2PL IRT)"""
+    if not item_bank.loaded:
+        raise HTTPException(status_code=503, detail="No calibrated questions yet")
+    
+    # Update the calibrated ability with this session's answers
+    user = await get_user(user_id) or {}
+    ability = user.get("ability") or {}
+    theta, se = item_bank.estimate_ability(
+        [(a.questionId, a.correct) for a in body.answered],
+        prior_mean=ability.get("theta", 0.0),
+        prior_sd=ability.get("se") or 1.0
+    )
+    
+    seen = question_catalog.ids_for(await question_catalog.seen_by(user_id))
+    exclude = set(seen) | {a.questionId for a in body.answered}
+    selected = item_bank.select(theta, exclude, body.section, body.topic)
+    if not selected:
+        raise HTTPException(status_code=404, detail="No unseen calibrated questions match this request")
+    question_id, info = selected
+    
+    q = await get_questions_collection().find_one({"_id": ObjectId(question_id)}, QUESTION_PROJECTION)
+    if not q:
+        raise HTTPException(status_code=404, detail="Question not found")
+    await attach_passages([q])
+    
+    return {
+        "ability": {"theta": round(theta, 3), "se": round(se, 3)},
+        "information": round(info, 4),
+        "question": {
+            "id": question_id,
+            "section": q["section"],
+            "topic": q["topic"],
+            "difficulty": q["difficulty"],
+            "type": q["type"],
+            "passage": q.get("passage"),
+            "question": q["question"],
+            "options": q.get("options"),
+        }
+    }
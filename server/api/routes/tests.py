@@ -3,14 +3,28 @@ Tests Routes
 Mock test CRUD operations and submissions
 """
 
-from fastapi import APIRouter, HTTPException, Request, Query, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query, BackgroundTasks
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
 from bson import ObjectId
 
-from db.mongodb import get_tests_collection, get_questions_collection, get_attempts_collection
-from api.routes.auth import verify_token
+from db.mongodb import get_tests_collection, get_attempts_collection
+from api.dependencies import current_user_id, optional_token_payload
+from api.compression import choose_encoding
+from api.serialization import wants_msgpack, MSGPACK_MEDIA_TYPE
+from services.scoring_service import score_responses
+from services.answer_keys import get_answer_key, get_test_question_ids, prime_answer_key
+from services.test_snapshot import get_snapshot, SNAPSHOT_CACHE_CONTROL
+from services.response_caches import test_listings, tests_changed
+from services.generation_planner import split_evenly, plan_section_shards, generate_for_plan
+from services.question_inventory import draw_for_quotas, inventory_claim, DIFFICULTIES
+from services.question_bank import insert_questions, unique_ids
+from services.question_catalog import question_catalog
+from services.test_assembly import assemble_from_bank
+from services.percentiles import record_score
+from services.test_names import set_test_name
+from services.user_stats import record_submission
 
 router = APIRouter()
 
@@ -48,113 +62,79 @@ async def list_tests(
     type: Optional[str] = Query(None, description="full or sectional"),
     section: Optional[str] = Query(None, description="VARC, DILR, or QA")
 ):
-    """List all available tests"""
-    tests_col = get_tests_collection()
-    
-    query = {}
-    if type:
-        query["type"] = type
-    if section:
-        query["section"] = section
-    
-    tests = []
-    async for test in tests_col.find(query):
-        tests.append(TestResponse(
-            id=str(test["_id"]),
-            name=test["name"],
-            type=test["type"],
-            section=test.get("section"),
-            duration=test["duration"],
-            totalQuestions=len(test.get("questionIds", [])),
-            totalMarks=len(test.get("questionIds", [])) * 3
-        ))
+    """List all available tests (cached until a test is added)"""
+    async def load():
+        tests_col = get_tests_collection()
+        
+        query = {}
+        if type:
+            query["type"] = type
+        if section:
+            query["section"] = section
+        
+        tests = []
+        async for test in tests_col.find(query, {"name": 1, "type": 1, "section": 1, "duration": 1, "questionIds": 1}):
+            tests.append(TestResponse(
+                id=str(test["_id"]),
+                name=test["name"],
+                type=test["type"],
+                section=test.get("section"),
+                duration=test["duration"],
+                totalQuestions=len(test.get("questionIds", [])),
+                totalMarks=len(test.get("questionIds", [])) * 3
+            ).model_dump())
+        return tests
     
-    return tests
+    return await test_listings.get_or_load((type, section), load)
 
 
 @router.get("/{test_id}")
-async def get_test(test_id: str, request: Request):
-    """Get test with questions"""
-    # Try to verify auth, but don't require it for now (development mode)
-    auth_header = request.headers.get("Authorization")
-    if auth_header:
-        try:
-            token = auth_header.split(" ")[1]
-            verify_token(token)
-        except Exception as e:
-            print(f"⚠️ Auth warning (proceeding anyway): {e}")
+async def get_test(test_id: str, request: Request, payload: Optional[dict] = Depends(optional_token_payload)):
+    """Get test with questions (served from the immutable test snapshot)"""
+    # Auth is verified when present, but not required for now (development mode)
+    if request.headers.get("Authorization") and payload is None:
+        print("⚠️ Auth warning (proceeding anyway): invalid token")
     
-    tests_col = get_tests_collection()
-    questions_col = get_questions_collection()
+    if not ObjectId.is_valid(test_id):
+        raise HTTPException(status_code=404, detail="Test not found")
     
-    test = await tests_col.find_one({"_id": ObjectId(test_id)})
-    if not test:
+    snapshot = await get_snapshot(test_id)
+    if not snapshot:
         raise HTTPException(status_code=404, detail="Test not found")
     
-    # Get questions
-    question_ids = [ObjectId(qid) for qid in test.get("questionIds", [])]
-    questions = []
+    # Pre-rendered body in the negotiated format and content-coding
+    media_type = MSGPACK_MEDIA_TYPE if wants_msgpack(request) else "application/json"
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    headers = {
+        "ETag": snapshot.variant_etag(media_type, encoding),
+        "Cache-Control": SNAPSHOT_CACHE_CONTROL,
+        "Vary": "Accept, Accept-Encoding",
+    }
     
-    async for q in questions_col.find({"_id": {"$in": question_ids}}):
-        questions.append({
-            "id": str(q["_id"]),
-            "qno": len(questions) + 1,
-            "section": q["section"],
-            "topic": q["topic"],
-            "difficulty": q["difficulty"],
-            "type": q["type"],
-            "passage": q.get("passage"),
-            "question": q["question"],
-            "options": q.get("options"),
-            "marks": 3,
-            "negativeMarks": 0 if q["type"] == "TITA" else 1
-        })
+    # Client already holds this version
+    if snapshot.matches(request.headers.get("If-None-Match", "")):
+        return Response(status_code=304, headers=headers)
     
-    return {
-        "test": {
-            "id": str(test["_id"]),
-            "name": test["name"],
-            "duration": test["duration"],
-            "totalMarks": len(questions) * 3
-        },
-        "questions": questions
-    }
+    body, _ = snapshot.variant(media_type, encoding)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
 
 
 @router.post("/{test_id}/submit")
-async def submit_test(test_id: str, submission: SubmitRequest, request: Request, background_tasks: BackgroundTasks):
+async def submit_test(test_id: str, submission: SubmitRequest, background_tasks: BackgroundTasks, user_id: str = Depends(current_user_id)):
     """Submit test answers"""
-    # Verify auth
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
-    user_id = payload["sub"]
-    
-    questions_col = get_questions_collection()
     attempts_col = get_attempts_collection()
     
-    # Calculate score
-    correct = 0
-    incorrect = 0
-    unattempted = 0
-    
-    for response in submission.responses:
-        if not response.get("answer"):
-            unattempted += 1
-            continue
-        
-        question = await questions_col.find_one({"_id": ObjectId(response["questionId"])})
-        if question and response["answer"] == question["correctAnswer"]:
-            correct += 1
-        else:
-            incorrect += 1
+    if not ObjectId.is_valid(test_id):
+        raise HTTPException(status_code=404, detail="Test not found")
     
-    # TITA has no negative marking
-    score = (correct * 3) - (incorrect * 1)  # Simplified, should check TITA
-    total = len(submission.responses) * 3
+    # Score every response against the test's cached answer key, out of all of its questions
+    question_ids = await get_test_question_ids(test_id)
+    if not question_ids:
+        raise HTTPException(status_code=404, detail="Test not found")
+    answer_key = await get_answer_key(test_id, question_ids)
+    scored = score_responses(submission.responses, answer_key, question_ids)
     
     # Save attempt
     attempt = {
@@ -162,21 +142,25 @@ async def submit_test(test_id: str, submission: SubmitRequest, request: Request,
         "testId": ObjectId(test_id),
         "startedAt": datetime.utcnow() - timedelta(seconds=submission.totalTime),
         "submittedAt": datetime.utcnow(),
-        "responses": submission.responses,
-        "score": {
-            "obtained": score,
-            "total": total,
-            "percentage": round((score / total) * 100, 1) if total > 0 else 0,
-            "correct": correct,
-            "incorrect": incorrect,
-            "unattempted": unattempted
-        },
+        "responses": scored["responses"],
+        "score": scored["score"],
         "aiAnalysis": None  # Will be populated by agents
     }
     
     result = await attempts_col.insert_one(attempt)
     attempt_id = str(result.inserted_id)
     
+    # Standing among everyone who has taken this test; counted only once the attempt exists
+    standing = await record_score(test_id, attempt["score"]["obtained"])
+    attempt["score"]["percentile"] = standing["percentile"]
+    attempt["score"]["rank"] = standing["rank"]
+    await attempts_col.update_one(
+        {"_id": result.inserted_id},
+        {"$set": {"score.percentile": standing["percentile"], "score.rank": standing["rank"]}}
+    )
+    question_catalog.mark_seen(user_id, [r.get("questionId") for r in submission.responses])
+    await record_submission(ObjectId(user_id), attempt["score"], submission.totalTime, attempt["submittedAt"])
+    
     # Trigger AI Analysis in Background
     from services.analysis_service import run_analysis_pipeline
     background_tasks.add_task(run_analysis_pipeline, attempt_id, attempt, user_id)
@@ -184,6 +168,7 @@ async def submit_test(test_id: str, submission: SubmitRequest, request: Request,
     return {
         "attemptId": attempt_id,
         "score": attempt["score"],
+        "participants": standing["participants"],
         "message": "Test submitted successfully"
     }
 
@@ -195,102 +180,91 @@ class GenerateTestRequest(BaseModel):
     question_count: int = 20
     duration: int = 40
     focus_topics: Optional[List[str]] = []
+    mode: str = "ai"  # ai (generate) | bank (stored questions only) | auto (bank, then generate the rest)
+    difficulty_mix: Optional[Dict[str, float]] = None  # e.g. {"medium": 0.6, "hard": 0.4}
+
+
+GENERATE_MODES = ("ai", "bank", "auto")
 
 
 @router.post("/generate")
-async def generate_test(config: GenerateTestRequest, request: Request):
+async def generate_test(config: GenerateTestRequest, user_id: str = Depends(current_user_id)):
     """Generate AI test with custom questions"""
-    # Verify auth
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.split(" ")[1]
-    payload = verify_token(token)
-    user_id = payload["sub"]
+    if not config.sections or config.question_count <= 0:
+        raise HTTPException(status_code=400, detail="At least one section and a positive question count are required")
+    if config.mode not in GENERATE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(GENERATE_MODES)}")
+    difficulty_mix = config.difficulty_mix or {config.difficulty: 1}
+    if any(d not in DIFFICULTIES or w < 0 for d, w in difficulty_mix.items()) or not sum(difficulty_mix.values()):
+        raise HTTPException(status_code=400, detail="difficulty_mix needs non-negative weights for easy/medium/hard")
     
     tests_col = get_tests_collection()
-    questions_col = get_questions_collection()
-    
-    # Import the Architect agent for question generation
-    from agents import architect
     
     # Generate test name if not provided
     test_name = config.name or f"Custom Test - {datetime.now().strftime('%d %b %Y %H:%M')}"
     
-    # Prepare context for AI
-    questions_per_section = config.question_count // len(config.sections)
-    generated_questions = []
+    quotas = dict(zip(config.sections, split_evenly(config.question_count, len(config.sections))))
+    
+    # Assemble from stored questions the user has not attempted yet
+    bank_ids: List[str] = []
+    if config.mode in ("bank", "auto"):
+        seen = await question_catalog.seen_by(user_id)
+        bank_ids, quotas = assemble_from_bank(quotas, difficulty_mix, config.focus_topics, exclude=seen)
+        if config.mode == "bank":
+            if not bank_ids:
+                raise HTTPException(status_code=409, detail="No unattempted questions in the bank match this request")
+            quotas = {}
+    
+    # Drawn inventory questions stay claimed until they are stored; any failure returns them
+    async with inventory_claim() as claim_id:
+        # Serve as much as possible from the pre-generated inventory
+        drawn = await draw_for_quotas(quotas, config.difficulty, claim_id, config.focus_topics, user_id) if quotas else {}
+        generated_questions = [q for section in quotas for q in drawn.get(section, [])]
     
-    try:
-        for section in config.sections:
-            # Create mock attempt and performance data for Architect
-            mock_attempt = {
-                "score": {"obtained": 0, "total": 0, "percentage": 0, "correct": 0, "incorrect": 0, "unattempted": 0}
-            }
-            user_performance = {
-                "weakTopics": config.focus_topics or [],
-                "sectionWise": {section: 50},  # Default 50% to trigger question generation
-                "topicWise": {topic: 50 for topic in (config.focus_topics or [])}
-            }
-            
-            # Generate questions using Architect agent
-            result = await architect.run(mock_attempt, user_performance)
-            
-            if result.get("success") and result.get("questions"):
-                for q in result["questions"]:
-                    question_doc = {
+        # Generate only each section's shortfall live, with all shards running concurrently
+        shortfall = {
+            section: quota - len(drawn.get(section, []))
+            for section, quota in quotas.items()
+            if quota > len(drawn.get(section, []))
+        }
+        if shortfall:
+            shards = plan_section_shards(shortfall, config.difficulty, config.focus_topics)
+            generated_questions += await generate_for_plan(shards, shortfall, user_id)
+    
+        dedup_policy = None
+        if not generated_questions and not bank_ids:
+            # Placeholders are intentionally alike, so skip near-duplicate checks
+            dedup_policy = "off"
+            # Fallback: Create placeholder questions if AI fails
+            print("AI generation failed: no questions generated")
+            questions_per_section = config.question_count // len(config.sections)
+            for section in config.sections:
+                for i in range(questions_per_section):
+                    placeholder = {
                         "section": section,
-                        "topic": q.get("topic", config.focus_topics[0] if config.focus_topics else "General"),
+                        "topic": config.focus_topics[0] if config.focus_topics else "General",
                         "difficulty": config.difficulty,
-                        "type": q.get("type", "MCQ"),
-                        "passage": q.get("passage"),
-                        "question": q.get("question", q.get("text", "")),
-                        "options": q.get("options", [
-                            {"key": "A", "text": q.get("option_a", "Option A")},
-                            {"key": "B", "text": q.get("option_b", "Option B")},
-                            {"key": "C", "text": q.get("option_c", "Option C")},
-                            {"key": "D", "text": q.get("option_d", "Option D")},
-                        ]),
-                        "correctAnswer": q.get("correct_answer", q.get("answer", "A")),
-                        "explanation": q.get("explanation", ""),
+                        "type": "MCQ",
+                        "passage": None,
+                        "question": f"[AI Generation Pending] {section} Question {i+1} on {', '.join(config.focus_topics) or 'general topics'}",
+                        "options": [
+                            {"key": "A", "text": "Option A"},
+                            {"key": "B", "text": "Option B"},
+                            {"key": "C", "text": "Option C"},
+                            {"key": "D", "text": "Option D"},
+                        ],
+                        "correctAnswer": "A",
+                        "explanation": "AI-generated explanation will be available soon.",
                         "isAIGenerated": True,
                         "createdAt": datetime.utcnow(),
                         "createdBy": ObjectId(user_id),
                     }
-                    generated_questions.append(question_doc)
-    
-    except Exception as e:
-        # Fallback: Create placeholder questions if AI fails
-        print(f"AI generation failed: {e}")
-        for section in config.sections:
-            for i in range(questions_per_section):
-                placeholder = {
-                    "section": section,
-                    "topic": config.focus_topics[0] if config.focus_topics else "General",
-                    "difficulty": config.difficulty,
-                    "type": "MCQ",
-                    "passage": None,
-                    "question": f"[AI Generation Pending] {section} Question {i+1} on {', '.join(config.focus_topics) or 'general topics'}",
-                    "options": [
-                        {"key": "A", "text": "Option A"},
-                        {"key": "B", "text": "Option B"},
-                        {"key": "C", "text": "Option C"},
-                        {"key": "D", "text": "Option D"},
-                    ],
-                    "correctAnswer": "A",
-                    "explanation": "AI-generated explanation will be available soon.",
-                    "isAIGenerated": True,
-                    "createdAt": datetime.utcnow(),
-                    "createdBy": ObjectId(user_id),
-                }
-                generated_questions.append(placeholder)
+                    generated_questions.append(placeholder)
     
-    # Insert questions into MongoDB
-    question_ids = []
-    if generated_questions:
-        result = await questions_col.insert_many(generated_questions)
-        question_ids = [str(qid) for qid in result.inserted_ids]
+        # Insert questions into MongoDB
+        question_ids = list(bank_ids)
+        if generated_questions:
+            question_ids = unique_ids(question_ids + await insert_questions(generated_questions, policy=dedup_policy))
     
     # Create test document
     test_doc = {
@@ -302,18 +276,20 @@ async def generate_test(config: GenerateTestRequest, request: Request):
         "isAIGenerated": True,
         "difficulty": config.difficulty,
         "focusTopics": config.focus_topics,
+        "assembly": config.mode,
         "createdAt": datetime.utcnow(),
         "createdBy": ObjectId(user_id),
     }
     
     test_result = await tests_col.insert_one(test_doc)
+    await tests_changed(test_result.inserted_id)
+    set_test_name(str(test_result.inserted_id), test_name)
+    prime_answer_key(str(test_result.inserted_id), question_ids, generated_questions)
     
     return {
         "test_id": str(test_result.inserted_id),
         "message": f"Generated {len(question_ids)} questions for {test_name}",
         "question_count": len(question_ids),
+        "from_bank": len(bank_ids),
     }
 
-
-# Import timedelta for submission
-from datetime import timedelta
@@ -0,0 +1,49 @@
+"""
+Response Serialization
+orjson-backed JSON rendering that understands MongoDB types (ObjectId, datetime),
+and MessagePack for clients that ask for it with `Accept: application/msgpack`
+"""
+
+from typing import Any
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from services.encoding import dumps, packb, msgpack_available, MSGPACK_MEDIA_TYPE
+
+MSGPACK_ACCEPT = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson
+
+    Return an instance directly from a route to skip FastAPI's jsonable_encoder
+    pass; raw Mongo documents can be passed as-is.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Whether the client asked for MessagePack (and the server can produce it)"""
+    if not msgpack_available():
+        return False
+    accept = request.headers.get("accept", "")
+    return any(media.split(";")[0].strip() in MSGPACK_ACCEPT for media in accept.split(","))
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return packb(content)
+
+
+def negotiated_response(request: Request, content: Any, **kwargs) -> Response:
+    """Render `content` as MessagePack or JSON according to the request's Accept header"""
+    response_class = MsgPackResponse if wants_msgpack(request) else MongoJSONResponse
+    response = response_class(content, **kwargs)
+    response.headers.append("Vary", "Accept")
+    return response
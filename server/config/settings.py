@@ -13,6 +13,14 @@ class Settings(BaseSettings):
     # MongoDB
     mongodb_uri: str
     mongodb_db_name: str = "prepos"
+    mongodb_min_pool_size: int = 10             # Opened at startup (see MongoDB.warm_pool)
+    mongodb_max_pool_size: int = 100
+    mongodb_max_idle_time_ms: int = 300000      # Close connections idle this long (down to the minimum)
+    mongodb_wait_queue_timeout_ms: int = 2000   # Fail a checkout instead of queueing forever when the pool is exhausted
+    mongodb_compressors: str = "zstd,snappy,zlib"  # Wire compression, in order of preference
+    # Per-collection read preferences, e.g. "questions=secondaryPreferred,test_snapshots=nearest".
+    # Unlisted collections read from the primary; keep attempts/users there for read-your-writes.
+    mongodb_read_preferences: str = ""
     
     # Gemini API
     gemini_api_key: str
@@ -35,6 +43,58 @@ class Settings(BaseSettings):
     port: int = 3001
     debug: bool = True
     
+    # Response compression (brotli when installed, else gzip; test snapshots are pre-compressed)
+    compression_min_bytes: int = 1024  # Smaller responses are sent as they are
+    gzip_level: int = 6
+    brotli_quality: int = 4  # Per-response brotli level (11 is used for cached snapshot bodies)
+    
+    # Indexes
+    index_advisor_on_startup: bool = True  # Explain registered query shapes at boot and log collection scans
+    
+    # Caching
+    test_snapshot_cache_size: int = 256  # Pre-rendered test payloads kept in memory
+    answer_key_cache_size: int = 1024    # Per-test answer keys kept in memory
+    test_name_cache_size: int = 4096     # Test id -> name for attempt listings
+    token_cache_size: int = 10000        # Verified JWT payloads (honoured until the token expires)
+    user_cache_size: int = 4096          # User documents for authenticated requests
+    user_cache_ttl_seconds: int = 30     # ...re-read after this long (writes in this process invalidate sooner)
+    passage_cache_size: int = 2048       # Shared RC/DILR passages by content hash
+    
+    # Read-through response caches (write paths invalidate them; TTLs bound staleness from other processes)
+    cache_shared_tier: str = "off"              # off | local (in-process stand-in for a shared store)
+    test_listing_cache_ttl_seconds: int = 300   # GET /api/tests/
+    roadmap_cache_size: int = 4096              # Per-user GET /api/students/roadmap bodies
+    roadmap_cache_ttl_seconds: int = 900
+    
+    # AI analysis storage
+    agent_output_compress_min_bytes: int = 1024  # Agent outputs this large are stored compressed (zstd, else zlib)
+    
+    # Profile stats
+    streak_utc_offset_minutes: int = 330  # Timezone that defines a study day for streaks (IST)
+    
+    # Question generation
+    generation_concurrency: int = 4  # Concurrent Architect calls per request
+    generation_shard_size: int = 5   # Questions requested per Architect call
+    generation_overprovision: float = 0.2  # Extra share of each section requested, so losses still fill it
+    
+    # Question bank near-duplicate detection
+    dedup_policy: str = "reuse"   # reuse (return existing id) | reject | off
+    dedup_threshold: float = 0.9  # Estimated Jaccard similarity for a near-duplicate
+    
+    # Question inventory (pre-generated questions per section/topic/difficulty)
+    inventory_replenish_enabled: bool = True
+    inventory_low_watermark: int = 10     # Refill buckets below this level
+    inventory_high_watermark: int = 30    # ...up to this level
+    inventory_refill_interval_seconds: int = 300
+    inventory_max_calls_per_cycle: int = 4
+    inventory_offpeak_start_hour: int = 19  # UTC hours during which refills run (19-01 UTC = 00:30-06:30 IST)
+    inventory_offpeak_end_hour: int = 1
+    
+    # In-memory question catalog
+    catalog_refresh_interval_seconds: int = 30  # Poll for questions inserted by other workers
+    catalog_seen_cache_size: int = 2048          # Per-user "already answered" bitmaps kept in memory
+    topic_catalog_reload_seconds: int = 60       # Re-read topic counts (other workers' inserts) this often
+    
     # AI Models Configuration
     # Available: gemini-2.5-flash, gemini-2.5-pro
     model_architect: str = "gemini-2.5-flash"  # Complex reasoning for questions
@@ -0,0 +1,182 @@
+"""
+MongoDB Index Management
+Declared indexes for every collection, created idempotently at startup, and an
+advisor that explains each registered query shape to catch collection scans
+
+Print the advisor report with:  python -m db.indexes
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Index specs per collection. Names are pymongo's defaults, so indexes created
+# by earlier versions of db/migrate.py are recognised as already present.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("providerId", ASCENDING)]),
+    ],
+    "tests": [
+        IndexModel([("type", ASCENDING)]),
+        IndexModel([("section", ASCENDING)]),
+        IndexModel([("createdBy", ASCENDING), ("createdAt", DESCENDING)]),
+    ],
+    "questions": [
+        # Also serves section-only and section+topic filters (prefixes)
+        IndexModel([("section", ASCENDING), ("topic", ASCENDING), ("difficulty", ASCENDING)]),
+        IndexModel([("section", ASCENDING), ("difficulty", ASCENDING)]),
+        IndexModel([("topic", ASCENDING)]),
+    ],
+    "question_inventory": [
+        # Draws filter by bucket and claim the oldest first
+        IndexModel([("section", ASCENDING), ("difficulty", ASCENDING), ("topic", ASCENDING), ("stockedAt", ASCENDING)]),
+        IndexModel([("section", ASCENDING), ("difficulty", ASCENDING), ("stockedAt", ASCENDING)]),
+        # Claimed questions are deleted or returned by claim
+        IndexModel([("claimId", ASCENDING)], sparse=True),
+    ],
+    "attempts": [
+        # Keyset pagination; its userId prefix also serves per-user lookups and counts
+        IndexModel([("userId", ASCENDING), ("submittedAt", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "roadmaps": [
+        # Latest roadmap per user
+        IndexModel([("userId", ASCENDING), ("generatedAt", DESCENDING)]),
+    ],
+    "agent_outputs": [
+        # Outputs are read by _id from attempt references; this serves cleanup per attempt
+        IndexModel([("attemptId", ASCENDING), ("agent", ASCENDING)]),
+    ],
+    # test_snapshots and test_score_histograms are only read by _id; topic_catalog is read whole
+}
+
+
+# Query shapes issued on request paths, explained by the advisor. Values are
+# placeholders: the planner's choice depends on the shape, not the values.
+_SAMPLE_ID = ObjectId("000000000000000000000000")
+_SAMPLE_TIME = datetime(2000, 1, 1)
+
+QUERY_SHAPES: List[Dict[str, Any]] = [
+    {"name": "login by email", "collection": "users", "filter": {"email": "x@example.com"}},
+    {"name": "attempt history page", "collection": "attempts",
+     "filter": {"userId": _SAMPLE_ID}, "sort": {"submittedAt": -1, "_id": -1}},
+    {"name": "attempts answered by user", "collection": "attempts", "filter": {"userId": _SAMPLE_ID}},
+    {"name": "latest roadmap", "collection": "roadmaps",
+     "filter": {"userId": _SAMPLE_ID}, "sort": {"generatedAt": -1}},
+    {"name": "test listing", "collection": "tests", "filter": {"type": "full", "section": "QA"}},
+    {"name": "tests created by user", "collection": "tests",
+     "filter": {"createdBy": _SAMPLE_ID}, "sort": {"createdAt": -1}},
+    {"name": "sample questions by section", "collection": "questions", "filter": {"section": {"$in": ["QA"]}}},
+    {"name": "questions by section/topic/difficulty", "collection": "questions",
+     "filter": {"section": "QA", "topic": "Algebra", "difficulty": "medium"}},
+    {"name": "inventory draw", "collection": "question_inventory",
+     "filter": {"section": "QA", "difficulty": "medium", "claimedAt": {"$not": {"$gt": _SAMPLE_TIME}}},
+     "sort": {"stockedAt": 1}},
+    {"name": "inventory draw by topic", "collection": "question_inventory",
+     "filter": {"section": "QA", "difficulty": "medium", "topic": {"$in": ["Algebra"]},
+                "claimedAt": {"$not": {"$gt": _SAMPLE_TIME}}},
+     "sort": {"stockedAt": 1}},
+    {"name": "inventory claim", "collection": "question_inventory", "filter": {"claimId": _SAMPLE_ID}},
+    {"name": "agent outputs for attempt", "collection": "agent_outputs", "filter": {"attemptId": _SAMPLE_ID}},
+]
+
+
+def _default_db():
+    from db.mongodb import MongoDB
+    return MongoDB.get_db()
+
+
+async def ensure_indexes(db=None) -> Dict[str, List[str]]:
+    """Create any missing declared indexes (no-op for ones that already exist)"""
+    db = db if db is not None else _default_db()
+    created: Dict[str, List[str]] = {}
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # An index with the same name but different options; leave it for a human
+            logger.warning(f"Index conflict on {collection}: {e}")
+    return created
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Stage names of a (winning) query plan, outermost first"""
+    stages = [plan.get("stage", "")]
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+def _winning_plan(explained: Dict[str, Any]) -> Dict[str, Any]:
+    planner = explained.get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    # Slot-based engine (6.0+) nests the classic plan tree one level down
+    return plan.get("queryPlan", plan)
+
+
+async def advise_indexes(db=None, shapes: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Explain every registered query shape and report the plan it gets
+
+    Each report has the winning plan's stages and flags collection scans
+    (COLLSCAN) and in-memory sorts (SORT), which grow with the collection.
+    """
+    db = db if db is not None else _default_db()
+    reports = []
+    for shape in shapes or QUERY_SHAPES:
+        find = {"find": shape["collection"], "filter": shape["filter"], "limit": 1}
+        if shape.get("sort"):
+            find["sort"] = shape["sort"]
+        try:
+            explained = await db.command({"explain": find, "verbosity": "queryPlanner"})
+        except OperationFailure as e:
+            reports.append({"name": shape["name"], "collection": shape["collection"], "error": str(e)})
+            continue
+
+        stages = _plan_stages(_winning_plan(explained))
+        reports.append({
+            "name": shape["name"],
+            "collection": shape["collection"],
+            "stages": stages,
+            "collectionScan": "COLLSCAN" in stages,
+            "inMemorySort": "SORT" in stages,
+        })
+    return reports
+
+
+async def check_query_plans(db=None) -> List[Dict[str, Any]]:
+    """Run the advisor and log every shape that scans or sorts in memory (called at startup)"""
+    reports = await advise_indexes(db)
+    problems = [r for r in reports if r.get("error") or r.get("collectionScan") or r.get("inMemorySort")]
+    for report in problems:
+        logger.warning(
+            f"Query plan for '{report['name']}' on {report['collection']}: "
+            f"{report.get('error') or ' <- '.join(report['stages'])}"
+        )
+    if not problems:
+        logger.info(f"Index advisor: all {len(reports)} query shapes use an index")
+    return problems
+
+
+if __name__ == "__main__":
+    from db.mongodb import MongoDB
+
+    async def _main():
+        await MongoDB.connect()
+        try:
+            await ensure_indexes()
+            for report in await advise_indexes():
+                flags = [f for f in ("collectionScan", "inMemorySort") if report.get(f)]
+                detail = report.get("error") or " <- ".join(report["stages"])
+                print(f"{'⚠️' if flags or report.get('error') else '✅'} {report['collection']}: {report['name']}: {detail}")
+        finally:
+            await MongoDB.disconnect()
+
+    asyncio.run(_main())
@@ -1,6 +1,6 @@
 """
 MongoDB Migration Script
-Initialize collections with indexes and sample data
+Initialize collections with indexes, pending migrations and sample data
 """
 
 import asyncio
@@ -10,6 +10,9 @@ from bson import ObjectId
 import os
 from dotenv import load_dotenv
 
+from db.indexes import ensure_indexes, advise_indexes
+from db.migrations import MIGRATIONS, apply_migrations
+
 load_dotenv()
 
 
@@ -37,31 +40,14 @@ async def run_migration():
         # ============================================
         print("\n📋 Creating indexes...")
         
-        # Users collection
-        await db.users.create_index("email", unique=True)
-        await db.users.create_index("providerId")
-        print("  ✓ users indexes created")
-        
-        # Tests collection
-        await db.tests.create_index("type")
-        await db.tests.create_index("section")
-        print("  ✓ tests indexes created")
-        
-        # Questions collection
-        await db.questions.create_index("section")
-        await db.questions.create_index("topic")
-        await db.questions.create_index([("section", 1), ("difficulty", 1)])
-        print("  ✓ questions indexes created")
-        
-        # Attempts collection
-        await db.attempts.create_index("userId")
-        await db.attempts.create_index([("userId", 1), ("submittedAt", -1)])
-        print("  ✓ attempts indexes created")
+        # Declared in db/indexes.py (also applied at server startup)
+        created = await ensure_indexes(db)
+        for collection, names in created.items():
+            print(f"  ✓ {collection} indexes: {', '.join(names)}")
         
-        # Roadmaps collection
-        await db.roadmaps.create_index("userId")
-        await db.roadmaps.create_index([("userId", 1), ("generatedAt", -1)])
-        print("  ✓ roadmaps indexes created")
+        for report in await advise_indexes(db):
+            if report.get("error") or report.get("collectionScan") or report.get("inMemorySort"):
+                print(f"  ⚠️ {report['name']} ({report['collection']}): {report.get('error') or ' <- '.join(report['stages'])}")
         
         # ============================================
         # Insert Sample Data
@@ -160,6 +146,11 @@ async def run_migration():
             await db.questions.insert_many(sample_questions)
             print(f"  ✓ Inserted {len(sample_questions)} sample questions")
             
+            # Imported here: services load the full application Settings
+            from services.topic_catalog import rebuild_topic_catalog
+            pairs = await rebuild_topic_catalog(db)
+            print(f"  ✓ Topic catalog: {pairs} section/topic pairs")
+            
             # Create a sample test
             question_ids = await db.questions.find({}, {"_id": 1}).to_list(length=100)
             sample_test = {
@@ -173,6 +164,17 @@ async def run_migration():
             await db.tests.insert_one(sample_test)
             print("  ✓ Created sample test")
         
+        # ============================================
+        # Versioned Migrations (db/migrations)
+        # After seeding, so sample data goes through them too (e.g. shared passages)
+        # ============================================
+        print("\n🧬 Applying migrations...")
+        applied = await apply_migrations(db, MIGRATIONS)
+        for record in applied:
+            print(f"  ✓ {record['version']} {record['name']}: {record['summary']}")
+        if not applied:
+            print("  ℹ️ Nothing to migrate")
+        
         print("\n✅ Migration completed successfully!")
         
     except Exception as e:
@@ -0,0 +1,11 @@
+"""
+Database Migrations
+Ordered, versioned migrations recorded in the `_migrations` collection, with
+batched, resumable backfills for large collections
+
+Apply pending migrations with:  python -m db.migrations
+"""
+
+from db.migrations.backfill import backfill
+from db.migrations.runner import Migration, apply_migrations, migration_status
+from db.migrations.versions import MIGRATIONS
@@ -0,0 +1,38 @@
+"""
+Migration CLI
+
+    python -m db.migrations            # apply pending migrations
+    python -m db.migrations --to 3     # ...up to version 3
+    python -m db.migrations --status   # list migrations and when they were applied
+"""
+
+import argparse
+import asyncio
+
+from db.mongodb import MongoDB
+from db.migrations import MIGRATIONS, apply_migrations, migration_status
+
+
+async def _main(args):
+    await MongoDB.connect()
+    try:
+        db = MongoDB.get_db()
+        if args.status:
+            for row in await migration_status(db, MIGRATIONS):
+                applied = row["appliedAt"].isoformat() if row["appliedAt"] else "pending"
+                print(f"{row['version']:>4}  {row['name']:<40} {applied}")
+            return
+        applied = await apply_migrations(db, MIGRATIONS, target=args.to)
+        for record in applied:
+            print(f"✅ {record['version']} {record['name']} ({record['durationMs']}ms): {record['summary']}")
+        if not applied:
+            print("✅ Nothing to migrate")
+    finally:
+        await MongoDB.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply database migrations")
+    parser.add_argument("--to", type=int, default=None, help="Highest version to apply")
+    parser.add_argument("--status", action="store_true", help="Show applied and pending migrations")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,101 @@
+"""
+Online Backfills
+Walk a collection in `_id` order with bounded batches, bulk-write the changes
+and checkpoint progress so an interrupted backfill resumes where it stopped
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "_migrations"
+
+DEFAULT_BATCH_SIZE = 500
+# Fraction of wall time the backfill may keep the database busy; it sleeps for the rest
+DEFAULT_DUTY_CYCLE = 0.5
+
+BuildOps = Callable[[List[Dict[str, Any]]], Awaitable[List[UpdateOne]]]
+
+
+def checkpoint_id(name: str) -> str:
+    return f"backfill:{name}"
+
+
+async def backfill(
+    db,
+    name: str,
+    collection: str,
+    build_ops: BuildOps,
+    query: Optional[Dict[str, Any]] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    duty_cycle: float = DEFAULT_DUTY_CYCLE,
+    min_pause: float = 0.0,
+) -> Dict[str, Any]:
+    """
+    Apply `build_ops` to every document matching `query`, one `_id` range at a time
+
+    Each batch is read with `_id > last checkpoint` (sorted, limited), turned
+    into update operations by `build_ops(docs)` and written with one unordered
+    bulk_write. After every batch the last `_id` is checkpointed in
+    `_migrations`, so re-running a backfill with the same name continues from
+    there. Between batches it sleeps long enough to stay under `duty_cycle`
+    (and at least `min_pause` seconds), leaving room for production traffic.
+
+    Operations should be idempotent (guard with the backfilled condition in
+    their filters): a batch interrupted before its checkpoint is redone.
+    """
+    checkpoints = db[MIGRATIONS_COLLECTION]
+    target = db[collection]
+    state = await checkpoints.find_one({"_id": checkpoint_id(name)}) or {}
+    if state.get("done"):
+        return {"name": name, "scanned": state.get("scanned", 0), "updated": state.get("updated", 0), "resumed": True}
+
+    last_id = state.get("lastId")
+    scanned = state.get("scanned", 0)
+    updated = state.get("updated", 0)
+    if last_id is not None:
+        logger.info(f"Backfill {name}: resuming after {last_id} ({scanned} scanned)")
+
+    while True:
+        started = time.perf_counter()
+        batch_query = dict(query or {})
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+        docs = await target.find(batch_query, projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+
+        operations = await build_ops(docs)
+        if operations:
+            result = await target.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+
+        last_id = docs[-1]["_id"]
+        scanned += len(docs)
+        await checkpoints.update_one(
+            {"_id": checkpoint_id(name)},
+            {"$set": {"lastId": last_id, "scanned": scanned, "updated": updated, "updatedAt": datetime.utcnow()},
+             "$setOnInsert": {"startedAt": datetime.utcnow()}},
+            upsert=True
+        )
+
+        if len(docs) < batch_size:
+            break
+        busy = time.perf_counter() - started
+        await asyncio.sleep(max(busy * (1 / duty_cycle - 1), min_pause))
+
+    await checkpoints.update_one(
+        {"_id": checkpoint_id(name)},
+        {"$set": {"done": True, "lastId": last_id, "scanned": scanned, "updated": updated, "updatedAt": datetime.utcnow()},
+         "$setOnInsert": {"startedAt": datetime.utcnow()}},
+        upsert=True
+    )
+    summary = {"name": name, "scanned": scanned, "updated": updated}
+    logger.info(f"Backfill complete: {summary}")
+    return summary
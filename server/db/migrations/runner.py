@@ -0,0 +1,109 @@
+"""
+Migration Runner
+Applies pending versioned migrations in order, recording each in `_migrations`
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pymongo.errors import DuplicateKeyError
+
+from db.migrations.backfill import MIGRATIONS_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+LOCK_ID = "lock"
+# A crashed runner's lock is ignored after this long
+LOCK_TTL = timedelta(hours=6)
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    up: Callable[[Any], Awaitable[Optional[Dict[str, Any]]]]  # up(db) -> summary stored with the record
+    description: str = ""
+
+
+def _record_id(version: int) -> str:
+    return f"v{version:04d}"
+
+
+async def applied_versions(db) -> Dict[int, Dict[str, Any]]:
+    records = {}
+    async for record in db[MIGRATIONS_COLLECTION].find({"version": {"$exists": True}}):
+        records[record["version"]] = record
+    return records
+
+
+async def migration_status(db, migrations: List[Migration]) -> List[Dict[str, Any]]:
+    """Every known migration with when (if ever) it was applied"""
+    applied = await applied_versions(db)
+    return [
+        {
+            "version": m.version,
+            "name": m.name,
+            "appliedAt": applied.get(m.version, {}).get("appliedAt"),
+        }
+        for m in sorted(migrations, key=lambda m: m.version)
+    ]
+
+
+async def _acquire_lock(db) -> bool:
+    now = datetime.utcnow()
+    try:
+        await db[MIGRATIONS_COLLECTION].find_one_and_update(
+            {"_id": LOCK_ID, "expiresAt": {"$lt": now}},
+            {"$set": {"lockedAt": now, "expiresAt": now + LOCK_TTL}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Held by another runner (the upsert collided with its live lock)
+        return False
+
+
+async def _release_lock(db):
+    await db[MIGRATIONS_COLLECTION].delete_one({"_id": LOCK_ID})
+
+
+async def apply_migrations(db, migrations: List[Migration], target: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Apply every migration not yet recorded, in version order, up to `target`
+
+    A lock document keeps two runners (e.g. two deploys) from migrating at the
+    same time. A failed migration stops the run and is not recorded, so the
+    next run retries it; backfills resume from their checkpoints.
+    """
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError("Duplicate migration versions")
+
+    if not await _acquire_lock(db):
+        raise RuntimeError("Another migration run holds the lock")
+
+    results = []
+    try:
+        applied = await applied_versions(db)
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version in applied or (target is not None and migration.version > target):
+                continue
+
+            logger.info(f"Applying migration {migration.version}: {migration.name}")
+            started = time.perf_counter()
+            summary = await migration.up(db) or {}
+            record = {
+                "_id": _record_id(migration.version),
+                "version": migration.version,
+                "name": migration.name,
+                "appliedAt": datetime.utcnow(),
+                "durationMs": round(1000 * (time.perf_counter() - started)),
+                "summary": summary,
+            }
+            await db[MIGRATIONS_COLLECTION].replace_one({"_id": record["_id"]}, record, upsert=True)
+            results.append(record)
+    finally:
+        await _release_lock(db)
+    return results
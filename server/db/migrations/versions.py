@@ -0,0 +1,162 @@
+"""
+Migration Versions
+The ordered list of migrations; append new ones with the next version number
+and never edit or renumber one that has shipped
+"""
+
+from typing import Any, Dict, List
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db.migrations.backfill import backfill
+from db.migrations.runner import Migration
+
+
+async def _attempt_score_breakdowns(db) -> Dict[str, Any]:
+    """
+    Score breakdowns (score.sections/score.topics) and annotated responses for
+    attempts submitted before they were stored; obtained marks and percentiles
+    are left as recorded
+    """
+    from services.answer_keys import ANSWER_KEY_PROJECTION, answer_key_entry
+    from services.scoring_service import score_responses
+
+    async def build_ops(attempts: List[Dict[str, Any]]) -> List[UpdateOne]:
+        # One answer key lookup for the whole batch, over the attempted tests' questions
+        test_question_ids = {}
+        async for test in db.tests.find({"_id": {"$in": list({a.get("testId") for a in attempts})}}, {"questionIds": 1}):
+            test_question_ids[test["_id"]] = [str(qid) for qid in test.get("questionIds", [])]
+        question_ids = {
+            ObjectId(qid)
+            for qids in test_question_ids.values() for qid in qids
+            if ObjectId.is_valid(qid)
+        }
+        answer_key = {}
+        async for q in db.questions.find({"_id": {"$in": list(question_ids)}}, ANSWER_KEY_PROJECTION):
+            answer_key[str(q["_id"])] = answer_key_entry(q)
+
+        operations = []
+        for attempt in attempts:
+            responses = attempt.get("responses", [])
+            scored = score_responses(responses, answer_key, test_question_ids.get(attempt.get("testId"), []))
+            # Responses that no longer score (question or test deleted, repeats) are kept as recorded
+            annotated = {str(r["questionId"]): r for r in scored["responses"]}
+            responses = [annotated.pop(str(r.get("questionId")), r) for r in responses]
+            operations.append(UpdateOne(
+                {"_id": attempt["_id"], "score.sections": {"$exists": False}},
+                {"$set": {
+                    "score.sections": scored["score"]["sections"],
+                    "score.topics": scored["score"]["topics"],
+                    "responses": responses,
+                }}
+            ))
+        return operations
+
+    return await backfill(
+        db, "attempt_score_breakdowns", "attempts", build_ops,
+        query={"score.sections": {"$exists": False}},
+        projection={"testId": 1, "responses": 1},
+    )
+
+
+async def _agent_outputs_out_of_line(db) -> Dict[str, Any]:
+    """
+    Move the agent outputs embedded in older attempts' aiAnalysis into
+    agent_outputs, leaving references and summaries on the attempt
+    """
+    from services.agent_outputs import AGENTS, build_analysis
+
+    async def build_ops(attempts: List[Dict[str, Any]]) -> List[UpdateOne]:
+        # Outputs inserted by an interrupted run of this batch are not referenced yet
+        await db.agent_outputs.delete_many({"attemptId": {"$in": [a["_id"] for a in attempts]}})
+
+        docs, operations = [], []
+        for attempt in attempts:
+            embedded = attempt["aiAnalysis"]
+            strategist = embedded.get("strategist")
+            # The embedded roadmap carries the _id it was inserted with into roadmaps
+            roadmap_id = strategist.get("_id") if isinstance(strategist, dict) and isinstance(strategist.get("_id"), ObjectId) else None
+            output_docs, analysis = build_analysis(
+                attempt["_id"], attempt["userId"],
+                {agent: embedded.get(agent) for agent in AGENTS},
+                roadmap_id=roadmap_id,
+                completed_at=embedded.get("completedAt")
+            )
+            docs.extend(output_docs)
+            operations.append(UpdateOne(
+                {"_id": attempt["_id"], "aiAnalysis.version": {"$exists": False}},
+                {"$set": {"aiAnalysis": analysis}}
+            ))
+        if docs:
+            await db.agent_outputs.insert_many(docs, ordered=False)
+        return operations
+
+    return await backfill(
+        db, "agent_outputs_out_of_line", "attempts", build_ops,
+        query={"aiAnalysis.completedAt": {"$exists": True}, "aiAnalysis.version": {"$exists": False}},
+        projection={"userId": 1, "aiAnalysis": 1},
+        batch_size=100,
+    )
+
+
+async def _shared_passages(db) -> Dict[str, Any]:
+    """Move question passages into the content-hashed passages collection"""
+    from services.passages import passage_key, passage_upserts
+
+    async def build_ops(questions: List[Dict[str, Any]]) -> List[UpdateOne]:
+        upserts = passage_upserts(q["passage"] for q in questions)
+        await db.passages.bulk_write(list(upserts.values()), ordered=False)
+        return [
+            UpdateOne(
+                {"_id": q["_id"], "passage": q["passage"]},
+                {"$set": {"passageId": passage_key(q["passage"])}, "$unset": {"passage": ""}}
+            )
+            for q in questions
+        ]
+
+    # Empty and whitespace-only passages are left alone (nothing to share)
+    return await backfill(
+        db, "shared_passages", "questions", build_ops,
+        query={"passage": {"$type": "string", "$regex": r"\S"}},
+        projection={"passage": 1},
+    )
+
+
+async def _user_stats(db) -> Dict[str, Any]:
+    """
+    Profile counters for users who have none yet, computed from their attempts
+    (submissions seed them too, but users who never submit again would keep
+    showing zeros)
+    """
+    from services.user_stats import ATTEMPT_STATS_PROJECTION, stats_from_attempts
+
+    async def build_ops(users: List[Dict[str, Any]]) -> List[UpdateOne]:
+        # One attempts query for the whole batch
+        per_user: Dict[Any, List[Dict[str, Any]]] = {user["_id"]: [] for user in users}
+        async for attempt in db.attempts.find({"userId": {"$in": list(per_user)}}, ATTEMPT_STATS_PROJECTION):
+            per_user[attempt["userId"]].append(attempt)
+        return [
+            UpdateOne(
+                {"_id": user_id, "stats": {"$exists": False}},
+                {"$set": {"stats": stats_from_attempts(attempts)}}
+            )
+            for user_id, attempts in per_user.items()
+        ]
+
+    return await backfill(
+        db, "user_stats", "users", build_ops,
+        query={"stats": {"$exists": False}},
+        projection={"_id": 1},
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "attempt_score_breakdowns", _attempt_score_breakdowns,
+              "Backfill section/topic breakdowns and response annotations onto old attempts"),
+    Migration(2, "agent_outputs_out_of_line", _agent_outputs_out_of_line,
+              "Store embedded agent outputs once in agent_outputs; attempts keep references"),
+    Migration(3, "shared_passages", _shared_passages,
+              "Store RC/DILR passages once in passages; questions reference them by passageId"),
+    Migration(4, "user_stats", _user_stats,
+              "Compute profile counters from past attempts for users who have none"),
+]
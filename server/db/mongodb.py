@@ -3,25 +3,53 @@ MongoDB Connection Handler
 Async MongoDB client using Motor
 """
 
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+import asyncio
+import time
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
 from pymongo import MongoClient
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
 from config.settings import get_settings
-from typing import Optional
+from typing import Optional, Dict, Any
+
+from db.pool_metrics import pool_metrics
 
 settings = get_settings()
 
 
+def parse_read_preferences(spec: str) -> Dict[str, Any]:
+    """Per-collection read preferences from "attempts=secondaryPreferred,questions=nearest" """
+    preferences = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        collection, _, mode = entry.partition("=")
+        preferences[collection.strip()] = make_read_preference(read_pref_mode_from_name(mode.strip()), None)
+    return preferences
+
+
 class MongoDB:
     """MongoDB connection manager"""
     
     client: Optional[AsyncIOMotorClient] = None
     db: Optional[AsyncIOMotorDatabase] = None
+    read_preferences: Dict[str, Any] = {}
+    _collections: Dict[str, AsyncIOMotorCollection] = {}
     
     @classmethod
     async def connect(cls):
         """Initialize MongoDB connection"""
-        cls.client = AsyncIOMotorClient(settings.mongodb_uri)
+        options = {
+            "minPoolSize": settings.mongodb_min_pool_size,
+            "maxPoolSize": settings.mongodb_max_pool_size,
+            "maxIdleTimeMS": settings.mongodb_max_idle_time_ms,
+            "waitQueueTimeoutMS": settings.mongodb_wait_queue_timeout_ms,
+            "event_listeners": [pool_metrics],
+        }
+        # Compressors whose library isn't installed are skipped by the driver with a warning
+        if settings.mongodb_compressors:
+            options["compressors"] = settings.mongodb_compressors
+        cls.client = AsyncIOMotorClient(settings.mongodb_uri, **options)
         cls.db = cls.client[settings.mongodb_db_name]
+        cls.read_preferences = parse_read_preferences(settings.mongodb_read_preferences)
+        cls._collections = {}
         
         # Test connection
         try:
@@ -30,6 +58,29 @@ class MongoDB:
         except Exception as e:
             print(f"❌ MongoDB connection failed: {e}")
             raise
+        
+        await cls.warm_pool()
+    
+    @classmethod
+    async def warm_pool(cls):
+        """
+        Open minPoolSize connections up front
+        
+        The driver fills the pool lazily in the background; concurrent pings
+        force the connections (TCP, TLS and auth handshakes) to open before the
+        first requests arrive instead of on their critical path.
+        """
+        if settings.mongodb_min_pool_size <= 0:
+            return
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            cls.client.admin.command('ping')
+            for _ in range(settings.mongodb_min_pool_size)
+        ])
+        print(
+            f"🔥 MongoDB pool warmed: {pool_metrics.stats()['open']} connections "
+            f"in {1000 * (time.perf_counter() - started):.0f}ms"
+        )
     
     @classmethod
     async def disconnect(cls):
@@ -44,27 +95,61 @@ class MongoDB:
         if cls.db is None:
             raise RuntimeError("MongoDB not connected. Call connect() first.")
         return cls.db
+    
+    @classmethod
+    def collection(cls, name: str) -> AsyncIOMotorCollection:
+        """Collection handle with its configured read preference (primary by default)"""
+        handle = cls._collections.get(name)
+        if handle is None:
+            db = cls.get_db()
+            preference = cls.read_preferences.get(name)
+            handle = db.get_collection(name, read_preference=preference) if preference else db[name]
+            cls._collections[name] = handle
+        return handle
+    
+    @classmethod
+    async def health(cls) -> Dict[str, Any]:
+        """Round-trip latency and pool state"""
+        started = time.perf_counter()
+        await cls.client.admin.command('ping')
+        return {
+            "pingMs": round(1000 * (time.perf_counter() - started), 2),
+            "pool": pool_metrics.stats(),
+            "readPreferences": {name: pref.name for name, pref in cls.read_preferences.items()},
+        }
 
 
 # Collection accessors
 def get_users_collection():
-    return MongoDB.get_db()["users"]
+    return MongoDB.collection("users")
 
 def get_tests_collection():
-    return MongoDB.get_db()["tests"]
+    return MongoDB.collection("tests")
 
 def get_questions_collection():
-    return MongoDB.get_db()["questions"]
+    return MongoDB.collection("questions")
 
 def get_attempts_collection():
-    return MongoDB.get_db()["attempts"]
+    return MongoDB.collection("attempts")
 
 def get_roadmaps_collection():
-    return MongoDB.get_db()["roadmaps"]
+    return MongoDB.collection("roadmaps")
+
+def get_agent_outputs_collection():
+    return MongoDB.collection("agent_outputs")
+
+
+def get_test_snapshots_collection():
+    return MongoDB.collection("test_snapshots")
+
+def get_inventory_collection():
+    return MongoDB.collection("question_inventory")
 
-def get_detective_collection():
-    return MongoDB.get_db()["agent_detective"]
+def get_score_histograms_collection():
+    return MongoDB.collection("test_score_histograms")
 
-def get_tutor_collection():
-    return MongoDB.get_db()["agent_tutor"]
+def get_passages_collection():
+    return MongoDB.collection("passages")
 
+def get_topic_catalog_collection():
+    return MongoDB.collection("topic_catalog")
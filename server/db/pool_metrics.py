@@ -0,0 +1,126 @@
+"""
+Connection Pool Metrics
+CMAP event listener tracking pool checkout waits and connections in use
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+from pymongo import monitoring
+
+# Recent checkout waits kept for percentiles
+WAIT_SAMPLE_SIZE = 2048
+
+
+def _percentile(ordered, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Counts pool events and times connection checkouts
+
+    Events fire on the driver's worker threads, so state is guarded by a lock
+    and checkout start times are kept per thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.open = 0
+            self.in_use = 0
+            self.max_in_use = 0
+            self.checkouts = 0
+            self.checkout_failures: Dict[str, int] = {}
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+            self.pool_clears = 0
+
+    # Checkout timing
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _waited(self, event) -> float:
+        # pymongo 4.7+ reports the duration itself
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            return duration
+        started = getattr(self._local, "started", None)
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_checked_out(self, event):
+        waited = self._waited(event)
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.waits.append(waited)
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited(event)
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+            self.wait_max = max(self.wait_max, waited)
+            self.waits.append(waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    # Pool size
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(self.open - 1, 0)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    # Unused events
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ordered = sorted(self.waits)
+            return {
+                "open": self.open,
+                "inUse": self.in_use,
+                "maxInUse": self.max_in_use,
+                "checkouts": self.checkouts,
+                "checkoutFailures": dict(self.checkout_failures),
+                "poolClears": self.pool_clears,
+                "waitMs": {
+                    "avg": round(1000 * self.wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+                    "p50": round(1000 * _percentile(ordered, 0.5), 3),
+                    "p99": round(1000 * _percentile(ordered, 0.99), 3),
+                    "max": round(1000 * self.wait_max, 3),
+                },
+            }
+
+
+# Global instance (registered on the client in db/mongodb.py)
+pool_metrics = PoolMetrics()
@@ -11,7 +11,21 @@ from contextlib import asynccontextmanager
 
 from config.settings import get_settings
 from db.mongodb import MongoDB
+from db.indexes import ensure_indexes, check_query_plans
 from api.routes import auth, tests, agents, students, question_generator
+from api.dependencies import token_cache_stats
+from api.serialization import MongoJSONResponse
+from api.compression import CompressionMiddleware
+from services.question_inventory import start_replenisher, stop_replenisher
+from services.question_dedup import dedup_index
+from services.exemplar_index import exemplar_index
+from services.question_catalog import question_catalog
+from services.topic_catalog import topic_catalog
+from services.irt import item_bank
+from services.cache import cache_stats
+from services.test_snapshot import snapshot_cache_stats
+from services.answer_keys import answer_key_cache_stats
+from services.passages import passage_cache_stats
 
 # Configure logging
 logging.basicConfig(
@@ -34,8 +48,20 @@ async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting PrepOS Backend...")
     await MongoDB.connect()
+    await ensure_indexes()
+    if settings.index_advisor_on_startup:
+        await check_query_plans()
+    await dedup_index.rebuild()
+    await exemplar_index.rebuild()
+    await question_catalog.load()
+    question_catalog.start_refresh()
+    await topic_catalog.load()
+    await item_bank.load()
+    start_replenisher()
     yield
     # Shutdown
+    await stop_replenisher()
+    await question_catalog.stop_refresh()
     await MongoDB.disconnect()
     print("👋 PrepOS Backend stopped")
 
@@ -46,8 +72,12 @@ app = FastAPI(
     description="CAT Preparation Platform with AI-Powered Learning",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=MongoJSONResponse,
 )
 
+# Response compression (brotli/gzip); pre-compressed test snapshots pass through
+app.add_middleware(CompressionMiddleware)
+
 # Session middleware - REQUIRED for OAuth state handling
 app.add_middleware(SessionMiddleware, secret_key=settings.jwt_secret)
 
@@ -58,6 +88,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 
@@ -72,6 +103,25 @@ async def health_check():
     }
 
 
+@app.get("/api/health/db")
+async def db_health_check():
+    """Database round-trip latency and connection pool metrics"""
+    return {"status": "healthy", **(await MongoDB.health())}
+
+
+@app.get("/api/health/cache")
+async def cache_health_check():
+    """Hit rates and sizes per cache namespace, plus the in-process LRU caches"""
+    return {
+        "status": "healthy",
+        "caches": cache_stats(),
+        "tokens": token_cache_stats(),
+        "snapshots": snapshot_cache_stats(),
+        "answerKeys": answer_key_cache_stats(),
+        "passages": passage_cache_stats(),
+    }
+
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(tests.router, prefix="/api/tests", tags=["Tests"])
@@ -0,0 +1,164 @@
+"""
+Agent Outputs Service
+Stores each AI agent's full output once in `agent_outputs` (compressed when
+large); attempts keep only a reference and a small summary per agent
+"""
+
+import zlib
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import bson
+from bson import Binary, ObjectId
+
+from config.settings import get_settings
+from db.mongodb import get_agent_outputs_collection, get_roadmaps_collection
+
+try:
+    import zstandard
+except ImportError:  # zlib fallback keeps storage working without the optional package
+    zstandard = None
+
+settings = get_settings()
+
+AGENTS = ("architect", "detective", "tutor", "strategist")
+
+# aiAnalysis.version for the reference layout (older attempts embed the outputs)
+ANALYSIS_STORAGE_VERSION = 2
+
+ZSTD_LEVEL = 3
+
+# Small, frequently shown fields copied onto the attempt next to each reference
+SUMMARY_FIELDS = {
+    "architect": ("status", "message", "generatedQuestions", "generatedTestId", "targetTopics"),
+    "detective": ("status", "totalMistakes", "weakTopics"),
+    "tutor": ("status", "message", "lessonsReady", "overallTheme"),
+    "strategist": ("status", "message", "daysUntilExam", "preparationPhase", "focusAreas", "generatedAt"),
+}
+SUMMARY_LIST_LIMIT = 5
+
+
+def summarize(agent: str, output: Any) -> Dict[str, Any]:
+    if not isinstance(output, dict):
+        return {}
+    summary = {}
+    for field in SUMMARY_FIELDS.get(agent, ()):
+        if field in output:
+            value = output[field]
+            summary[field] = value[:SUMMARY_LIST_LIMIT] if isinstance(value, list) else value
+    return summary
+
+
+def encode_output(output: Any) -> Dict[str, Any]:
+    """Storage fields for an output: inline below the size threshold, compressed BSON above it"""
+    raw = bson.encode({"v": output})
+    if len(raw) < settings.agent_output_compress_min_bytes:
+        return {"encoding": "inline", "size": len(raw), "output": output}
+    if zstandard is not None:
+        return {"encoding": "zstd", "size": len(raw), "data": Binary(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw))}
+    return {"encoding": "zlib", "size": len(raw), "data": Binary(zlib.compress(raw))}
+
+
+def decode_output(doc: Dict[str, Any]) -> Any:
+    encoding = doc.get("encoding", "inline")
+    if encoding == "inline":
+        return doc.get("output")
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed agent outputs")
+        raw = zstandard.ZstdDecompressor().decompress(doc["data"])
+    elif encoding == "zlib":
+        raw = zlib.decompress(doc["data"])
+    else:
+        raise ValueError(f"Unknown agent output encoding: {encoding}")
+    return bson.decode(raw)["v"]
+
+
+def is_reference(entry: Any) -> bool:
+    return isinstance(entry, dict) and "outputId" in entry
+
+
+def build_analysis(
+    attempt_id: Any,
+    user_id: Any,
+    outputs: Dict[str, Any],
+    roadmap_id: Optional[ObjectId] = None,
+    completed_at: Optional[datetime] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Output documents to insert and the attempt's `aiAnalysis` referencing them
+
+    The strategist's output already lives in `roadmaps`; pass its `roadmap_id`
+    to reference that document instead of storing a second copy.
+    """
+    now = datetime.utcnow()
+    docs = []
+    analysis: Dict[str, Any] = {"version": ANALYSIS_STORAGE_VERSION, "completedAt": completed_at or now}
+    for agent in AGENTS:
+        output = outputs.get(agent)
+        if output is None:
+            analysis[agent] = None
+            continue
+        if agent == "strategist" and roadmap_id is not None:
+            analysis[agent] = {"outputId": roadmap_id, "store": "roadmaps", "summary": summarize(agent, output)}
+            continue
+        doc = {
+            "_id": ObjectId(),
+            "attemptId": ObjectId(str(attempt_id)),
+            "userId": ObjectId(str(user_id)),
+            "agent": agent,
+            "createdAt": now,
+            **encode_output(output),
+        }
+        docs.append(doc)
+        analysis[agent] = {"outputId": doc["_id"], "store": "agent_outputs", "size": doc["size"], "summary": summarize(agent, output)}
+    return docs, analysis
+
+
+async def store_analysis(
+    attempt_id: Any,
+    user_id: Any,
+    outputs: Dict[str, Any],
+    roadmap_id: Optional[ObjectId] = None,
+) -> Dict[str, Any]:
+    """Write the agents' outputs and return the `aiAnalysis` to set on the attempt"""
+    docs, analysis = build_analysis(attempt_id, user_id, outputs, roadmap_id)
+    if docs:
+        await get_agent_outputs_collection().insert_many(docs, ordered=False)
+    return analysis
+
+
+async def prune_outputs(attempt_id: Any, analysis: Dict[str, Any]):
+    """Delete an attempt's outputs no longer referenced (left behind when it is re-analysed)"""
+    keep = [ref["outputId"] for ref in analysis.values() if is_reference(ref) and ref.get("store") == "agent_outputs"]
+    await get_agent_outputs_collection().delete_many({"attemptId": ObjectId(str(attempt_id)), "_id": {"$nin": keep}})
+
+
+async def hydrate_analysis(analysis: Optional[Dict[str, Any]], agents: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    `aiAnalysis` with the full outputs of `agents` (default: all of them) in
+    place of their references, i.e. the embedded layout clients expect.
+    Attempts that still embed their outputs are returned as they are.
+    """
+    if not analysis:
+        return analysis
+    wanted = [a for a in (agents or AGENTS) if is_reference(analysis.get(a))]
+    if not wanted:
+        return analysis
+
+    hydrated = {k: v for k, v in analysis.items() if k != "version"}
+    by_store: Dict[str, Dict[ObjectId, str]] = {}
+    for agent in wanted:
+        ref = analysis[agent]
+        by_store.setdefault(ref.get("store", "agent_outputs"), {})[ref["outputId"]] = agent
+        hydrated[agent] = None  # Stays None if the referenced document is gone
+
+    if "agent_outputs" in by_store:
+        refs = by_store["agent_outputs"]
+        async for doc in get_agent_outputs_collection().find({"_id": {"$in": list(refs)}}):
+            hydrated[refs[doc["_id"]]] = decode_output(doc)
+    if "roadmaps" in by_store:
+        refs = by_store["roadmaps"]
+        async for doc in get_roadmaps_collection().find({"_id": {"$in": list(refs)}}):
+            hydrated[refs[doc["_id"]]] = doc
+    return hydrated
@@ -11,13 +11,16 @@ from typing import Dict, Any, Optional
 from db.mongodb import (
     get_users_collection,
     get_attempts_collection,
-    get_questions_collection,
     get_tests_collection,
-    get_roadmaps_collection,
-    get_detective_collection,
-    get_tutor_collection
+    get_roadmaps_collection
 )
 from agents import architect, detective, tutor, strategist
+from services.answer_keys import prime_answer_key, with_answer_key
+from services.question_bank import insert_questions, unique_ids
+from services.performance_rollups import performance_view
+from services.user_cache import get_user, invalidate_user
+from services.agent_outputs import store_analysis, prune_outputs
+from services.response_caches import tests_changed, roadmap_changed
 
 # In-memory status tracking (shared with routes/agents.py)
 # structure: { job_id: { status: str, agents: { name: { status, output } } } }
@@ -51,14 +54,11 @@ async def run_analysis_pipeline(attempt_id: str, attempt: dict, user_id: str):
         users_col = get_users_collection()
         attempts_col = get_attempts_collection()
         
-        # Agent collections
         roadmap_col = get_roadmaps_collection()
-        det_col = get_detective_collection()
-        tutor_col = get_tutor_collection()
         
         # Get user performance history
-        user = await users_col.find_one({"_id": ObjectId(user_id)})
-        user_performance = user.get("performance", {})
+        user = await get_user(user_id)
+        user_performance = performance_view(user)
         
         # --- Step 1: Parallel Execution ---
         analysis_jobs[job_id]["agents"]["architect"]["status"] = "processing"
@@ -66,9 +66,12 @@ async def run_analysis_pipeline(attempt_id: str, attempt: dict, user_id: str):
         
         print(f"Starting Architect and Detective for {job_id}")
         
+        # Agents reason about mistakes, so give them the correct answers from the cached key
+        analysed_attempt = await with_answer_key(attempt)
+        
         arch_result, det_result = await asyncio.gather(
-            architect.run(attempt, user_performance),
-            detective.run(attempt)
+            architect.run(analysed_attempt, user_performance),
+            detective.run(analysed_attempt)
         )
         
         # Save results to respective collections
@@ -76,7 +79,6 @@ async def run_analysis_pipeline(attempt_id: str, attempt: dict, user_id: str):
             # Process Architect Output: Create real test from generated questions
             try:
                 if arch_result.get("questions"):
-                    questions_col = get_questions_collection()
                     tests_col = get_tests_collection()
                     
                     generated_questions = []
@@ -104,8 +106,7 @@ async def run_analysis_pipeline(attempt_id: str, attempt: dict, user_id: str):
                     
                     # Insert questions
                     if generated_questions:
-                        q_result = await questions_col.insert_many(generated_questions)
-                        question_ids = [str(qid) for qid in q_result.inserted_ids]
+                        question_ids = unique_ids(await insert_questions(generated_questions))
                         
                         # Create Recommended Test
                         test_doc = {
@@ -121,6 +122,8 @@ async def run_analysis_pipeline(attempt_id: str, attempt: dict, user_id: str):
                         }
                         
                         t_result = await tests_col.insert_one(test_doc)
+                        await tests_changed(t_result.inserted_id)
+                        prime_answer_key(str(t_result.inserted_id), question_ids, generated_questions)
                         arch_result["generatedTestId"] = str(t_result.inserted_id)
                         print(f"Created recommended test: {t_result.inserted_id}")
 
@@ -129,29 +132,13 @@ async def run_analysis_pipeline(attempt_id: str, attempt: dict, user_id: str):
 
             # Note: We no longer save to agent_architect collection as per requirement
             
-        if det_result:
-            await det_col.insert_one({
-                "attemptId": ObjectId(attempt_id),
-                "userId": ObjectId(user_id),
-                "createdAt": datetime.utcnow(),
-                "output": det_result
-            })
-        
         analysis_jobs[job_id]["agents"]["architect"] = {"status": "completed", "output": arch_result}
         analysis_jobs[job_id]["agents"]["detective"] = {"status": "completed", "output": det_result}
         
         # --- Step 2: Tutor (Dependent) ---
         analysis_jobs[job_id]["agents"]["tutor"]["status"] = "processing"
-        tutor_result = await tutor.run(attempt, det_result)
-        
-        if tutor_result:
-            await tutor_col.insert_one({
-                "attemptId": ObjectId(attempt_id),
-                "userId": ObjectId(user_id),
-                "createdAt": datetime.utcnow(),
-                "output": tutor_result
-            })
-            
+        tutor_result = await tutor.run(analysed_attempt, det_result)
+        
         analysis_jobs[job_id]["agents"]["tutor"] = {"status": "completed", "output": tutor_result}
         
         # --- Step 3: Strategist (Dependent) ---
@@ -180,23 +167,23 @@ async def run_analysis_pipeline(attempt_id: str, attempt: dict, user_id: str):
             
             # Save to standard Roadmaps collection
             await roadmap_col.insert_one(strat_result)
+            await roadmap_changed(user_id)
             
         analysis_jobs[job_id]["agents"]["strategist"] = {"status": "completed", "output": strat_result}
         
         # --- Finalize ---
-        # Update attempt with AI analysis (embedded copy for frontend speed)
+        # Outputs are stored once in agent_outputs (the roadmap in roadmaps);
+        # the attempt keeps references and summaries, hydrated on read
+        ai_analysis = await store_analysis(
+            attempt_id, user_id,
+            {"architect": arch_result, "detective": det_result, "tutor": tutor_result, "strategist": strat_result},
+            roadmap_id=(strat_result or {}).get("_id")
+        )
         await attempts_col.update_one(
             {"_id": ObjectId(job_id)},
-            {"$set": {
-                "aiAnalysis": {
-                    "architect": arch_result,
-                    "detective": det_result,
-                    "tutor": tutor_result,
-                    "strategist": strat_result,
-                    "completedAt": datetime.utcnow()
-                }
-            }}
+            {"$set": {"aiAnalysis": ai_analysis}}
         )
+        await prune_outputs(attempt_id, ai_analysis)
         
         # Update user performance based on detective findings
         weak_topics = det_result.get("weakTopics", [])
@@ -205,6 +192,7 @@ async def run_analysis_pipeline(attempt_id: str, attempt: dict, user_id: str):
                 {"_id": ObjectId(user_id)},
                 {"$set": {"performance.weakTopics": weak_topics}}
             )
+            await invalidate_user(user_id)
         
         analysis_jobs[job_id]["status"] = "completed"
         print(f"Analysis pipeline completed for {job_id}")
@@ -0,0 +1,170 @@
+"""
+Answer Key Service
+Compact per-test answer keys held in a bounded in-process cache
+"""
+
+import hashlib
+from typing import Dict, Any, FrozenSet, Iterable, List, Optional
+from bson import ObjectId
+
+from config.settings import get_settings
+from db.mongodb import get_tests_collection, get_questions_collection
+from services.lru_cache import LRUCache
+from services.scoring_service import MARKS_PER_QUESTION, NEGATIVE_MARKS
+
+settings = get_settings()
+
+# Bump when the answer key entry shape changes
+ANSWER_KEY_SCHEMA_VERSION = 1
+
+# Only the fields needed for scoring - never the passage or explanation
+ANSWER_KEY_PROJECTION = {
+    "correctAnswer": 1,
+    "type": 1,
+    "section": 1,
+    "topic": 1,
+    "difficulty": 1,
+}
+
+# test_id -> {"version": str, "questionIds": frozenset, "key": {question_id: entry}}
+_answer_keys = LRUCache(maxsize=settings.answer_key_cache_size)
+
+
+def answer_key_entry(question: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a question document to its answer key entry"""
+    question_type = question.get("type", "MCQ")
+    return {
+        "correctAnswer": question.get("correctAnswer"),
+        "type": question_type,
+        "section": question.get("section", "General"),
+        "topic": question.get("topic", "General"),
+        "difficulty": question.get("difficulty", "medium"),
+        "marks": MARKS_PER_QUESTION,
+        "negativeMarks": NEGATIVE_MARKS.get(question_type, 1),
+    }
+
+
+def key_version(question_ids: Iterable[str]) -> str:
+    """Version of a test's answer key, derived from its question list"""
+    digest = hashlib.sha1(f"v{ANSWER_KEY_SCHEMA_VERSION}:".encode())
+    for qid in question_ids:
+        digest.update(str(qid).encode())
+        digest.update(b",")
+    return digest.hexdigest()[:16]
+
+
+async def fetch_answer_key(question_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch the answer key for a set of questions in a single $in query"""
+    object_ids = []
+    for qid in question_ids:
+        if qid and ObjectId.is_valid(str(qid)):
+            object_ids.append(ObjectId(str(qid)))
+
+    if not object_ids:
+        return {}
+
+    questions_col = get_questions_collection()
+    answer_key = {}
+    async for q in questions_col.find({"_id": {"$in": object_ids}}, ANSWER_KEY_PROJECTION):
+        answer_key[str(q["_id"])] = answer_key_entry(q)
+    return answer_key
+
+
+def prime_answer_key(test_id: str, question_ids: List[str], questions: List[Dict[str, Any]]):
+    """
+    Populate a test's answer key from question documents already in memory
+    (called right after a test is created, so first submission never hits Mongo).
+    Only documents carrying an `_id` in `question_ids` are used; any other
+    question is loaded lazily on first use.
+    """
+    wanted = frozenset(str(qid) for qid in question_ids)
+    key = {
+        str(q["_id"]): answer_key_entry(q)
+        for q in questions
+        if "_id" in q and str(q["_id"]) in wanted
+    }
+    _answer_keys.set(str(test_id), {"version": key_version(question_ids), "questionIds": wanted, "key": key})
+
+
+async def load_answer_key(test_id: str) -> Dict[str, Any]:
+    """Build a test's cache entry from its current question list"""
+    test_question_ids = []
+    if ObjectId.is_valid(test_id):
+        test = await get_tests_collection().find_one({"_id": ObjectId(test_id)}, {"questionIds": 1})
+        test_question_ids = [str(qid) for qid in (test or {}).get("questionIds", [])]
+    return {
+        "version": key_version(test_question_ids),
+        "questionIds": frozenset(test_question_ids),
+        "key": await fetch_answer_key(test_question_ids),
+    }
+
+
+async def _cached_entry(test_id: str) -> Dict[str, Any]:
+    cached = _answer_keys.get(test_id)
+    if cached is None:
+        cached = await load_answer_key(test_id)
+        _answer_keys.set(test_id, cached)
+    return cached
+
+
+async def get_test_question_ids(test_id: str) -> FrozenSet[str]:
+    """The question ids a test's answer key was built for (empty for an unknown test)"""
+    return (await _cached_entry(str(test_id)))["questionIds"]
+
+
+async def get_answer_key(test_id: str, question_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the answer key for a test, loading it on first use
+
+    Args:
+        test_id: Test the questions belong to
+        question_ids: Question ids that must be scorable (e.g. submitted responses);
+                      those in the test but not yet in a primed key are fetched.
+                      Ids that are not part of the test are never added.
+    """
+    cached = await _cached_entry(str(test_id))
+    key = cached["key"]
+    if question_ids is not None:
+        missing = {str(qid) for qid in question_ids if qid and str(qid) not in key} & cached["questionIds"]
+        if missing:
+            key.update(await fetch_answer_key(missing))
+
+    return key
+
+
+async def with_answer_key(attempt: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of an attempt whose responses carry the correct answer and question
+    metadata from the answer key (for agents that reason about mistakes)
+    """
+    responses = attempt.get("responses", [])
+    key = await get_answer_key(str(attempt.get("testId")), [r.get("questionId") for r in responses])
+
+    enriched = []
+    for response in responses:
+        entry = key.get(str(response.get("questionId")), {})
+        enriched.append({
+            "section": entry.get("section"),
+            "topic": entry.get("topic"),
+            "difficulty": entry.get("difficulty"),
+            "type": entry.get("type"),
+            **response,
+            "correctAnswer": entry.get("correctAnswer"),
+        })
+
+    return {**attempt, "responses": enriched}
+
+
+def invalidate_answer_key(test_id: str, question_ids: Optional[Iterable[str]] = None):
+    """
+    Drop a cached answer key; given the test's current question list, only
+    when the cached key was built for a different one
+    """
+    cached = _answer_keys.get(str(test_id))
+    if cached is not None and (question_ids is None or cached["version"] != key_version(question_ids)):
+        _answer_keys.pop(str(test_id))
+
+
+def answer_key_cache_stats() -> Dict[str, Any]:
+    """In-memory answer key cache counters"""
+    return _answer_keys.stats()
@@ -0,0 +1,224 @@
+"""
+Read-Through Cache
+Named cache namespaces with an in-process LRU tier, an optional shared tier,
+TTLs, coalesced loads and explicit invalidation from the write paths
+"""
+
+import asyncio
+import pickle
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from config.settings import get_settings
+from services.lru_cache import LRUCache
+
+settings = get_settings()
+
+_MISSING = object()
+
+
+class SharedTier(ABC):
+    """
+    Cache tier shared between server processes (values are serialized bytes)
+
+    Implement these for a network store such as Redis or memcached; the
+    in-process LocalSharedTier stands in for one in development.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl_seconds: Optional[float]):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def delete_prefix(self, prefix: str):
+        ...
+
+
+class LocalSharedTier(SharedTier):
+    """Process-local stand-in for a shared store, with the same serialization and expiry"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl_seconds: Optional[float]):
+        self._data[key] = (time.monotonic() + ttl_seconds if ttl_seconds else None, value)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def delete_prefix(self, prefix: str):
+        for key in [k for k in self._data if k.startswith(prefix)]:
+            del self._data[key]
+
+
+def _build_shared_tier() -> Optional[SharedTier]:
+    if settings.cache_shared_tier == "off":
+        return None
+    if settings.cache_shared_tier == "local":
+        return LocalSharedTier()
+    raise ValueError(f"Unknown shared cache tier: {settings.cache_shared_tier}")
+
+
+shared_tier = _build_shared_tier()
+
+
+class Cache:
+    """
+    One cache namespace
+
+    Values come from `get_or_load`: the local tier first, then the shared
+    tier, then the loader. Concurrent misses for the same key wait on a single
+    load. Loads that overlap an invalidation are returned but not stored, so
+    a write is never hidden behind the value read just before it. A loader
+    returning None (nothing found) is not cached either, so a document created
+    right after a miss is seen at once. Cached values are shared between
+    requests; treat them as read-only.
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl_seconds: Optional[float] = None, shared: bool = True):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds or None
+        self.shared = shared_tier if shared else None
+        self._local = LRUCache(maxsize=maxsize)
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._generation = 0
+        self.metrics = {"hits": 0, "sharedHits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "discarded": 0}
+
+    def _shared_key(self, key: Hashable) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return ":".join([self.namespace, *map(str, parts)])
+
+    def _get_local(self, key: Hashable) -> Any:
+        entry = self._local.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._local.pop(key)
+            return _MISSING
+        return value
+
+    def _set_local(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        self._local.set(key, (expires_at, value))
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached value for `key`, calling `loader` (once across concurrent callers) on a miss"""
+        value = self._get_local(key)
+        if value is not _MISSING:
+            self.metrics["hits"] += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.metrics["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # This caller was cancelled
+                return await self.get_or_load(key, loader)  # The leading load was
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            value = await self._load(key, loader, generation)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Waiters re-raise it; don't log it as unretrieved
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        return value
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        if self.shared is not None:
+            raw = await self.shared.get(self._shared_key(key))
+            if raw is not None:
+                self.metrics["sharedHits"] += 1
+                value = pickle.loads(raw)
+                if generation == self._generation:
+                    self._set_local(key, value)
+                return value
+
+        self.metrics["misses"] += 1
+        value = await loader()
+        if value is None:
+            return value
+        if generation != self._generation:
+            self.metrics["discarded"] += 1
+            return value
+        self._set_local(key, value)
+        if self.shared is not None:
+            await self.shared.set(self._shared_key(key), pickle.dumps(value), self.ttl_seconds)
+        return value
+
+    async def invalidate(self, key: Hashable):
+        """Drop one key from both tiers (call after writing the data behind it)"""
+        self._generation += 1
+        self.metrics["invalidations"] += 1
+        self._local.pop(key)
+        self._inflight.pop(key, None)
+        if self.shared is not None:
+            await self.shared.delete(self._shared_key(key))
+
+    async def clear(self):
+        """Drop every key in the namespace"""
+        self._generation += 1
+        self.metrics["invalidations"] += 1
+        self._local.clear()
+        self._inflight.clear()
+        if self.shared is not None:
+            await self.shared.delete_prefix(f"{self.namespace}:")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["sharedHits"] + self.metrics["misses"]
+        return {
+            "size": len(self._local),
+            "maxsize": self._local.maxsize,
+            "ttlSeconds": self.ttl_seconds,
+            "shared": self.shared is not None,
+            **self.metrics,
+            "hitRate": round((self.metrics["hits"] + self.metrics["sharedHits"]) / lookups, 3) if lookups else 0,
+        }
+
+
+_namespaces: Dict[str, Cache] = {}
+
+
+def get_cache(namespace: str, maxsize: int = 256, ttl_seconds: Optional[float] = None, shared: bool = True) -> Cache:
+    """The cache for a namespace, created on first use"""
+    cache = _namespaces.get(namespace)
+    if cache is None:
+        cache = _namespaces[namespace] = Cache(namespace, maxsize, ttl_seconds, shared)
+    return cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit-rate metrics per cache namespace"""
+    return {name: cache.stats() for name, cache in sorted(_namespaces.items())}
@@ -0,0 +1,78 @@
+"""
+Payload Encoding
+Byte-level formats shared by the HTTP layer and the services that pre-render
+payloads: orjson/MessagePack serialization of Mongo documents and brotli/gzip
+content-codings
+"""
+
+import gzip
+from datetime import date, datetime
+from typing import Any
+
+import orjson
+from bson import ObjectId
+
+from config.settings import get_settings
+
+try:
+    import msgpack
+except ImportError:  # JSON only without the optional package
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # gzip only without the optional package
+    brotli = None
+
+settings = get_settings()
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Preference order when the client accepts several equally
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# datetimes (naive or aware) are emitted natively in ISO 8601, matching datetime.isoformat()
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize Mongo documents straight to JSON bytes"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def _msgpack_default(value: Any) -> Any:
+    # Same wire values as the JSON rendering, so clients can share one model
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return _default(value)
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def packb(content: Any) -> bytes:
+    """Serialize Mongo documents to MessagePack bytes"""
+    return msgpack.packb(content, default=_msgpack_default, datetime=False)
+
+
+def compress(body: bytes, encoding: str, best: bool = False) -> bytes:
+    """
+    Compress a body; `best` spends more CPU for a smaller result (for bodies
+    compressed once and cached, such as test snapshots)
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else settings.brotli_quality)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9 if best else settings.gzip_level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
@@ -0,0 +1,196 @@
+"""
+Exemplar Index
+In-process BM25 inverted index over the question bank, used to pick the most
+relevant example questions for generation prompts
+"""
+
+import heapq
+import math
+import random
+import re
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+
+from db.mongodb import get_questions_collection
+from services.question_bank import register_insert_hook
+from services.passages import attach_passages
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Topic terms are repeated so a topic match outweighs incidental passage words
+TOPIC_WEIGHT = 3
+DIFFICULTY_BOOST = 1.2
+
+# Passage words beyond this are not indexed (RC passages run to 900 words)
+MAX_PASSAGE_TOKENS = 200
+
+# Questions per shared-passage lookup while rebuilding
+REBUILD_BATCH = 1000
+
+STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "and", "or", "is", "are", "was", "were",
+    "be", "by", "for", "with", "as", "at", "that", "this", "it", "its", "from", "if",
+    "which", "what", "then", "than", "following", "find", "value",
+}
+
+# Fields embedded in prompts as exemplars
+EXEMPLAR_PROJECTION = {
+    "section": 1,
+    "topic": 1,
+    "difficulty": 1,
+    "type": 1,
+    "passage": 1,
+    "passageId": 1,
+    "question": 1,
+    "options": 1,
+    "correctAnswer": 1,
+    "explanation": 1,
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def document_terms(doc: Dict[str, Any]) -> List[str]:
+    """Indexed terms of a question: weighted topic, question text, passage opening"""
+    return (
+        tokenize(doc.get("topic")) * TOPIC_WEIGHT
+        + tokenize(doc.get("question"))
+        + tokenize(doc.get("passage"))[:MAX_PASSAGE_TOKENS]
+    )
+
+
+class ExemplarIndex:
+    """BM25 over question text, topic and passage with section/difficulty metadata"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Drop everything indexed"""
+        self.doc_ids: List[str] = []
+        self.sections: List[str] = []
+        self.difficulties: List[str] = []
+        self.lengths: List[int] = []
+        self.total_length = 0
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.by_section: Dict[str, List[int]] = {}
+        self._positions: Dict[str, int] = {}
+
+    def add(self, doc: Dict[str, Any]):
+        """Index one stored question (no-op if already indexed)"""
+        question_id = str(doc["_id"])
+        if question_id in self._positions:
+            return
+
+        position = len(self.doc_ids)
+        terms = document_terms(doc)
+        section = (doc.get("section") or "").upper()
+
+        self._positions[question_id] = position
+        self.doc_ids.append(question_id)
+        self.sections.append(section)
+        self.difficulties.append(doc.get("difficulty") or "medium")
+        self.lengths.append(len(terms))
+        self.total_length += len(terms)
+        self.by_section.setdefault(section, []).append(position)
+
+        frequencies: Dict[str, int] = {}
+        for term in terms:
+            frequencies[term] = frequencies.get(term, 0) + 1
+        for term, tf in frequencies.items():
+            self.postings.setdefault(term, {})[position] = tf
+
+    def add_many(self, docs: List[Dict[str, Any]]):
+        """Insert hook: index newly stored questions"""
+        for doc in docs:
+            self.add(doc)
+
+    def search(
+        self,
+        query: str,
+        sections: Optional[List[str]] = None,
+        difficulty: Optional[str] = None,
+        limit: int = 2
+    ) -> List[str]:
+        """
+        Ids of the best BM25 matches for `query`, restricted to `sections` and
+        favouring `difficulty`; a random section sample when nothing matches
+        """
+        allowed = {s.upper() for s in sections} if sections else None
+        n_docs = len(self.doc_ids)
+        if n_docs == 0:
+            return []
+
+        avg_length = self.total_length / n_docs or 1
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, tf in postings.items():
+                if allowed and self.sections[position] not in allowed:
+                    continue
+                norm = K1 * (1 - B + B * self.lengths[position] / avg_length)
+                scores[position] = scores.get(position, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+        if difficulty:
+            for position in scores:
+                if self.difficulties[position] == difficulty:
+                    scores[position] *= DIFFICULTY_BOOST
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        if best:
+            return [self.doc_ids[position] for position, _ in best]
+
+        pool = [p for s in (allowed or self.by_section.keys()) for p in self.by_section.get(s, [])]
+        return [self.doc_ids[p] for p in random.sample(pool, min(limit, len(pool)))]
+
+    async def rebuild(self):
+        """Index the whole questions collection (called at startup)"""
+        self.clear()
+        questions_col = get_questions_collection()
+        batch = []
+        async for doc in questions_col.find({}, {"section": 1, "topic": 1, "difficulty": 1, "question": 1, "passage": 1, "passageId": 1}):
+            batch.append(doc)
+            if len(batch) >= REBUILD_BATCH:
+                self.add_many(await attach_passages(batch))
+                batch = []
+        self.add_many(await attach_passages(batch))
+        print(f"🔎 Exemplar index loaded: {len(self.doc_ids)} questions, {len(self.postings)} terms")
+
+
+exemplar_index = ExemplarIndex()
+register_insert_hook(exemplar_index.add_many)
+
+
+async def find_exemplars(
+    sections: Optional[List[str]] = None,
+    topics: Optional[List[str]] = None,
+    difficulty: Optional[str] = None,
+    limit: int = 2
+) -> List[Dict[str, Any]]:
+    """Most relevant stored questions to show the model as examples"""
+    question_ids = exemplar_index.search(" ".join(topics or []), sections, difficulty, limit)
+    if not question_ids:
+        return []
+
+    questions_col = get_questions_collection()
+    docs = {}
+    async for doc in questions_col.find(
+        {"_id": {"$in": [ObjectId(qid) for qid in question_ids]}},
+        EXEMPLAR_PROJECTION
+    ):
+        doc["id"] = str(doc.pop("_id"))
+        docs[doc["id"]] = doc
+    await attach_passages(list(docs.values()))
+
+    # Keep relevance order
+    return [docs[qid] for qid in question_ids if qid in docs]
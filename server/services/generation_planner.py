@@ -0,0 +1,182 @@
+"""
+Generation Planner
+Splits a question request into shards and generates them concurrently
+"""
+
+import asyncio
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+
+from config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Shard:
+    """One unit of generation work: a single Architect call"""
+    section: str
+    difficulty: str
+    count: int
+    topics: List[str] = field(default_factory=list)
+
+
+def split_evenly(total: int, parts: int) -> List[int]:
+    """Split a total into `parts` near-equal integers (remainder to the first parts)"""
+    if parts <= 0:
+        return []
+    split = [total // parts] * parts
+    for i in range(total % parts):
+        split[i] += 1
+    return split
+
+
+def plan_section_shards(
+    section_counts: Dict[str, int],
+    difficulty: str,
+    topics: Optional[List[str]] = None,
+    shard_size: Optional[int] = None,
+    overprovision: Optional[float] = None
+) -> List[Shard]:
+    """
+    Shard explicit per-section question counts, asking for `overprovision`
+    (a fraction) more per section so invalid or duplicate generations and
+    failed shards still leave enough to fill it
+    """
+    shard_size = shard_size or settings.generation_shard_size
+    overprovision = settings.generation_overprovision if overprovision is None else overprovision
+    topics = topics or []
+
+    shards = []
+    topic_cursor = 0
+    for section, section_total in section_counts.items():
+        remaining = section_total + math.ceil(section_total * overprovision)
+        while remaining > 0:
+            count = min(shard_size, remaining)
+            shard_topics = []
+            if topics:
+                shard_topics = [topics[(topic_cursor + i) % len(topics)] for i in range(min(count, len(topics)))]
+                topic_cursor += len(shard_topics)
+            shards.append(Shard(section=section, difficulty=difficulty, count=count, topics=shard_topics))
+            remaining -= count
+
+    return shards
+
+
+def normalize_text(text: str) -> str:
+    """Lowercased, whitespace-collapsed text used for exact duplicate checks"""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", (text or "").lower())).strip()
+
+
+def normalize_options(options: Any) -> Optional[List[dict]]:
+    """Convert ["A. text", ...] or [{key, text}] into [{key, text}]"""
+    if not options or not isinstance(options, list):
+        return None
+
+    formatted = []
+    for i, opt in enumerate(options):
+        if isinstance(opt, dict):
+            formatted.append(opt)
+        elif isinstance(opt, str):
+            text = opt[3:] if len(opt) > 2 and opt[1:3] == ". " else opt
+            formatted.append({"key": chr(65 + i), "text": text})
+    return formatted
+
+
+def to_question_doc(q: Dict[str, Any], shard: Shard, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Build a questions-collection document from raw Architect output"""
+    question_type = q.get("type", "MCQ")
+    doc = {
+        "section": shard.section,
+        "topic": q.get("topic") or (shard.topics[0] if shard.topics else "General"),
+        "difficulty": shard.difficulty,
+        "type": question_type,
+        "passage": q.get("passage"),
+        "question": q.get("question", q.get("text", "")),
+        "options": normalize_options(q.get("options")) if question_type != "TITA" else None,
+        "correctAnswer": q.get("correctAnswer", q.get("correct_answer", q.get("answer"))),
+        "explanation": q.get("explanation", ""),
+        "isAIGenerated": True,
+        "createdAt": datetime.utcnow(),
+    }
+    if user_id:
+        doc["createdBy"] = ObjectId(user_id)
+    return doc
+
+
+def is_valid_question(doc: Dict[str, Any]) -> bool:
+    """Reject generations missing the essentials"""
+    if not doc.get("question") or doc.get("correctAnswer") in (None, ""):
+        return False
+    if doc["type"] == "MCQ" and not doc.get("options"):
+        return False
+    return True
+
+
+async def generate_for_plan(
+    shards: List[Shard],
+    targets: Dict[str, int],
+    user_id: Optional[str] = None,
+    concurrency: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Run all shards concurrently (bounded by a semaphore), merge and de-duplicate
+    the results, and return as soon as every section has its `targets` count
+    of valid questions; shards still queued or running are cancelled
+    """
+    from agents import architect
+    from services.exemplar_index import find_exemplars
+
+    semaphore = asyncio.Semaphore(concurrency or settings.generation_concurrency)
+
+    async def run_shard(shard: Shard):
+        async with semaphore:
+            exemplars = await find_exemplars([shard.section], shard.topics, shard.difficulty)
+            result = await architect.generate_batch(
+                shard.section, shard.difficulty, shard.count, shard.topics, exemplars
+            )
+            return shard, result
+
+    tasks = [asyncio.create_task(run_shard(shard)) for shard in shards]
+    collected: Dict[str, List[Dict[str, Any]]] = {section: [] for section in targets}
+    seen = set()
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                shard, result = await next_done
+            except Exception as e:
+                logger.warning(f"Generation shard failed: {e}")
+                continue
+
+            if result.get("status") != "success":
+                logger.warning(f"Generation shard returned {result.get('status')}: {result.get('error')}")
+                continue
+
+            section_questions = collected.setdefault(shard.section, [])
+            for raw in result.get("questions", [])[:shard.count]:
+                if len(section_questions) >= targets.get(shard.section, 0):
+                    break
+                doc = to_question_doc(raw, shard, user_id)
+                fingerprint = normalize_text(doc["question"])
+                if not is_valid_question(doc) or fingerprint in seen:
+                    continue
+                seen.add(fingerprint)
+                section_questions.append(doc)
+
+            if all(len(collected[section]) >= count for section, count in targets.items()):
+                break
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    questions = [doc for section_questions in collected.values() for doc in section_questions]
+    logger.info(f"Generation plan: {len(shards)} shards, {len(questions)}/{sum(targets.values())} questions")
+    return questions
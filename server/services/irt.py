@@ -0,0 +1,392 @@
+"""
+IRT Calibration Service
+2PL item response model: batched EM calibration of question parameters and
+student abilities, plus maximum-information item selection for adaptive practice
+
+Run a full calibration with:  python -m services.irt
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db.mongodb import get_questions_collection, get_attempts_collection, get_users_collection
+from services.user_cache import clear_user_cache
+
+logger = logging.getLogger(__name__)
+
+# Ability quadrature for the EM E-step (standard normal prior)
+QUAD_NODES = np.linspace(-4.0, 4.0, 21)
+QUAD_LOG_WEIGHTS = -0.5 * QUAD_NODES ** 2 - np.log(np.exp(-0.5 * QUAD_NODES ** 2).sum())
+
+# Ability grid the information tables are precomputed on
+THETA_GRID = np.linspace(-4.0, 4.0, 81)
+
+# Weak priors keep sparse items finite: a ~ N(1, 1), b ~ N(0, 2^2)
+PRIOR_A_MEAN, PRIOR_A_VAR = 1.0, 1.0
+PRIOR_B_VAR = 4.0
+A_BOUNDS = (0.2, 4.0)
+B_BOUNDS = (-4.0, 4.0)
+
+MAX_EM_ITERATIONS = 200
+EM_TOLERANCE = 1e-3
+M_STEP_NEWTON_STEPS = 3
+
+# Parameters are only written back for items/students with at least this many responses
+MIN_ITEM_RESPONSES = 5
+MIN_USER_RESPONSES = 5
+
+BULK_WRITE_BATCH = 1000
+
+# Fields read from attempts to build the response matrix
+RESPONSE_PROJECTION = {"userId": 1, "responses.questionId": 1, "responses.answer": 1, "responses.isCorrect": 1}
+
+
+def probability(a: np.ndarray, b: np.ndarray, theta: np.ndarray) -> np.ndarray:
+    """P(correct) for every item (rows) at every ability (columns)"""
+    z = a[:, None] * (theta[None, :] - b[:, None])
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def information(a: np.ndarray, b: np.ndarray, theta: np.ndarray) -> np.ndarray:
+    """Fisher information a^2 P (1 - P) for every item at every ability"""
+    p = probability(a, b, theta)
+    return (a[:, None] ** 2) * p * (1 - p)
+
+
+@dataclass
+class ResponseMatrix:
+    """Scored responses as parallel index arrays"""
+    user_ids: List[str]
+    item_ids: List[str]
+    user_idx: np.ndarray
+    item_idx: np.ndarray
+    correct: np.ndarray
+
+
+@dataclass
+class CalibrationResult:
+    a: np.ndarray
+    b: np.ndarray
+    theta: np.ndarray
+    theta_se: np.ndarray
+    item_counts: np.ndarray
+    user_counts: np.ndarray
+    iterations: int
+    converged: bool
+    log_likelihood: float
+
+
+def _posterior(
+    user_idx: np.ndarray,
+    item_idx: np.ndarray,
+    correct: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    n_users: int
+) -> Tuple[np.ndarray, float]:
+    """E-step: each student's posterior over the quadrature nodes, and the marginal log-likelihood"""
+    p = probability(a, b, QUAD_NODES)
+    log_p, log_q = np.log(p).T, np.log1p(-p).T  # (nodes, items): contiguous per node
+
+    log_post = np.empty((n_users, len(QUAD_NODES)))
+    for k in range(len(QUAD_NODES)):
+        contrib = np.where(correct, log_p[k][item_idx], log_q[k][item_idx])
+        log_post[:, k] = np.bincount(user_idx, weights=contrib, minlength=n_users)
+    log_post += QUAD_LOG_WEIGHTS
+
+    peak = log_post.max(axis=1, keepdims=True)
+    post = np.exp(log_post - peak)
+    total = post.sum(axis=1, keepdims=True)
+    log_likelihood = float((peak + np.log(total)).sum())
+    return post / total, log_likelihood
+
+
+def _m_step(r: np.ndarray, n: np.ndarray, a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Fisher-scoring updates of (a, b) for all items at once from expected counts"""
+    d_theta = QUAD_NODES[None, :]
+    for _ in range(M_STEP_NEWTON_STEPS):
+        p = probability(a, b, QUAD_NODES)
+        resid = r - n * p
+        dist = d_theta - b[:, None]
+        w = n * p * (1 - p)
+
+        grad_a = (resid * dist).sum(axis=1) - (a - PRIOR_A_MEAN) / PRIOR_A_VAR
+        grad_b = -a * resid.sum(axis=1) - b / PRIOR_B_VAR
+        info_aa = (w * dist * dist).sum(axis=1) + 1 / PRIOR_A_VAR
+        info_bb = a * a * w.sum(axis=1) + 1 / PRIOR_B_VAR
+        info_ab = -a * (w * dist).sum(axis=1)
+
+        det = np.maximum(info_aa * info_bb - info_ab ** 2, 1e-9)
+        a = np.clip(a + (info_bb * grad_a - info_ab * grad_b) / det, *A_BOUNDS)
+        b = np.clip(b + (info_aa * grad_b - info_ab * grad_a) / det, *B_BOUNDS)
+    return a, b
+
+
+def calibrate(
+    user_idx: np.ndarray,
+    item_idx: np.ndarray,
+    correct: np.ndarray,
+    n_users: int,
+    n_items: int,
+    max_iterations: int = MAX_EM_ITERATIONS,
+    tolerance: float = EM_TOLERANCE
+) -> CalibrationResult:
+    """
+    Marginal maximum-likelihood 2PL calibration (Bock-Aitkin EM)
+
+    Args:
+        user_idx, item_idx: Student and item index of every response
+        correct: 1.0 for a correct response, 0.0 otherwise
+        n_users, n_items: Index ranges
+
+    Returns:
+        Item parameters, EAP abilities with standard errors, and convergence info
+    """
+    correct = correct.astype(np.float64)
+    item_counts = np.bincount(item_idx, minlength=n_items)
+    user_counts = np.bincount(user_idx, minlength=n_users)
+
+    # Start difficulties from observed p-values
+    p_value = (np.bincount(item_idx, weights=correct, minlength=n_items) + 0.5) / (item_counts + 1.0)
+    a = np.ones(n_items)
+    b = np.clip(-np.log(p_value / (1 - p_value)), *B_BOUNDS)
+
+    converged = False
+    log_likelihood = float("-inf")
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        post, log_likelihood = _posterior(user_idx, item_idx, correct, a, b, n_users)
+
+        # Expected responses (n) and expected correct responses (r) per item and node
+        n = np.empty((n_items, len(QUAD_NODES)))
+        r = np.empty_like(n)
+        for k in range(len(QUAD_NODES)):
+            weights = post[:, k][user_idx]
+            n[:, k] = np.bincount(item_idx, weights=weights, minlength=n_items)
+            r[:, k] = np.bincount(item_idx, weights=weights * correct, minlength=n_items)
+
+        new_a, new_b = _m_step(r, n, a, b)
+        change = max(np.abs(new_a - a).max(initial=0), np.abs(new_b - b).max(initial=0))
+        a, b = new_a, new_b
+        if change < tolerance:
+            converged = True
+            break
+
+    post, log_likelihood = _posterior(user_idx, item_idx, correct, a, b, n_users)
+    theta = post @ QUAD_NODES
+    theta_se = np.sqrt(np.maximum(post @ QUAD_NODES ** 2 - theta ** 2, 0))
+
+    return CalibrationResult(
+        a=a, b=b, theta=theta, theta_se=theta_se,
+        item_counts=item_counts, user_counts=user_counts,
+        iterations=iteration, converged=converged, log_likelihood=log_likelihood
+    )
+
+
+async def load_responses() -> Optional[ResponseMatrix]:
+    """Every answered, scored response in the attempts collection"""
+    user_pos: Dict[str, int] = {}
+    item_pos: Dict[str, int] = {}
+    users, items, outcomes = [], [], []
+
+    async for attempt in get_attempts_collection().find({}, RESPONSE_PROJECTION):
+        user = str(attempt["userId"])
+        for response in attempt.get("responses", []):
+            qid = response.get("questionId")
+            # Unanswered questions carry no evidence about the item
+            if not qid or response.get("answer") is None or "isCorrect" not in response:
+                continue
+            users.append(user_pos.setdefault(user, len(user_pos)))
+            items.append(item_pos.setdefault(qid, len(item_pos)))
+            outcomes.append(bool(response["isCorrect"]))
+
+    if not outcomes:
+        return None
+    return ResponseMatrix(
+        user_ids=list(user_pos),
+        item_ids=list(item_pos),
+        user_idx=np.array(users, dtype=np.int64),
+        item_idx=np.array(items, dtype=np.int64),
+        correct=np.array(outcomes, dtype=np.float64),
+    )
+
+
+async def _bulk_write(collection, operations: List[UpdateOne]):
+    for start in range(0, len(operations), BULK_WRITE_BATCH):
+        await collection.bulk_write(operations[start:start + BULK_WRITE_BATCH], ordered=False)
+
+
+async def run_calibration() -> Dict[str, Any]:
+    """Calibrate from the full response history and store parameters on questions and users"""
+    started = time.time()
+    data = await load_responses()
+    if data is None:
+        return {"status": "skipped", "reason": "no scored responses"}
+
+    # CPU-bound; keep the event loop responsive while it runs
+    result = await asyncio.to_thread(
+        calibrate, data.user_idx, data.item_idx, data.correct, len(data.user_ids), len(data.item_ids)
+    )
+    calibrated_at = datetime.utcnow()
+
+    question_ops = [
+        UpdateOne({"_id": ObjectId(qid)}, {"$set": {"irt": {
+            "a": round(float(result.a[i]), 4),
+            "b": round(float(result.b[i]), 4),
+            "responses": int(result.item_counts[i]),
+            "calibratedAt": calibrated_at,
+        }}})
+        for i, qid in enumerate(data.item_ids)
+        if result.item_counts[i] >= MIN_ITEM_RESPONSES and ObjectId.is_valid(qid)
+    ]
+    user_ops = [
+        UpdateOne({"_id": ObjectId(uid)}, {"$set": {"ability": {
+            "theta": round(float(result.theta[i]), 4),
+            "se": round(float(result.theta_se[i]), 4),
+            "responses": int(result.user_counts[i]),
+            "calibratedAt": calibrated_at,
+        }}})
+        for i, uid in enumerate(data.user_ids)
+        if result.user_counts[i] >= MIN_USER_RESPONSES
+    ]
+    await _bulk_write(get_questions_collection(), question_ops)
+    await _bulk_write(get_users_collection(), user_ops)
+    # Cached user documents still carry the previous ability estimates
+    await clear_user_cache()
+    await item_bank.load()
+
+    summary = {
+        "status": "success",
+        "responses": len(data.correct),
+        "items": len(data.item_ids),
+        "itemsCalibrated": len(question_ops),
+        "students": len(data.user_ids),
+        "studentsCalibrated": len(user_ops),
+        "iterations": result.iterations,
+        "converged": result.converged,
+        "logLikelihood": round(result.log_likelihood, 2),
+        "seconds": round(time.time() - started, 2),
+    }
+    logger.info(f"IRT calibration: {summary}")
+    return summary
+
+
+class ItemInformationTable:
+    """Calibrated items with per-ability information rankings precomputed on THETA_GRID"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.a = np.empty(0)
+        self.b = np.empty(0)
+        self.section_masks: Dict[str, np.ndarray] = {}
+        self.topic_masks: Dict[str, np.ndarray] = {}
+        self.ranked = np.empty((len(THETA_GRID), 0), dtype=np.int32)  # grid point -> items by information
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.ids)
+
+    def build(self, items: List[Dict[str, Any]]):
+        """Index calibrated question documents (each with `irt.a`/`irt.b`)"""
+        self.clear()
+        if not items:
+            return
+        self.ids = [str(q["_id"]) for q in items]
+        self.positions = {qid: i for i, qid in enumerate(self.ids)}
+        self.a = np.array([q["irt"]["a"] for q in items], dtype=np.float64)
+        self.b = np.array([q["irt"]["b"] for q in items], dtype=np.float64)
+
+        sections = np.array([(q.get("section") or "").upper() for q in items])
+        topics = np.array([q.get("topic") or "" for q in items])
+        self.section_masks = {s: sections == s for s in np.unique(sections)}
+        self.topic_masks = {t: topics == t for t in np.unique(topics)}
+
+        info = information(self.a, self.b, THETA_GRID)
+        self.ranked = np.ascontiguousarray(np.argsort(-info, axis=0).T.astype(np.int32))
+
+    async def load(self):
+        """Load calibrated items from the questions collection (called at startup and after calibration)"""
+        items = await get_questions_collection().find(
+            {"irt": {"$exists": True}},
+            {"irt": 1, "section": 1, "topic": 1}
+        ).to_list(length=None)
+        self.build(items)
+        print(f"📐 IRT item bank loaded: {len(self.ids)} calibrated questions")
+
+    def estimate_ability(
+        self,
+        responses: Iterable[Tuple[str, bool]],
+        prior_mean: float = 0.0,
+        prior_sd: float = 1.0
+    ) -> Tuple[float, float]:
+        """EAP ability from (questionId, correct) pairs on calibrated items, given a normal prior"""
+        log_post = -0.5 * ((THETA_GRID - prior_mean) / prior_sd) ** 2
+        rows = [(self.positions[qid], bool(ok)) for qid, ok in responses if qid in self.positions]
+        if rows:
+            idx = np.array([i for i, _ in rows])
+            outcome = np.array([ok for _, ok in rows])
+            p = probability(self.a[idx], self.b[idx], THETA_GRID)
+            log_post = log_post + np.where(outcome[:, None], np.log(p), np.log1p(-p)).sum(axis=0)
+
+        post = np.exp(log_post - log_post.max())
+        post /= post.sum()
+        theta = float(post @ THETA_GRID)
+        se = float(np.sqrt(max(post @ THETA_GRID ** 2 - theta ** 2, 0)))
+        return theta, se
+
+    def select(
+        self,
+        theta: float,
+        exclude: Set[str] = frozenset(),
+        section: Optional[str] = None,
+        topic: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """Most informative eligible item at `theta`, with its information"""
+        if not self.ids:
+            return None
+
+        eligible = np.ones(len(self.ids), dtype=bool)
+        if section:
+            eligible &= self.section_masks.get(section.upper(), np.zeros_like(eligible))
+        if topic:
+            eligible &= self.topic_masks.get(topic, np.zeros_like(eligible))
+        excluded = [self.positions[qid] for qid in exclude if qid in self.positions]
+        eligible[excluded] = False
+
+        grid_point = int(np.abs(THETA_GRID - theta).argmin())
+        ranked = self.ranked[grid_point]
+        first = int(eligible[ranked].argmax())
+        if not eligible[ranked[first]]:
+            return None
+
+        best = int(ranked[first])
+        info = float(information(self.a[best:best + 1], self.b[best:best + 1], np.array([theta]))[0, 0])
+        return self.ids[best], info
+
+
+item_bank = ItemInformationTable()
+
+
+if __name__ == "__main__":
+    from db.mongodb import MongoDB
+
+    async def _main():
+        await MongoDB.connect()
+        try:
+            print(await run_calibration())
+        finally:
+            await MongoDB.disconnect()
+
+    asyncio.run(_main())
@@ -0,0 +1,109 @@
+"""
+Passage Store
+RC passages and DILR caselets stored once in `passages`, keyed by a hash of
+their text; questions carry a `passageId` instead of their own copy
+"""
+
+import hashlib
+import re
+from datetime import datetime
+from typing import Dict, Any, Iterable, List
+from pymongo import UpdateOne
+
+from config.settings import get_settings
+from db.mongodb import get_passages_collection
+from services.lru_cache import LRUCache
+
+settings = get_settings()
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# passage id -> text; content-addressed, so entries never go stale
+_passages = LRUCache(maxsize=settings.passage_cache_size)
+
+
+def passage_key(text: str) -> str:
+    """Content hash identifying a passage (whitespace differences ignored)"""
+    return hashlib.sha256(_WHITESPACE_RE.sub(" ", text).strip().encode()).hexdigest()[:32]
+
+
+def passage_upserts(texts: Iterable[str]) -> Dict[str, UpdateOne]:
+    """Idempotent inserts for passages, keyed by passage id"""
+    now = datetime.utcnow()
+    operations = {}
+    for text in texts:
+        key = passage_key(text)
+        if key not in operations:
+            operations[key] = UpdateOne(
+                {"_id": key},
+                {"$setOnInsert": {"text": text.strip(), "createdAt": now}},
+                upsert=True
+            )
+    return operations
+
+
+def has_passage(doc: Dict[str, Any]) -> bool:
+    passage = doc.get("passage")
+    return isinstance(passage, str) and bool(passage.strip())
+
+
+async def externalize_passages(docs: List[Dict[str, Any]]):
+    """
+    Store the passages of questions about to be inserted and set each one's
+    `passageId` (the caller drops `passage` from what it writes)
+    """
+    with_passage = [doc for doc in docs if has_passage(doc)]
+    if not with_passage:
+        return
+    operations = passage_upserts(doc["passage"] for doc in with_passage)
+    await get_passages_collection().bulk_write(list(operations.values()), ordered=False)
+    for doc in with_passage:
+        doc["passageId"] = passage_key(doc["passage"])
+        _passages.set(doc["passageId"], doc["passage"].strip())
+
+
+async def get_passages(passage_ids: Iterable[str]) -> Dict[str, str]:
+    """Passage texts by id, from memory when possible, otherwise in a single $in query"""
+    texts: Dict[str, str] = {}
+    missing = []
+    for pid in set(filter(None, passage_ids)):
+        text = _passages.get(pid)
+        if text is None:
+            missing.append(pid)
+        else:
+            texts[pid] = text
+
+    if missing:
+        async for doc in get_passages_collection().find({"_id": {"$in": missing}}):
+            texts[doc["_id"]] = doc["text"]
+            _passages.set(doc["_id"], doc["text"])
+    return texts
+
+
+async def attach_passages(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill `passage` on question documents that only reference one (in place)"""
+    texts = await get_passages([doc.get("passageId") for doc in docs if not doc.get("passage")])
+    for doc in docs:
+        if not doc.get("passage") and doc.get("passageId"):
+            doc["passage"] = texts.get(doc["passageId"])
+    return docs
+
+
+async def passage_map(docs: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Passages shared by a set of questions, keyed by id, with each question's
+    `passageId` set; inline passages (not yet migrated) are keyed by their hash
+    """
+    passages: Dict[str, str] = {}
+    for doc in docs:
+        if has_passage(doc):
+            doc.setdefault("passageId", passage_key(doc["passage"]))
+            passages[doc["passageId"]] = doc["passage"].strip()
+    passages.update(await get_passages(
+        doc["passageId"] for doc in docs if doc.get("passageId") and doc["passageId"] not in passages
+    ))
+    return passages
+
+
+def passage_cache_stats() -> Dict[str, Any]:
+    return _passages.stats()
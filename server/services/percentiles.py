@@ -0,0 +1,147 @@
+"""
+Percentile Service
+Per-test score histograms maintained with $inc at submission; percentile and
+rank are read off a histogram without scanning attempts
+
+Rebuild histograms from historical attempts with:  python -m services.percentiles
+"""
+
+import asyncio
+import logging
+import math
+from datetime import datetime
+from typing import Dict, Any, Iterable, List
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from db.mongodb import get_attempts_collection, get_score_histograms_collection
+
+logger = logging.getLogger(__name__)
+
+BULK_WRITE_BATCH = 1000
+
+
+def score_bucket(obtained: float) -> str:
+    """Histogram key for a score (marks are whole numbers and may be negative)"""
+    return str(math.floor(obtained))
+
+
+def standing(counts: Dict[str, int], obtained: float) -> Dict[str, Any]:
+    """
+    Percentile (share scoring below, counting ties as half) and rank
+    (1 + number scoring strictly higher) of a score within a histogram
+    """
+    bucket = int(score_bucket(obtained))
+    below = equal = above = 0
+    for key, n in counts.items():
+        score = int(key)
+        if score < bucket:
+            below += n
+        elif score > bucket:
+            above += n
+        else:
+            equal += n
+
+    participants = below + equal + above
+    if not participants:
+        return {"percentile": 0.0, "rank": None, "participants": 0}
+    return {
+        "percentile": round(100 * (below + 0.5 * equal) / participants, 2),
+        "rank": above + 1,
+        "participants": participants,
+    }
+
+
+async def record_score(test_id: str, obtained: float) -> Dict[str, Any]:
+    """Add a submitted score to its test's histogram and return its standing"""
+    histograms_col = get_score_histograms_collection()
+    histogram = await histograms_col.find_one_and_update(
+        {"_id": ObjectId(test_id)},
+        {
+            "$inc": {f"counts.{score_bucket(obtained)}": 1, "participants": 1},
+            "$set": {"updatedAt": datetime.utcnow()},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        projection={"counts": 1},
+    )
+    return standing(histogram.get("counts", {}), obtained)
+
+
+async def get_histograms(test_ids: Iterable[Any]) -> Dict[str, Dict[str, int]]:
+    """Score counts for several tests in one query, keyed by test id"""
+    ids = list({ObjectId(str(t)) for t in test_ids if t and ObjectId.is_valid(str(t))})
+    if not ids:
+        return {}
+    histograms = {}
+    async for doc in get_score_histograms_collection().find({"_id": {"$in": ids}}, {"counts": 1}):
+        histograms[str(doc["_id"])] = doc.get("counts", {})
+    return histograms
+
+
+async def backfill_histograms() -> Dict[str, Any]:
+    """
+    Rebuild every histogram from the attempts collection, then refresh the
+    percentile stored on each attempt. Run while submissions are quiet:
+    scores submitted during the rebuild can be counted twice or missed.
+    """
+    attempts_col = get_attempts_collection()
+    histograms: Dict[ObjectId, Dict[str, int]] = {}
+    async for row in attempts_col.aggregate([
+        {"$match": {"score.obtained": {"$type": "number"}}},
+        {"$group": {"_id": {"test": "$testId", "score": {"$floor": "$score.obtained"}}, "n": {"$sum": 1}}},
+    ], allowDiskUse=True):
+        counts = histograms.setdefault(row["_id"]["test"], {})
+        key = score_bucket(row["_id"]["score"])
+        counts[key] = counts.get(key, 0) + row["n"]
+
+    now = datetime.utcnow()
+    histogram_ops = [
+        UpdateOne(
+            {"_id": test_id},
+            {"$set": {"counts": counts, "participants": sum(counts.values()), "updatedAt": now}},
+            upsert=True
+        )
+        for test_id, counts in histograms.items()
+    ]
+    await _bulk_write(get_score_histograms_collection(), histogram_ops)
+
+    attempt_ops: List[UpdateOne] = []
+    updated = 0
+    async for attempt in attempts_col.find(
+        {"score.obtained": {"$type": "number"}},
+        {"testId": 1, "score.obtained": 1}
+    ):
+        result = standing(histograms.get(attempt["testId"], {}), attempt["score"]["obtained"])
+        attempt_ops.append(UpdateOne(
+            {"_id": attempt["_id"]},
+            {"$set": {"score.percentile": result["percentile"], "score.rank": result["rank"]}}
+        ))
+        if len(attempt_ops) >= BULK_WRITE_BATCH:
+            await _bulk_write(attempts_col, attempt_ops)
+            updated += len(attempt_ops)
+            attempt_ops = []
+    await _bulk_write(attempts_col, attempt_ops)
+    updated += len(attempt_ops)
+
+    summary = {"tests": len(histograms), "attemptsUpdated": updated}
+    logger.info(f"Score histogram backfill: {summary}")
+    return summary
+
+
+async def _bulk_write(collection, operations: List[UpdateOne]):
+    for start in range(0, len(operations), BULK_WRITE_BATCH):
+        await collection.bulk_write(operations[start:start + BULK_WRITE_BATCH], ordered=False)
+
+
+if __name__ == "__main__":
+    from db.mongodb import MongoDB
+
+    async def _main():
+        await MongoDB.connect()
+        try:
+            print(await backfill_histograms())
+        finally:
+            await MongoDB.disconnect()
+
+    asyncio.run(_main())
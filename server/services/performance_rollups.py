@@ -0,0 +1,161 @@
+"""
+Performance Rollups Service
+Per-user section and topic counters maintained with $inc at submission;
+accuracy and the profile's performance view are derived on read
+
+Rebuild every user's rollups from historical attempts with:  python -m services.performance_rollups
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, List
+from pymongo import UpdateOne
+
+from db.mongodb import get_attempts_collection, get_users_collection
+
+logger = logging.getLogger(__name__)
+
+# Counters kept for every section and topic
+COUNTERS = ("attempted", "correct", "incorrect", "unattempted", "timeSpent")
+
+# Derived weak topics need this much evidence
+WEAK_TOPIC_MIN_ATTEMPTED = 3
+WEAK_TOPIC_ACCURACY = 60
+MAX_WEAK_TOPICS = 5
+
+BULK_WRITE_BATCH = 500
+
+
+def field_key(name: str) -> str:
+    """Escape a section/topic name for use as a Mongo field name ('.' and a leading '$' are not allowed)"""
+    key = (name or "General").replace("%", "%25").replace(".", "%2E")
+    return "%24" + key[1:] if key.startswith("$") else key
+
+
+def from_field_key(key: str) -> str:
+    return key.replace("%2E", ".").replace("%24", "$").replace("%25", "%")
+
+
+def _bucket_counts(bucket: Dict[str, Any]) -> Dict[str, int]:
+    return {
+        "attempted": bucket.get("correct", 0) + bucket.get("incorrect", 0),
+        "correct": bucket.get("correct", 0),
+        "incorrect": bucket.get("incorrect", 0),
+        "unattempted": bucket.get("unattempted", 0),
+        "timeSpent": bucket.get("timeSpent", 0),
+    }
+
+
+def rollup_increments(score: Dict[str, Any]) -> Dict[str, int]:
+    """Counter increments adding one scored attempt to a user's rollups (applied by user_stats)"""
+    inc = {
+        "rollups.tests": 1,
+        "rollups.obtained": score.get("obtained", 0),
+        "rollups.total": score.get("total", 0),
+        "rollups.percentageSum": score.get("percentage", 0),
+    }
+    for bucket in score.get("sections", []):
+        prefix = f"rollups.sections.{field_key(bucket['section'])}"
+        for counter, value in _bucket_counts(bucket).items():
+            inc[f"{prefix}.{counter}"] = inc.get(f"{prefix}.{counter}", 0) + value
+    # Topics are tracked across sections, matching the profile's topicWise map
+    for bucket in score.get("topics", []):
+        prefix = f"rollups.topics.{field_key(bucket['topic'])}"
+        for counter, value in _bucket_counts(bucket).items():
+            inc[f"{prefix}.{counter}"] = inc.get(f"{prefix}.{counter}", 0) + value
+    return inc
+
+
+def _accuracy(counters: Dict[str, int]) -> float:
+    attempted = counters.get("attempted", 0)
+    return round(100 * counters.get("correct", 0) / attempted, 1) if attempted else 0
+
+
+def _with_rates(counters: Dict[str, int]) -> Dict[str, Any]:
+    answered = counters.get("attempted", 0) + counters.get("unattempted", 0)
+    return {
+        **{c: counters.get(c, 0) for c in COUNTERS},
+        "accuracy": _accuracy(counters),
+        "avgTimePerQuestion": round(counters.get("timeSpent", 0) / answered, 1) if answered else 0,
+    }
+
+
+def performance_view(user: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The user's performance map (sectionWise/topicWise accuracy, weakTopics,
+    averageScore) derived from rollups; the stored `performance` is used for
+    users without any rollups yet
+    """
+    stored = user.get("performance") or {}
+    rollups = user.get("rollups")
+    if not rollups or not rollups.get("tests"):
+        return stored
+
+    sections = {from_field_key(k): _with_rates(v) for k, v in rollups.get("sections", {}).items()}
+    topics = {from_field_key(k): _with_rates(v) for k, v in rollups.get("topics", {}).items()}
+
+    derived_weak = sorted(
+        (t for t, v in topics.items()
+         if v["attempted"] >= WEAK_TOPIC_MIN_ATTEMPTED and v["accuracy"] < WEAK_TOPIC_ACCURACY),
+        key=lambda t: topics[t]["accuracy"]
+    )[:MAX_WEAK_TOPICS]
+
+    return {
+        **stored,
+        "sectionWise": {s: v["accuracy"] for s, v in sections.items()},
+        "topicWise": {t: v["accuracy"] for t, v in topics.items()},
+        # The Detective's latest findings win over the counter-derived list
+        "weakTopics": stored.get("weakTopics") or derived_weak,
+        "averageScore": round(rollups.get("percentageSum", 0) / rollups["tests"], 1),
+        "sections": sections,
+        "topics": topics,
+    }
+
+
+def _nest(paths: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn {"a.b.c": 1} into {"a": {"b": {"c": 1}}}"""
+    nested: Dict[str, Any] = {}
+    for path, value in paths.items():
+        node = nested
+        *parents, leaf = path.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return nested
+
+
+async def rebuild_rollups() -> Dict[str, Any]:
+    """Recompute every user's rollups from their attempts (overwrites existing rollups)"""
+    rollups: Dict[Any, Dict[str, Any]] = {}
+    async for attempt in get_attempts_collection().find(
+        {"score.sections": {"$exists": True}},
+        {"userId": 1, "score": 1}
+    ):
+        user_rollup = rollups.setdefault(attempt["userId"], {})
+        for path, value in rollup_increments(attempt["score"]).items():
+            user_rollup[path] = user_rollup.get(path, 0) + value
+
+    operations: List[UpdateOne] = [
+        UpdateOne({"_id": user_id}, {"$set": {"rollups": _nest(paths)["rollups"]}})
+        for user_id, paths in rollups.items()
+    ]
+    users_col = get_users_collection()
+    for start in range(0, len(operations), BULK_WRITE_BATCH):
+        await users_col.bulk_write(operations[start:start + BULK_WRITE_BATCH], ordered=False)
+
+    summary = {"users": len(rollups)}
+    logger.info(f"Performance rollup rebuild: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    from db.mongodb import MongoDB
+
+    async def _main():
+        await MongoDB.connect()
+        try:
+            print(await rebuild_rollups())
+        finally:
+            await MongoDB.disconnect()
+
+    asyncio.run(_main())
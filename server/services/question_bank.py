@@ -0,0 +1,127 @@
+"""
+Question Bank Service
+Single write path for the questions collection (near-duplicate checks on insert,
+shared passages moved to the passage store)
+"""
+
+import inspect
+import logging
+from typing import Dict, Any, List, Optional, Callable
+
+from config.settings import get_settings
+from db.mongodb import get_questions_collection
+from services.question_dedup import dedup_index, minhash, similarity, question_passage_id
+from services.passages import externalize_passages
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DEDUP_POLICIES = ("reuse", "reject", "off")
+
+# Called with the newly inserted documents (each carrying `_id`) after every insert
+_insert_hooks: List[Callable[[List[Dict[str, Any]]], Any]] = []
+
+
+def register_insert_hook(hook: Callable[[List[Dict[str, Any]]], Any]):
+    """Keep an in-memory structure in sync with question inserts (sync or async hook)"""
+    if hook not in _insert_hooks:
+        _insert_hooks.append(hook)
+
+
+async def _run_insert_hooks(inserted: List[Dict[str, Any]]):
+    for hook in _insert_hooks:
+        try:
+            result = hook(inserted)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"Question insert hook {getattr(hook, '__qualname__', hook)} failed: {e}")
+
+
+async def insert_questions(docs: List[Dict[str, Any]], policy: Optional[str] = None) -> List[Optional[str]]:
+    """
+    Insert questions, skipping near-duplicates of the bank and of each other
+
+    Args:
+        docs: Question documents (newly inserted ones get their `_id` set)
+        policy: "reuse" returns the existing question's id for a duplicate,
+                "reject" drops it (None in the returned list),
+                "off" inserts everything (still fingerprinted and indexed)
+
+    Returns:
+        Question ids aligned with `docs`
+    
+    Passages are written to the passage store and referenced by `passageId`;
+    the stored question has no `passage` copy, but `docs` keep theirs for the
+    caller and the insert hooks.
+    """
+    policy = policy or settings.dedup_policy
+    if policy not in DEDUP_POLICIES:
+        raise ValueError(f"Unknown dedup policy: {policy}")
+
+    ids: List[Optional[str]] = [None] * len(docs)
+    to_insert: List[int] = []
+    batch_duplicates: Dict[int, int] = {}  # position -> position of its first copy
+
+    for i, doc in enumerate(docs):
+        signature = minhash(doc)
+        passage_id = question_passage_id(doc)
+        dedup_index.metrics["checked"] += 1
+
+        existing_id = dedup_index.find_duplicate(signature, passage_id=passage_id) if policy != "off" else None
+        first_copy = None
+        if existing_id is None and policy != "off":
+            first_copy = next(
+                (
+                    j for j in to_insert
+                    if question_passage_id(docs[j]) == passage_id
+                    and similarity(signature, docs[j]["minhash"]) >= settings.dedup_threshold
+                ),
+                None
+            )
+
+        if existing_id is None and first_copy is None:
+            doc["minhash"] = signature
+            to_insert.append(i)
+            continue
+
+        if policy == "reuse":
+            dedup_index.metrics["reused"] += 1
+            if existing_id is not None:
+                ids[i] = existing_id
+            else:
+                batch_duplicates[i] = first_copy
+        else:
+            dedup_index.metrics["rejected"] += 1
+
+    if to_insert:
+        await externalize_passages([docs[i] for i in to_insert])
+        result = await get_questions_collection().insert_many([
+            {k: v for k, v in docs[i].items() if not (k == "passage" and "passageId" in docs[i])}
+            for i in to_insert
+        ])
+        for i, inserted_id in zip(to_insert, result.inserted_ids):
+            docs[i]["_id"] = inserted_id
+            ids[i] = str(inserted_id)
+            dedup_index.add(ids[i], docs[i]["minhash"], question_passage_id(docs[i]))
+        dedup_index.metrics["inserted"] += len(to_insert)
+        await _run_insert_hooks([docs[i] for i in to_insert])
+
+    for i, first_copy in batch_duplicates.items():
+        ids[i] = ids[first_copy]
+
+    skipped = len(docs) - len(to_insert)
+    if skipped:
+        logger.info(f"Question bank: {skipped}/{len(docs)} near-duplicates ({policy})")
+    return ids
+
+
+def unique_ids(ids: List[Optional[str]]) -> List[str]:
+    """Drop rejected (None) and repeated ids, keeping order"""
+    seen = set()
+    ordered = []
+    for qid in ids:
+        if qid and qid not in seen:
+            seen.add(qid)
+            ordered.append(qid)
+    return ordered
@@ -0,0 +1,261 @@
+"""
+Question Catalog
+Compact in-memory question metadata with bitmap indexes per attribute
+
+Each attribute value maps to a bitmap (a Python int used as a bitset, bit i =
+catalog row i), so filters like "QA and Geometry and hard and not seen by this
+user" are a handful of bitwise ANDs instead of a Mongo query.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import timedelta
+from typing import Dict, Any, Iterable, List, Optional, Union
+from bson import ObjectId
+
+from config.settings import get_settings
+from db.mongodb import get_questions_collection, get_attempts_collection
+from services.lru_cache import LRUCache
+from services.question_bank import register_insert_hook
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+INDEXED_ATTRIBUTES = ("section", "topic", "difficulty", "type")
+CATALOG_PROJECTION = {"section": 1, "topic": 1, "difficulty": 1, "type": 1, "avgTimeSeconds": 1}
+
+Values = Optional[Union[str, Iterable[str]]]
+
+# Each refresh re-reads this far behind the newest id it has seen: ids come from
+# the inserting process's clock, so other workers' inserts can land slightly below it
+TAIL_OVERLAP = timedelta(seconds=30)
+
+
+def bit_positions(bitmap: int) -> List[int]:
+    """Row numbers of the set bits, in ascending order"""
+    bits = bin(bitmap)[:1:-1]  # Least significant bit first
+    positions = []
+    position = bits.find("1")
+    while position != -1:
+        positions.append(position)
+        position = bits.find("1", position + 1)
+    return positions
+
+
+def popcount(bitmap: int) -> int:
+    return bin(bitmap).count("1")
+
+
+def bitmap_from_rows(rows: Iterable[int], size: int) -> int:
+    """Bitmap with the given rows set, built in one pass"""
+    buffer = bytearray((size + 7) // 8)
+    for row in rows:
+        buffer[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class QuestionCatalog:
+    """Question metadata rows plus one bitmap per attribute value"""
+
+    def __init__(self):
+        self.clear()
+        self._seen = LRUCache(maxsize=settings.catalog_seen_cache_size)
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def clear(self):
+        """Drop every row and index"""
+        self.ids: List[str] = []
+        self.avg_times: List[int] = []
+        self.rows: Dict[str, int] = {}
+        self.bitmaps: Dict[str, Dict[str, int]] = {attr: {} for attr in INDEXED_ATTRIBUTES}
+        self.all_rows = 0
+        # Newest id read from the collection by load()/tail(); this process's own inserts don't move it
+        self.tailed_id: Optional[ObjectId] = None
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.ids)
+
+    @staticmethod
+    def _value(attr: str, doc: Dict[str, Any]) -> str:
+        value = doc.get(attr) or ""
+        return value.upper() if attr == "section" else value
+
+    def _append_row(self, doc: Dict[str, Any]) -> Optional[int]:
+        """Give a question the next row; None if already catalogued"""
+        question_id = str(doc["_id"])
+        if question_id in self.rows:
+            return None
+        row = len(self.ids)
+        self.rows[question_id] = row
+        self.ids.append(question_id)
+        self.avg_times.append(int(doc.get("avgTimeSeconds") or 0))
+        return row
+
+    def _saw_id(self, doc_id: Any):
+        if isinstance(doc_id, ObjectId) and (self.tailed_id is None or doc_id > self.tailed_id):
+            self.tailed_id = doc_id
+
+    def add(self, doc: Dict[str, Any]):
+        """Add one question (no-op if already catalogued)"""
+        row = self._append_row(doc)
+        if row is None:
+            return
+
+        bit = 1 << row
+        self.all_rows |= bit
+        for attr in INDEXED_ATTRIBUTES:
+            index = self.bitmaps[attr]
+            value = self._value(attr, doc)
+            index[value] = index.get(value, 0) | bit
+
+    def add_many(self, docs: List[Dict[str, Any]]):
+        """Insert hook: catalogue newly stored questions"""
+        for doc in docs:
+            self.add(doc)
+
+    def _match(self, attr: str, values: Values) -> int:
+        if values is None:
+            return self.all_rows
+        if isinstance(values, str):
+            values = [values]
+        index = self.bitmaps[attr]
+        bitmap = 0
+        for value in values:
+            bitmap |= index.get(value.upper() if attr == "section" else value, 0)
+        return bitmap
+
+    def bitmap_for_ids(self, question_ids: Iterable[str]) -> int:
+        """Bitmap of the catalogued questions among `question_ids`"""
+        bitmap = 0
+        for qid in question_ids:
+            row = self.rows.get(str(qid))
+            if row is not None:
+                bitmap |= 1 << row
+        return bitmap
+
+    def filter(
+        self,
+        section: Values = None,
+        topic: Values = None,
+        difficulty: Values = None,
+        type: Values = None,
+        exclude: int = 0
+    ) -> int:
+        """Bitmap of questions matching every given attribute (any of its values) minus `exclude`"""
+        bitmap = self.all_rows
+        for attr, values in (("section", section), ("topic", topic), ("difficulty", difficulty), ("type", type)):
+            if values is not None:
+                bitmap &= self._match(attr, values)
+        return bitmap & ~exclude
+
+    def count(self, bitmap: int) -> int:
+        return popcount(bitmap)
+
+    def ids_for(self, bitmap: int) -> List[str]:
+        return [self.ids[row] for row in bit_positions(bitmap)]
+
+    def sample(self, bitmap: int, k: int, rng: Optional[random.Random] = None) -> List[str]:
+        """Up to `k` random question ids from a bitmap"""
+        rows = bit_positions(bitmap)
+        rows = (rng or random).sample(rows, min(k, len(rows)))
+        return [self.ids[row] for row in rows]
+
+    def avg_time(self, question_id: str) -> int:
+        row = self.rows.get(str(question_id))
+        return self.avg_times[row] if row is not None else 0
+
+    async def seen_by(self, user_id: str) -> int:
+        """Bitmap of questions the user has already answered in any attempt"""
+        bitmap = self._seen.get(user_id)
+        if bitmap is not None:
+            return bitmap
+
+        question_ids = set()
+        async for attempt in get_attempts_collection().find(
+            {"userId": ObjectId(user_id)},
+            {"responses.questionId": 1, "_id": 0}
+        ):
+            question_ids.update(r.get("questionId") for r in attempt.get("responses", []))
+
+        bitmap = self.bitmap_for_ids(qid for qid in question_ids if qid)
+        self._seen.set(user_id, bitmap)
+        return bitmap
+
+    def mark_seen(self, user_id: str, question_ids: Iterable[str]):
+        """Record newly answered questions for a user whose seen-set is cached"""
+        bitmap = self._seen.get(user_id)
+        if bitmap is not None:
+            self._seen.set(user_id, bitmap | self.bitmap_for_ids(question_ids))
+
+    async def load(self):
+        """Load metadata for the whole questions collection (called at startup)"""
+        self.clear()
+        # Rows per attribute value, turned into bitmaps once at the end
+        value_rows: Dict[str, Dict[str, List[int]]] = {attr: {} for attr in INDEXED_ATTRIBUTES}
+        async for doc in get_questions_collection().find({}, CATALOG_PROJECTION):
+            self._saw_id(doc["_id"])
+            row = self._append_row(doc)
+            if row is None:
+                continue
+            for attr in INDEXED_ATTRIBUTES:
+                value_rows[attr].setdefault(self._value(attr, doc), []).append(row)
+
+        size = len(self.ids)
+        self.all_rows = (1 << size) - 1
+        self.bitmaps = {
+            attr: {value: bitmap_from_rows(rows, size) for value, rows in values.items()}
+            for attr, values in value_rows.items()
+        }
+        print(f"🗂️ Question catalog loaded: {len(self.ids)} questions")
+
+    async def tail(self) -> int:
+        """Pick up questions inserted by other processes since the last refresh"""
+        query = {}
+        if self.tailed_id is not None:
+            query = {"_id": {"$gte": ObjectId.from_datetime(self.tailed_id.generation_time - TAIL_OVERLAP)}}
+        added = 0
+        async for doc in get_questions_collection().find(query, CATALOG_PROJECTION).sort("_id", 1):
+            self._saw_id(doc["_id"])
+            if str(doc["_id"]) not in self.rows:
+                self.add(doc)
+                added += 1
+        return added
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(settings.catalog_refresh_interval_seconds)
+            try:
+                added = await self.tail()
+                if added:
+                    logger.info(f"Question catalog: {added} new questions")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Question catalog refresh failed: {e}")
+
+    def start_refresh(self):
+        """Start tailing inserts in the background (called from the app lifespan)"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_refresh(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "questions": len(self.ids),
+            "values": {attr: len(index) for attr, index in self.bitmaps.items()},
+            "seenCache": self._seen.stats(),
+        }
+
+
+question_catalog = QuestionCatalog()
+register_insert_hook(question_catalog.add_many)
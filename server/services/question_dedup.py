@@ -0,0 +1,158 @@
+"""
+Question Dedup Index
+MinHash fingerprints with an in-memory LSH index for near-duplicate detection
+"""
+
+import hashlib
+import random
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from config.settings import get_settings
+from db.mongodb import get_questions_collection
+from services.generation_planner import normalize_text
+from services.passages import has_passage, passage_key
+
+settings = get_settings()
+
+# 64 permutations split into 16 bands of 4 rows: pairs above ~0.6 Jaccard
+# almost always share a band; candidates are then verified against the threshold
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5  # Character shingles, robust to small wording edits
+
+# Signature values stay below 2^31 so they are stored as BSON int32
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = random.Random(20240601)  # Fixed seed: signatures are persisted on questions
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+
+def question_text(doc: Dict[str, Any]) -> str:
+    """Text a question is fingerprinted on: stem plus option texts"""
+    options = doc.get("options") or []
+    option_text = " ".join(o.get("text", "") if isinstance(o, dict) else str(o) for o in options)
+    return normalize_text(f"{doc.get('question', '')} {option_text}")
+
+
+def question_passage_id(doc: Dict[str, Any]) -> Optional[str]:
+    """
+    Passage a question belongs to (None for standalone questions); the same
+    stem and options over a different passage or caselet is a different question
+    """
+    if doc.get("passageId"):
+        return doc["passageId"]
+    return passage_key(doc["passage"]) if has_passage(doc) else None
+
+
+def shingles(text: str) -> Set[str]:
+    """Character n-gram shingles (the whole text for very short questions)"""
+    if len(text) < SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(doc: Dict[str, Any]) -> List[int]:
+    """MinHash signature of a question"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little")
+        for s in shingles(question_text(doc))
+    ]
+    if not hashes:
+        return [0] * NUM_PERM
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimated Jaccard similarity between two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def _bands(signature: List[int]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(band, tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+class DedupIndex:
+    """LSH buckets over question MinHash signatures"""
+
+    def __init__(self):
+        self.signatures: Dict[str, List[int]] = {}
+        self.passages: Dict[str, str] = {}  # question id -> passage id (standalone questions omitted)
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self.metrics = {
+            "startedAt": time.time(),
+            "bankSizeAtStart": 0,
+            "checked": 0,
+            "inserted": 0,
+            "reused": 0,
+            "rejected": 0,
+        }
+
+    def add(self, question_id: str, signature: List[int], passage_id: Optional[str] = None):
+        """Index a stored question"""
+        self.signatures[question_id] = signature
+        if passage_id:
+            self.passages[question_id] = passage_id
+        for band in _bands(signature):
+            self.buckets.setdefault(band, set()).add(question_id)
+
+    def find_duplicate(
+        self,
+        signature: List[int],
+        threshold: Optional[float] = None,
+        passage_id: Optional[str] = None,
+    ) -> Optional[str]:
+        """Id of the most similar indexed question on the same passage above the threshold, if any"""
+        threshold = threshold if threshold is not None else settings.dedup_threshold
+        candidates = set()
+        for band in _bands(signature):
+            candidates |= self.buckets.get(band, set())
+
+        best_id, best_score = None, threshold
+        for candidate in candidates:
+            if self.passages.get(candidate) != passage_id:
+                continue
+            score = similarity(signature, self.signatures[candidate])
+            if score >= best_score:
+                best_id, best_score = candidate, score
+        return best_id
+
+    async def rebuild(self):
+        """Load every question's signature (computing any that were never stored)"""
+        self.signatures.clear()
+        self.passages.clear()
+        self.buckets.clear()
+
+        questions_col = get_questions_collection()
+        async for doc in questions_col.find({}, {"minhash": 1, "question": 1, "options": 1, "passageId": 1, "passage": 1}):
+            signature = doc.get("minhash")
+            if not signature or len(signature) != NUM_PERM:
+                signature = minhash(doc)
+            self.add(str(doc["_id"]), signature, question_passage_id(doc))
+
+        self.metrics["bankSizeAtStart"] = len(self.signatures)
+        print(f"🧬 Dedup index loaded: {len(self.signatures)} questions")
+
+    def stats(self) -> Dict[str, Any]:
+        """Dedupe rates and bank growth since startup"""
+        checked = self.metrics["checked"]
+        duplicates = self.metrics["reused"] + self.metrics["rejected"]
+        hours = max((time.time() - self.metrics["startedAt"]) / 3600, 1 / 3600)
+        return {
+            "bankSize": len(self.signatures),
+            "bankSizeAtStart": self.metrics["bankSizeAtStart"],
+            "checked": checked,
+            "inserted": self.metrics["inserted"],
+            "reused": self.metrics["reused"],
+            "rejected": self.metrics["rejected"],
+            "duplicateRate": round(duplicates / checked, 3) if checked else 0,
+            "growthPerHour": round(self.metrics["inserted"] / hours, 2),
+            "policy": settings.dedup_policy,
+            "threshold": settings.dedup_threshold,
+        }
+
+
+dedup_index = DedupIndex()
@@ -0,0 +1,307 @@
+"""
+Question Inventory Service
+Pre-generated, validated questions per (section, topic, difficulty) bucket,
+topped up in the background so generation requests are served instantly
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Any, List, Optional
+from bson import ObjectId
+
+from config.settings import get_settings
+from db.mongodb import get_inventory_collection
+from services.generation_planner import Shard, split_evenly, to_question_doc, is_valid_question, normalize_text
+from services.question_dedup import dedup_index, minhash, question_passage_id
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+# Buckets kept stocked by the replenisher
+INVENTORY_TOPICS = {
+    "VARC": ["Reading Comprehension", "Para Jumbles", "Para Summary"],
+    "DILR": ["Data Interpretation", "Logical Reasoning", "Puzzles"],
+    "QA": ["Arithmetic", "Algebra", "Geometry", "Number System"],
+}
+
+# Fields that only exist on inventory documents
+INVENTORY_FIELDS = ("_id", "stockedAt", "claimId", "claimedAt")
+
+# Claims older than this (a worker died between drawing and inserting) can be drawn again
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# Draw/refill counters for monitoring
+inventory_metrics: Dict[str, Any] = {
+    "startedAt": time.time(),
+    "requested": 0,
+    "drawn": 0,
+    "misses": 0,
+    "refilled": 0,
+    "refillCalls": 0,
+    "refillErrors": 0,
+    "lastRefillAt": None,
+}
+
+_replenisher_task: Optional[asyncio.Task] = None
+
+
+def _to_question(doc: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Turn a drawn inventory document into a fresh question document"""
+    question = {k: v for k, v in doc.items() if k not in INVENTORY_FIELDS}
+    question["createdAt"] = datetime.utcnow()
+    if user_id:
+        question["createdBy"] = ObjectId(user_id)
+    return question
+
+
+async def draw_questions(
+    section: str,
+    difficulty: str,
+    count: int,
+    claim_id: ObjectId,
+    topics: Optional[List[str]] = None,
+    user_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Claim up to `count` stocked questions for a section/difficulty (restricted
+    to `topics` when given), oldest first
+
+    Questions are marked with `claim_id` rather than deleted: consume_claim()
+    deletes them once the caller has stored them, release_claim() returns them
+    to stock (see inventory_claim())
+    """
+    if count <= 0:
+        return []
+
+    inventory_col = get_inventory_collection()
+    now = datetime.utcnow()
+    query: Dict[str, Any] = {"section": section, "difficulty": difficulty, "claimedAt": {"$not": {"$gt": now - CLAIM_TIMEOUT}}}
+    if topics:
+        query["topic"] = {"$in": topics}
+
+    # One read for the candidates and one conditional update to claim them; a
+    # concurrent draw that claimed some first simply leaves those out
+    candidates = await inventory_col.find(query).sort("stockedAt", 1).limit(count).to_list(length=count)
+    drawn = []
+    if candidates:
+        result = await inventory_col.update_many(
+            {**query, "_id": {"$in": [doc["_id"] for doc in candidates]}},
+            {"$set": {"claimId": claim_id, "claimedAt": now}}
+        )
+        if result.modified_count < len(candidates):
+            claimed = {doc["_id"] async for doc in inventory_col.find({"claimId": claim_id}, {"_id": 1})}
+            candidates = [doc for doc in candidates if doc["_id"] in claimed]
+        drawn = [_to_question(doc, user_id) for doc in candidates]
+
+    inventory_metrics["requested"] += count
+    inventory_metrics["drawn"] += len(drawn)
+    if len(drawn) < count:
+        inventory_metrics["misses"] += 1
+    return drawn
+
+
+async def draw_for_sections(
+    sections: List[str],
+    difficulty: str,
+    total: int,
+    claim_id: ObjectId,
+    topics: Optional[List[str]] = None,
+    user_id: Optional[str] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Draw an even split of `total` questions across sections"""
+    quotas = dict(zip(sections, split_evenly(total, len(sections))))
+    return await draw_for_quotas(quotas, difficulty, claim_id, topics, user_id)
+
+
+async def draw_for_quotas(
+    section_quotas: Dict[str, int],
+    difficulty: str,
+    claim_id: ObjectId,
+    topics: Optional[List[str]] = None,
+    user_id: Optional[str] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Draw explicit per-section question counts"""
+    results = await asyncio.gather(*[
+        draw_questions(section, difficulty, quota, claim_id, topics, user_id)
+        for section, quota in section_quotas.items()
+    ])
+    return dict(zip(section_quotas, results))
+
+
+async def consume_claim(claim_id: ObjectId):
+    """Delete the questions drawn under a claim (after they have been stored)"""
+    await get_inventory_collection().delete_many({"claimId": claim_id})
+
+
+async def release_claim(claim_id: ObjectId):
+    """Return the questions drawn under a claim to stock"""
+    await get_inventory_collection().update_many(
+        {"claimId": claim_id},
+        {"$unset": {"claimId": "", "claimedAt": ""}}
+    )
+
+
+@asynccontextmanager
+async def inventory_claim() -> AsyncIterator[ObjectId]:
+    """
+    Claim id for draws whose questions are stored inside the block: they are
+    consumed when it completes and released if it raises
+    """
+    claim_id = ObjectId()
+    try:
+        yield claim_id
+    except BaseException:
+        await release_claim(claim_id)
+        raise
+    await consume_claim(claim_id)
+
+
+async def inventory_levels() -> Dict[str, int]:
+    """Stock per bucket, keyed "section|topic|difficulty" """
+    inventory_col = get_inventory_collection()
+    levels = {}
+    async for row in inventory_col.aggregate([
+        {"$group": {
+            "_id": {"section": "$section", "topic": "$topic", "difficulty": "$difficulty"},
+            "count": {"$sum": 1}
+        }}
+    ]):
+        bucket = row["_id"]
+        levels[f"{bucket['section']}|{bucket['topic']}|{bucket['difficulty']}"] = row["count"]
+    return levels
+
+
+async def inventory_stats() -> Dict[str, Any]:
+    """Inventory levels plus draw/refill counters and rates"""
+    levels = await inventory_levels()
+    uptime_minutes = max((time.time() - inventory_metrics["startedAt"]) / 60, 1 / 60)
+    requested = inventory_metrics["requested"]
+
+    return {
+        "levels": levels,
+        "totalStock": sum(levels.values()),
+        "watermarks": {"low": settings.inventory_low_watermark, "high": settings.inventory_high_watermark},
+        "drawn": inventory_metrics["drawn"],
+        "requested": requested,
+        "fillRate": round(inventory_metrics["drawn"] / requested, 3) if requested else 0,
+        "drawsPerMinute": round(inventory_metrics["drawn"] / uptime_minutes, 2),
+        "refilled": inventory_metrics["refilled"],
+        "refillsPerMinute": round(inventory_metrics["refilled"] / uptime_minutes, 2),
+        "refillCalls": inventory_metrics["refillCalls"],
+        "refillErrors": inventory_metrics["refillErrors"],
+        "lastRefillAt": inventory_metrics["lastRefillAt"],
+        "replenisherRunning": _replenisher_task is not None and not _replenisher_task.done(),
+    }
+
+
+def _is_off_peak() -> bool:
+    hour = datetime.utcnow().hour
+    start, end = settings.inventory_offpeak_start_hour, settings.inventory_offpeak_end_hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+async def refill_bucket(section: str, topic: str, difficulty: str, count: int) -> int:
+    """Generate one batch for a bucket and stock the valid, unique questions"""
+    from agents import architect
+    from services.exemplar_index import find_exemplars
+
+    inventory_metrics["refillCalls"] += 1
+    exemplars = await find_exemplars([section], [topic], difficulty)
+    result = await architect.generate_batch(section, difficulty, count, [topic], exemplars)
+    if result.get("status") != "success":
+        inventory_metrics["refillErrors"] += 1
+        return 0
+
+    shard = Shard(section=section, difficulty=difficulty, count=count, topics=[topic])
+    docs, seen = [], set()
+    for raw in result.get("questions", [])[:count]:
+        doc = to_question_doc(raw, shard)
+        fingerprint = normalize_text(doc["question"])
+        if not is_valid_question(doc) or fingerprint in seen:
+            continue
+        # Don't stock questions the bank already holds a near-copy of
+        if dedup_index.find_duplicate(minhash(doc), passage_id=question_passage_id(doc)):
+            continue
+        seen.add(fingerprint)
+        doc["topic"] = topic  # Keep bucket accounting exact
+        doc["stockedAt"] = datetime.utcnow()
+        docs.append(doc)
+
+    if docs:
+        await get_inventory_collection().insert_many(docs)
+        inventory_metrics["refilled"] += len(docs)
+        inventory_metrics["lastRefillAt"] = datetime.utcnow().isoformat()
+    return len(docs)
+
+
+async def replenish_once() -> int:
+    """
+    Top up the emptiest buckets below the low watermark towards the high
+    watermark, using at most `inventory_max_calls_per_cycle` Gemini calls
+    """
+    from agents.gemini_client import rate_limiter
+
+    levels = await inventory_levels()
+    low = [
+        (levels.get(f"{section}|{topic}|{difficulty}", 0), section, topic, difficulty)
+        for section, topics in INVENTORY_TOPICS.items()
+        for topic in topics
+        for difficulty in DIFFICULTIES
+        if levels.get(f"{section}|{topic}|{difficulty}", 0) < settings.inventory_low_watermark
+    ]
+    low.sort()
+
+    stocked = 0
+    for level, section, topic, difficulty in low[:settings.inventory_max_calls_per_cycle]:
+        # Leave rate-limit headroom for interactive requests
+        if rate_limiter.available() < 2:
+            logger.info("Inventory refill paused: rate limiter busy")
+            break
+        count = min(settings.generation_shard_size, settings.inventory_high_watermark - level)
+        try:
+            stocked += await refill_bucket(section, topic, difficulty, count)
+        except Exception as e:
+            inventory_metrics["refillErrors"] += 1
+            logger.warning(f"Inventory refill failed for {section}/{topic}/{difficulty}: {e}")
+    return stocked
+
+
+async def _replenish_loop():
+    while True:
+        try:
+            if _is_off_peak():
+                stocked = await replenish_once()
+                if stocked:
+                    logger.info(f"Inventory replenished with {stocked} questions")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Inventory replenisher error: {e}")
+        await asyncio.sleep(settings.inventory_refill_interval_seconds)
+
+
+def start_replenisher():
+    """Start the background replenisher (called from the app lifespan)"""
+    global _replenisher_task
+    if settings.inventory_replenish_enabled and _replenisher_task is None:
+        _replenisher_task = asyncio.create_task(_replenish_loop())
+        print("📦 Question inventory replenisher started")
+
+
+async def stop_replenisher():
+    """Stop the background replenisher"""
+    global _replenisher_task
+    if _replenisher_task:
+        _replenisher_task.cancel()
+        try:
+            await _replenisher_task
+        except asyncio.CancelledError:
+            pass
+        _replenisher_task = None
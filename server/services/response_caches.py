@@ -0,0 +1,37 @@
+"""
+Response Caches
+Read-through caches for read endpoints backed by rarely-changing data, and
+the invalidation calls their write paths make
+"""
+
+from typing import Any, Optional
+
+from config.settings import get_settings
+from services.cache import get_cache
+from services.answer_keys import invalidate_answer_key
+from services.test_snapshot import invalidate_snapshot
+
+settings = get_settings()
+
+# (type, section) -> GET /api/tests/ rows; every test insert clears it
+test_listings = get_cache("test_listings", maxsize=64, ttl_seconds=settings.test_listing_cache_ttl_seconds)
+
+# user id -> GET /api/students/roadmap body; a new roadmap invalidates the user's entry
+roadmaps = get_cache("roadmaps", maxsize=settings.roadmap_cache_size, ttl_seconds=settings.roadmap_cache_ttl_seconds)
+
+
+async def tests_changed(test_id: Optional[Any] = None):
+    """
+    Call after inserting or changing a test document; with its id, the test's
+    snapshot and answer key are dropped too (prime the answer key afterwards)
+    """
+    await test_listings.clear()
+    if test_id is not None:
+        await invalidate_snapshot(str(test_id))
+        invalidate_answer_key(str(test_id))
+
+
+async def roadmap_changed(user_id: Any):
+    """Call after writing a user's roadmap"""
+    await roadmaps.invalidate(str(user_id))
+
@@ -0,0 +1,138 @@
+"""
+Scoring Service
+Scores test submissions against the answer key in a single pass
+"""
+
+import math
+from typing import Dict, Any, Iterable, List, Optional
+
+# CAT marking scheme: +3 for a correct answer, -1 for a wrong MCQ, no negative marking for TITA
+MARKS_PER_QUESTION = 3
+NEGATIVE_MARKS = {"MCQ": 1, "TITA": 0}
+
+
+def is_answer_correct(answer: Any, correct_answer: Any, question_type: str) -> bool:
+    """Compare a student answer with the key (numeric comparison for TITA)"""
+    if correct_answer is None:
+        return False
+
+    given = str(answer).strip()
+    expected = str(correct_answer).strip()
+
+    if question_type == "TITA":
+        try:
+            return float(given) == float(expected)
+        except ValueError:
+            return given.lower() == expected.lower()
+
+    return given.upper() == expected.upper()
+
+
+def _time_spent(value: Any) -> float:
+    """Seconds spent on a response; anything that is not a non-negative number counts as 0"""
+    try:
+        seconds = float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    return seconds if math.isfinite(seconds) and seconds > 0 else 0
+
+
+def _empty_bucket() -> Dict[str, int]:
+    return {"obtained": 0, "total": 0, "correct": 0, "incorrect": 0, "unattempted": 0, "timeSpent": 0}
+
+
+def score_responses(
+    responses: List[dict],
+    answer_key: Dict[str, Dict[str, Any]],
+    question_ids: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """
+    Score all responses in one pass
+
+    Only the first response to a question counts, and responses to questions
+    without an answer key entry (or outside `question_ids`) are dropped.
+
+    Args:
+        responses: Submitted responses [{questionId, answer, timeSpent}]
+        answer_key: Question id -> answer key entry (see services.answer_keys)
+        question_ids: The test's questions; the total is taken over these, and
+                      those left without a response count as unattempted
+
+    Returns:
+        {"score": overall score with section/topic breakdowns, "responses": annotated responses}
+    """
+    totals = _empty_bucket()
+    sections: Dict[str, Dict[str, int]] = {}
+    topics: Dict[tuple, Dict[str, int]] = {}
+    scored_responses = []
+
+    test_questions = None if question_ids is None else [str(qid) for qid in question_ids]
+    allowed = None if test_questions is None else set(test_questions)
+    first_responses: Dict[str, dict] = {}
+    for response in responses:
+        question_id = str(response.get("questionId"))
+        if question_id in answer_key and (allowed is None or question_id in allowed):
+            first_responses.setdefault(question_id, response)
+
+    def add(key: Optional[Dict[str, Any]], outcome: str, marks: int, time_spent: float):
+        buckets = [totals]
+        if key is not None:
+            section = key.get("section", "General")
+            buckets.append(sections.setdefault(section, _empty_bucket()))
+            buckets.append(topics.setdefault((section, key.get("topic", "General")), _empty_bucket()))
+        for bucket in buckets:
+            bucket[outcome] += 1
+            bucket["obtained"] += marks
+            bucket["total"] += (key or {}).get("marks", MARKS_PER_QUESTION)
+            bucket["timeSpent"] += time_spent
+
+    for question_id, response in first_responses.items():
+        key = answer_key[question_id]
+        question_type = key.get("type", "MCQ")
+        answer = response.get("answer")
+        time_spent = _time_spent(response.get("timeSpent"))
+
+        if answer in (None, ""):
+            outcome = "unattempted"
+            marks = 0
+        elif is_answer_correct(answer, key.get("correctAnswer"), question_type):
+            outcome = "correct"
+            marks = key.get("marks", MARKS_PER_QUESTION)
+        else:
+            outcome = "incorrect"
+            marks = -key.get("negativeMarks", NEGATIVE_MARKS.get(question_type, 1))
+
+        add(key, outcome, marks, time_spent)
+        scored_responses.append({
+            **response,
+            "timeSpent": time_spent,
+            "section": key.get("section", "General"),
+            "topic": key.get("topic", "General"),
+            "difficulty": key.get("difficulty", "medium"),
+            "type": question_type,
+            "isCorrect": outcome == "correct",
+            "marksAwarded": marks,
+        })
+
+    # The rest of the test still counts towards the total
+    for question_id in dict.fromkeys(test_questions or ()):
+        if question_id not in first_responses:
+            add(answer_key.get(question_id), "unattempted", 0, 0)
+
+    total = totals["total"]
+    score = {
+        "obtained": totals["obtained"],
+        "total": total,
+        "percentage": round((totals["obtained"] / total) * 100, 1) if total > 0 else 0,
+        "correct": totals["correct"],
+        "incorrect": totals["incorrect"],
+        "unattempted": totals["unattempted"],
+        # Lists rather than dicts so topic names never end up as Mongo field names
+        "sections": [{"section": name, **bucket} for name, bucket in sections.items()],
+        "topics": [
+            {"section": section, "topic": topic, **bucket}
+            for (section, topic), bucket in topics.items()
+        ],
+    }
+
+    return {"score": score, "responses": scored_responses}
@@ -0,0 +1,91 @@
+"""
+Test Assembly Service
+Builds tests from stored questions using the in-memory catalog (no LLM calls)
+"""
+
+import random
+from typing import Dict, List, Optional, Tuple
+
+from services.generation_planner import split_evenly
+from services.question_catalog import question_catalog
+
+
+def split_by_weights(total: int, weights: Dict[str, float]) -> Dict[str, int]:
+    """Largest-remainder split of `total` across weighted keys"""
+    positive = {k: w for k, w in weights.items() if w > 0}
+    weight_sum = sum(positive.values())
+    if total <= 0 or not weight_sum:
+        return {}
+
+    exact = {k: total * w / weight_sum for k, w in positive.items()}
+    counts = {k: int(v) for k, v in exact.items()}
+    leftover = total - sum(counts.values())
+    for k in sorted(exact, key=lambda k: exact[k] - counts[k], reverse=True)[:leftover]:
+        counts[k] += 1
+    return {k: v for k, v in counts.items() if v}
+
+
+def _take(pool: int, count: int, topics: List[str], rng: random.Random) -> List[str]:
+    """
+    Sample up to `count` ids from a bitmap, spread evenly over `topics` when
+    given, topping up from the rest of the pool if the topics run short
+    """
+    picked: List[str] = []
+    if topics:
+        for topic, quota in zip(topics, split_evenly(count, len(topics))):
+            picked += question_catalog.sample(pool & question_catalog.filter(topic=topic), quota, rng)
+        # Redistribute what thin topics could not supply among the other focus topics
+        focus_pool = pool & question_catalog.filter(topic=topics) & ~question_catalog.bitmap_for_ids(picked)
+        picked += question_catalog.sample(focus_pool, count - len(picked), rng)
+
+    if len(picked) < count:
+        rest = pool & ~question_catalog.bitmap_for_ids(picked)
+        picked += question_catalog.sample(rest, count - len(picked), rng)
+    return picked
+
+
+def assemble_from_bank(
+    section_quotas: Dict[str, int],
+    difficulty_mix: Dict[str, float],
+    focus_topics: Optional[List[str]] = None,
+    exclude: int = 0,
+    seed: Optional[int] = None
+) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Pick stored questions meeting per-section quotas and a difficulty mix
+
+    Args:
+        section_quotas: Questions wanted per section
+        difficulty_mix: Relative weight per difficulty, e.g. {"medium": 0.6, "hard": 0.4}
+        focus_topics: Topics to draw from first (spread evenly)
+        exclude: Catalog bitmap of questions to leave out (e.g. already seen)
+        seed: Optional RNG seed for reproducible assembly
+
+    Returns:
+        (question ids grouped by section, per-section shortfall)
+    """
+    rng = random.Random(seed)
+    focus_topics = focus_topics or []
+    used = exclude
+    question_ids: List[str] = []
+    shortfall: Dict[str, int] = {}
+
+    for section, quota in section_quotas.items():
+        section_pool = question_catalog.filter(section=section, exclude=used)
+        picked: List[str] = []
+
+        for difficulty, count in split_by_weights(quota, difficulty_mix).items():
+            pool = section_pool & question_catalog.filter(difficulty=difficulty)
+            picked += _take(pool, count, focus_topics, rng)
+
+        # Fill any gap in the mix from the section's other difficulties
+        if len(picked) < quota:
+            rest = section_pool & ~question_catalog.bitmap_for_ids(picked)
+            picked += _take(rest, quota - len(picked), focus_topics, rng)
+
+        used |= question_catalog.bitmap_for_ids(picked)
+        question_ids += picked
+        if len(picked) < quota:
+            shortfall[section] = quota - len(picked)
+
+    return question_ids, shortfall
@@ -0,0 +1,44 @@
+"""
+Test Names Service
+Cached test id -> name lookups for attempt listings
+"""
+
+from typing import Dict, Any, Iterable
+from bson import ObjectId
+
+from config.settings import get_settings
+from db.mongodb import get_tests_collection
+from services.lru_cache import LRUCache
+
+settings = get_settings()
+
+DEFAULT_TEST_NAME = "CAT Mock Test"
+
+_names = LRUCache(maxsize=settings.test_name_cache_size)
+
+
+async def get_test_names(test_ids: Iterable[Any]) -> Dict[str, str]:
+    """Names for the given test ids; uncached ones are fetched in a single query"""
+    wanted = {str(t) for t in test_ids if t}
+    names = {}
+    missing = []
+    for test_id in wanted:
+        name = _names.get(test_id)
+        if name is None:
+            missing.append(test_id)
+        else:
+            names[test_id] = name
+
+    valid = [ObjectId(t) for t in missing if ObjectId.is_valid(t)]
+    if valid:
+        async for test in get_tests_collection().find({"_id": {"$in": valid}}, {"name": 1}):
+            name = test.get("name") or DEFAULT_TEST_NAME
+            names[str(test["_id"])] = name
+            _names.set(str(test["_id"]), name)
+
+    return {test_id: names.get(test_id, DEFAULT_TEST_NAME) for test_id in wanted}
+
+
+def set_test_name(test_id: str, name: str):
+    """Seed the cache when a test is created"""
+    _names.set(str(test_id), name)
@@ -0,0 +1,219 @@
+"""
+Test Snapshot Service
+Immutable, pre-rendered test payloads cached in memory and persisted in MongoDB
+"""
+
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from bson import ObjectId
+
+from config.settings import get_settings
+from db.mongodb import get_tests_collection, get_questions_collection, get_test_snapshots_collection
+from services.lru_cache import LRUCache
+from services.passages import passage_map
+from services.answer_keys import invalidate_answer_key
+from services.encoding import dumps, packb, compress, MSGPACK_MEDIA_TYPE
+
+settings = get_settings()
+
+# Bump when the snapshot payload shape changes so persisted snapshots are rebuilt
+SNAPSHOT_SCHEMA_VERSION = 3
+
+# Published tests never change, but the URL is not versioned: let clients and
+# proxies reuse the body briefly and revalidate with the ETag afterwards
+SNAPSHOT_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+
+# Question fields sent to the browser (never the answer or explanation)
+QUESTION_PROJECTION = {
+    "section": 1,
+    "topic": 1,
+    "difficulty": 1,
+    "type": 1,
+    "passage": 1,
+    "passageId": 1,
+    "question": 1,
+    "options": 1,
+}
+
+_snapshots = LRUCache(maxsize=settings.test_snapshot_cache_size)
+_build_locks: Dict[str, asyncio.Lock] = {}
+
+
+class TestSnapshot:
+    """
+    A rendered test payload with its content version
+
+    Other representations (MessagePack, brotli/gzip encodings) are rendered on
+    first request at the highest compression level and kept with the
+    snapshot, so each is paid for once per process rather than per response.
+    """
+
+    def __init__(self, test_id: str, version: str, payload: Dict[str, Any]):
+        self.test_id = test_id
+        self.version = version
+        self.payload = payload
+        self.body = render_payload(payload)
+        self.etag = f'"{version}"'
+        self._variants: Dict[Tuple[str, Optional[str]], bytes] = {}
+
+    def variant(self, media_type: str = "application/json", encoding: Optional[str] = None) -> Tuple[bytes, str]:
+        """Body and ETag for a media type / content-coding pair"""
+        key = (media_type, encoding)
+        body = self._variants.get(key)
+        if body is None:
+            if media_type == MSGPACK_MEDIA_TYPE:
+                body = self._variants.get((media_type, None)) or packb(self.payload)
+            else:
+                body = self.body
+            if encoding:
+                body = compress(body, encoding, best=True)
+            self._variants[key] = body
+        return body, self.variant_etag(media_type, encoding)
+
+    def variant_etag(self, media_type: str = "application/json", encoding: Optional[str] = None) -> str:
+        # Each representation needs its own strong validator
+        suffix = ("-mp" if media_type == MSGPACK_MEDIA_TYPE else "") + (f"-{encoding}" if encoding else "")
+        return f'"{self.version}{suffix}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        """If-None-Match check (weak comparison: any representation of this version matches)"""
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.removeprefix("W/").strip('"').split("-")[0] == self.version:
+                return True
+        return False
+
+
+def render_payload(payload: Dict[str, Any]) -> bytes:
+    """Serialize a snapshot payload once so every request reuses the bytes"""
+    return dumps(payload)
+
+
+def compute_version(payload: Dict[str, Any]) -> str:
+    """Content hash of the payload, used as the strong ETag"""
+    digest = hashlib.sha256(render_payload(payload))
+    digest.update(str(SNAPSHOT_SCHEMA_VERSION).encode())
+    return digest.hexdigest()[:32]
+
+
+async def build_payload(test: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Render the test and its questions in questionIds order
+
+    Passages shared by a set of questions are sent once in `passages`; each
+    question references its own by `passageId`.
+    """
+    questions_col = get_questions_collection()
+
+    question_ids = [qid for qid in test.get("questionIds", []) if ObjectId.is_valid(str(qid))]
+    docs = {}
+    async for q in questions_col.find(
+        {"_id": {"$in": [ObjectId(qid) for qid in question_ids]}},
+        QUESTION_PROJECTION
+    ):
+        docs[str(q["_id"])] = q
+
+    passages = await passage_map(list(docs.values()))
+    
+    questions = []
+    for qid in question_ids:
+        q = docs.get(str(qid))
+        if not q:
+            continue
+        questions.append({
+            "id": str(q["_id"]),
+            "qno": len(questions) + 1,
+            "section": q["section"],
+            "topic": q["topic"],
+            "difficulty": q["difficulty"],
+            "type": q["type"],
+            "passageId": q.get("passageId"),
+            "question": q["question"],
+            "options": q.get("options"),
+            "marks": 3,
+            "negativeMarks": 0 if q["type"] == "TITA" else 1
+        })
+
+    return {
+        "test": {
+            "id": str(test["_id"]),
+            "name": test["name"],
+            "duration": test["duration"],
+            "totalMarks": len(questions) * 3
+        },
+        "questions": questions,
+        "passages": passages
+    }
+
+
+async def _load_persisted(test_id: str) -> Optional[TestSnapshot]:
+    snapshots_col = get_test_snapshots_collection()
+    doc = await snapshots_col.find_one({"_id": ObjectId(test_id)})
+    if not doc or doc.get("schemaVersion") != SNAPSHOT_SCHEMA_VERSION:
+        return None
+    return TestSnapshot(test_id, doc["version"], doc["payload"])
+
+
+async def _build_and_persist(test_id: str) -> Optional[TestSnapshot]:
+    tests_col = get_tests_collection()
+    test = await tests_col.find_one({"_id": ObjectId(test_id)})
+    if not test:
+        return None
+
+    # The test document is at hand: drop an answer key built for another question list
+    invalidate_answer_key(test_id, [str(qid) for qid in test.get("questionIds", [])])
+
+    payload = await build_payload(test)
+    snapshot = TestSnapshot(test_id, compute_version(payload), payload)
+
+    snapshots_col = get_test_snapshots_collection()
+    await snapshots_col.replace_one(
+        {"_id": ObjectId(test_id)},
+        {
+            "schemaVersion": SNAPSHOT_SCHEMA_VERSION,
+            "version": snapshot.version,
+            "payload": payload,
+            "builtAt": datetime.utcnow(),
+        },
+        upsert=True
+    )
+    return snapshot
+
+
+async def get_snapshot(test_id: str) -> Optional[TestSnapshot]:
+    """
+    Get the snapshot for a test: memory first, then the persisted copy,
+    building it from the tests/questions collections only once
+    """
+    snapshot = _snapshots.get(test_id)
+    if snapshot:
+        return snapshot
+
+    # Coalesce concurrent cold loads of the same test into a single build
+    lock = _build_locks.setdefault(test_id, asyncio.Lock())
+    async with lock:
+        snapshot = _snapshots.get(test_id)
+        if snapshot:
+            return snapshot
+
+        snapshot = await _load_persisted(test_id) or await _build_and_persist(test_id)
+        if snapshot:
+            _snapshots.set(test_id, snapshot)
+
+    _build_locks.pop(test_id, None)
+    return snapshot
+
+
+async def invalidate_snapshot(test_id: str):
+    """Drop a test's snapshot after its content has been changed"""
+    _snapshots.pop(test_id)
+    await get_test_snapshots_collection().delete_one({"_id": ObjectId(test_id)})
+
+
+def snapshot_cache_stats() -> Dict[str, Any]:
+    """In-memory snapshot cache counters"""
+    return _snapshots.stats()
@@ -0,0 +1,133 @@
+"""
+Topic Catalog
+Section -> topic -> question count, materialized in `topic_catalog` by one
+$group/$merge aggregation, kept current with $inc on question inserts and
+served from memory
+
+Rebuild it from the questions collection with:  python -m services.topic_catalog
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from pymongo import UpdateOne
+
+from config.settings import get_settings
+from db.mongodb import get_topic_catalog_collection
+from services.question_bank import register_insert_hook
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TOPIC_CATALOG_COLLECTION = "topic_catalog"
+
+
+def _default_db():
+    from db.mongodb import MongoDB
+    return MongoDB.get_db()
+
+
+async def rebuild_topic_catalog(db=None) -> int:
+    """
+    Recount every section/topic pair in a single aggregation merged into
+    `topic_catalog`; pairs no longer present in the bank are removed.
+    Returns the number of pairs.
+    """
+    db = db if db is not None else _default_db()
+    built_at = datetime.utcnow()
+    await db.questions.aggregate([
+        {"$group": {"_id": {"section": "$section", "topic": "$topic"}, "count": {"$sum": 1}}},
+        {"$set": {"section": "$_id.section", "topic": "$_id.topic", "updatedAt": built_at}},
+        {"$merge": {"into": TOPIC_CATALOG_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]).to_list(length=None)
+    await db[TOPIC_CATALOG_COLLECTION].delete_many({"updatedAt": {"$lt": built_at}})
+    return await db[TOPIC_CATALOG_COLLECTION].count_documents({})
+
+
+class TopicCatalog:
+    """
+    In-memory copy of `topic_catalog`
+
+    Inserts made by this process update the collection and the copy together;
+    the copy is re-read from the (small) collection once it is older than
+    `topic_catalog_reload_seconds`, picking up other workers' inserts.
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.loaded_at: Optional[float] = None
+        self._reload_lock = asyncio.Lock()
+
+    async def load(self):
+        """Read the catalog into memory, building it first if it has never been built"""
+        counts: Dict[str, Dict[str, int]] = {}
+        async for doc in get_topic_catalog_collection().find({}, {"section": 1, "topic": 1, "count": 1}):
+            if doc.get("section") and doc.get("topic") and doc.get("count", 0) > 0:
+                counts.setdefault(doc["section"], {})[doc["topic"]] = doc["count"]
+        if not counts and self.loaded_at is None:
+            pairs = await rebuild_topic_catalog()
+            if pairs:
+                await self.load()
+                print(f"🏷️ Topic catalog built: {pairs} section/topic pairs")
+                return
+        self.counts = counts
+        self.loaded_at = time.monotonic()
+
+    async def rebuild(self):
+        """Recount from the questions collection and reload"""
+        await rebuild_topic_catalog()
+        await self.load()
+
+    async def add_many(self, docs: List[Dict[str, Any]]):
+        """Count newly inserted questions (question bank insert hook)"""
+        added = Counter((doc.get("section"), doc.get("topic")) for doc in docs if doc.get("section") and doc.get("topic"))
+        if not added:
+            return
+        now = datetime.utcnow()
+        await get_topic_catalog_collection().bulk_write([
+            UpdateOne(
+                {"_id": {"section": section, "topic": topic}},
+                {"$inc": {"count": n}, "$set": {"section": section, "topic": topic, "updatedAt": now}},
+                upsert=True
+            )
+            for (section, topic), n in added.items()
+        ], ordered=False)
+        for (section, topic), n in added.items():
+            section_counts = self.counts.setdefault(section, {})
+            section_counts[topic] = section_counts.get(topic, 0) + n
+
+    async def topics(self) -> Dict[str, Dict[str, int]]:
+        """Section -> topic -> question count"""
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > settings.topic_catalog_reload_seconds:
+            async with self._reload_lock:
+                if self.loaded_at is None or time.monotonic() - self.loaded_at > settings.topic_catalog_reload_seconds:
+                    await self.load()
+        return self.counts
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sections": len(self.counts),
+            "topics": sum(len(topics) for topics in self.counts.values()),
+            "loadedSecondsAgo": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at is not None else None,
+        }
+
+
+topic_catalog = TopicCatalog()
+register_insert_hook(topic_catalog.add_many)
+
+
+if __name__ == "__main__":
+    from db.mongodb import MongoDB
+
+    async def _main():
+        await MongoDB.connect()
+        try:
+            pairs = await rebuild_topic_catalog()
+            print(f"✅ Topic catalog rebuilt: {pairs} section/topic pairs")
+        finally:
+            await MongoDB.disconnect()
+
+    asyncio.run(_main())
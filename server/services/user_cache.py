@@ -0,0 +1,38 @@
+"""
+User Cache
+Short-lived cache of user documents for authenticated requests;
+anything that writes a user document calls invalidate_user()
+"""
+
+from typing import Dict, Any, Optional
+from bson import ObjectId
+
+from config.settings import get_settings
+from db.mongodb import get_users_collection
+from services.cache import get_cache
+
+settings = get_settings()
+
+# user id -> document; cached documents are shared, treat them as read-only
+_users = get_cache("users", maxsize=settings.user_cache_size, ttl_seconds=settings.user_cache_ttl_seconds)
+
+
+async def get_user(user_id: str) -> Optional[Dict[str, Any]]:
+    """User document, from cache while fresh (misses are not cached)"""
+    user_id = str(user_id)
+    if not ObjectId.is_valid(user_id):
+        return None
+    return await _users.get_or_load(
+        user_id,
+        lambda: get_users_collection().find_one({"_id": ObjectId(user_id)})
+    )
+
+
+async def invalidate_user(user_id: Any):
+    """Drop a user's cached document after writing to it"""
+    await _users.invalidate(str(user_id))
+
+
+async def clear_user_cache():
+    """Drop every cached user (after bulk updates such as calibration)"""
+    await _users.clear()
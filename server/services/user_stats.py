@@ -0,0 +1,159 @@
+"""
+User Stats Service
+Profile counters (tests completed, study time, daily streak) and performance
+rollups applied to the user document in a single update per submission
+
+Recompute every user's counters from their attempts with:  python -m services.user_stats
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional
+from pymongo import UpdateOne
+
+from config.settings import get_settings
+from db.mongodb import get_attempts_collection, get_users_collection
+from services.performance_rollups import rollup_increments
+from services.user_cache import invalidate_user
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+BULK_WRITE_BATCH = 500
+
+# Attempt fields the counters are derived from
+ATTEMPT_STATS_PROJECTION = {"userId": 1, "startedAt": 1, "submittedAt": 1}
+
+
+def study_day(moment: datetime) -> datetime:
+    """Calendar day (as midnight) of a UTC timestamp in the students' timezone"""
+    local = moment + timedelta(minutes=settings.streak_utc_offset_minutes)
+    return datetime(local.year, local.month, local.day)
+
+
+def _add(path: str, value: Any) -> Dict[str, Any]:
+    return {"$add": [{"$ifNull": [f"${path}", 0]}, value]}
+
+
+def submission_update(score: Dict[str, Any], study_seconds: int, submitted_at: datetime) -> List[Dict[str, Any]]:
+    """Update pipeline recording one submission: counters, streak and performance rollups"""
+    today = study_day(submitted_at)
+    yesterday = today - timedelta(days=1)
+
+    counters = {path: _add(path, value) for path, value in rollup_increments(score).items()}
+    counters["stats.testsCompleted"] = _add("stats.testsCompleted", 1)
+    counters["stats.studySeconds"] = _add("stats.studySeconds", max(int(study_seconds), 0))
+    counters["stats.currentStreak"] = {"$switch": {
+        "branches": [
+            {"case": {"$eq": ["$stats.lastActiveDay", today]}, "then": {"$ifNull": ["$stats.currentStreak", 1]}},
+            {"case": {"$eq": ["$stats.lastActiveDay", yesterday]}, "then": _add("stats.currentStreak", 1)},
+        ],
+        "default": 1,
+    }}
+    counters["stats.lastActiveDay"] = today
+
+    return [
+        {"$set": counters},
+        {"$set": {"stats.longestStreak": {"$max": [{"$ifNull": ["$stats.longestStreak", 0]}, "$stats.currentStreak"]}}},
+    ]
+
+
+async def record_submission(user_id: Any, score: Dict[str, Any], study_seconds: int, submitted_at: datetime):
+    """Apply a submitted attempt to the user's counters and rollups"""
+    users_col = get_users_collection()
+    update = submission_update(score, study_seconds, submitted_at)
+    result = await users_col.update_one({"_id": user_id, "stats": {"$exists": True}}, update)
+    if not result.matched_count:
+        # First submission since counters were introduced: start from the earlier attempts, not zero
+        earlier = await get_attempts_collection().find(
+            {"userId": user_id, "submittedAt": {"$lt": submitted_at}},
+            ATTEMPT_STATS_PROJECTION
+        ).to_list(length=None)
+        result = await users_col.update_one(
+            {"_id": user_id, "stats": {"$exists": False}},
+            [{"$set": {"stats": {"$literal": stats_from_attempts(earlier)}}}, *update]
+        )
+        if not result.matched_count:
+            # Seeded by a concurrent submission in the meantime
+            await users_col.update_one({"_id": user_id}, update)
+    await invalidate_user(user_id)
+
+
+def profile_stats(stats: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Profile view of the stored counters (a streak lapses after a day without a test)"""
+    last_day = stats.get("lastActiveDay")
+    streak_alive = last_day is not None and last_day >= study_day(now or datetime.utcnow()) - timedelta(days=1)
+    return {
+        "testsCompleted": stats.get("testsCompleted", 0),
+        "studyHours": round(stats.get("studySeconds", 0) / 3600, 1),
+        "currentStreak": stats.get("currentStreak", 0) if streak_alive else 0,
+        "longestStreak": stats.get("longestStreak", 0),
+    }
+
+
+def _streaks(days: List[datetime]):
+    """(streak ending on the last day, longest streak) over sorted distinct days"""
+    current = longest = 0
+    previous = None
+    for day in days:
+        current = current + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return current, longest
+
+
+def stats_from_attempts(attempts: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """A user's counters computed from their attempts (ATTEMPT_STATS_PROJECTION fields)"""
+    tests = seconds = 0
+    active_days = set()
+    for attempt in attempts:
+        tests += 1
+        submitted_at, started_at = attempt.get("submittedAt"), attempt.get("startedAt")
+        if submitted_at and started_at:
+            seconds += max(int((submitted_at - started_at).total_seconds()), 0)
+        if submitted_at:
+            active_days.add(study_day(submitted_at))
+
+    days = sorted(active_days)
+    current, longest = _streaks(days)
+    return {
+        "testsCompleted": tests,
+        "studySeconds": seconds,
+        "currentStreak": current,
+        "longestStreak": longest,
+        "lastActiveDay": days[-1] if days else None,
+    }
+
+
+async def repair_stats() -> Dict[str, Any]:
+    """Recompute every user's counters from their attempts (overwrites stored stats)"""
+    per_user: Dict[Any, List[Dict[str, Any]]] = {}
+    async for attempt in get_attempts_collection().find({}, ATTEMPT_STATS_PROJECTION):
+        per_user.setdefault(attempt["userId"], []).append(attempt)
+
+    operations = [
+        UpdateOne({"_id": user_id}, {"$set": {"stats": stats_from_attempts(attempts)}})
+        for user_id, attempts in per_user.items()
+    ]
+
+    users_col = get_users_collection()
+    for start in range(0, len(operations), BULK_WRITE_BATCH):
+        await users_col.bulk_write(operations[start:start + BULK_WRITE_BATCH], ordered=False)
+
+    summary = {"users": len(operations)}
+    logger.info(f"User stats repair: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    from db.mongodb import MongoDB
+
+    async def _main():
+        await MongoDB.connect()
+        try:
+            print(await repair_stats())
+        finally:
+            await MongoDB.disconnect()
+
+    asyncio.run(_main())
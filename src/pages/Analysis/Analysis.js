@@ -29,7 +29,7 @@ function Analysis() {
     const fetchAnalysis = async () => {
         try {
             if (attemptData?.attemptId) {
-                const result = await studentService.getAttemptAnalysis(attemptData.attemptId);
+                const result = await studentService.getAttemptAnalysis(attemptData.attemptId, 'score,aiAnalysis.detective');
 
                 if (result.success) {
                     const backendScore = result.analysis.score;
@@ -33,7 +33,7 @@ function TutorSession() {
 
     const fetchAttemptDetails = async () => {
         try {
-            const result = await studentService.getAttemptAnalysis(attemptId);
+            const result = await studentService.getAttemptAnalysis(attemptId, 'score,responses,aiAnalysis.tutor');
             if (result.success) {
                 setAttempt(result.analysis);
             } else {
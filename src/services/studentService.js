@@ -40,10 +40,11 @@ export const studentService = {
     /**
      * Get detailed attempt with AI analysis
      * @param {string} attemptId - Attempt ID
+     * @param {string} [fields] - Comma-separated fields to return, e.g. 'score,submittedAt'
      */
-    getAttemptDetail: async (attemptId) => {
+    getAttemptDetail: async (attemptId, fields) => {
         try {
-            const attempt = await api.get(`/students/attempts/${attemptId}`);
+            const attempt = await api.get(`/students/attempts/${attemptId}`, fields ? { fields } : {});
             return { success: true, attempt };
         } catch (error) {
             console.error('Failed to get attempt detail:', error);
@@ -51,13 +52,44 @@ export const studentService = {
         }
     },
 
+    /**
+     * Get one agent's analysis panel for an attempt
+     * @param {string} attemptId - Attempt ID
+     * @param {string} agent - architect | detective | tutor | strategist
+     */
+    getAttemptAgentAnalysis: async (attemptId, agent) => {
+        try {
+            const panel = await api.get(`/students/attempts/${attemptId}/analysis/${agent}`);
+            return { success: true, panel };
+        } catch (error) {
+            console.error(`Failed to get ${agent} analysis:`, error);
+            return { success: false, error: error.message, panel: null };
+        }
+    },
+
+    /**
+     * Get an attempt's scored responses
+     * @param {string} attemptId - Attempt ID
+     * @param {string} [section] - Only this section's responses
+     */
+    getAttemptResponses: async (attemptId, section) => {
+        try {
+            const result = await api.get(`/students/attempts/${attemptId}/responses`, section ? { section } : {});
+            return { success: true, responses: result.responses };
+        } catch (error) {
+            console.error('Failed to get attempt responses:', error);
+            return { success: false, error: error.message, responses: [] };
+        }
+    },
+
     /**
      * Get analysis for a specific attempt
      * @param {string} attemptId - Attempt ID
+     * @param {string} [fields] - Only these fields, e.g. 'score,aiAnalysis.detective' (agent outputs are loaded per panel)
      */
-    getAttemptAnalysis: async (attemptId) => {
+    getAttemptAnalysis: async (attemptId, fields) => {
         try {
-            const analysis = await api.get(`/students/attempts/${attemptId}`);
+            const analysis = await api.get(`/students/attempts/${attemptId}`, fields ? { fields } : {});
             // The backend returns { ..., aiAnalysis: ... }
             // We map it to { analysis: { ...attempt, aiAnalysis } } format expected by frontend
             return {
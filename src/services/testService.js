@@ -41,7 +41,7 @@ export const testService = {
             return {
                 success: true,
                 test: data.test,
-                questions: data.questions
+                questions: withPassages(data)
             };
         } catch (error) {
             console.error('Failed to get test:', error);
@@ -64,7 +64,7 @@ export const testService = {
                 attemptId: `attempt_${Date.now()}`,
                 startedAt: new Date().toISOString(),
                 test: data.test,
-                questions: data.questions,
+                questions: withPassages(data),
             };
         } catch (error) {
             console.error('Failed to start test:', error);
@@ -114,7 +114,7 @@ export const testService = {
 
     /**
      * Create AI-generated test
-     * @param {Object} config - { name, sections, difficulty, questionCount, duration, focusTopics }
+     * @param {Object} config - { name, sections, difficulty, questionCount, duration, focusTopics, mode, difficultyMix }
      */
     createAITest: async (config) => {
         try {
@@ -125,6 +125,8 @@ export const testService = {
                 question_count: config.questionCount,
                 duration: config.duration,
                 focus_topics: config.focusTopics || [],
+                mode: config.mode || 'ai',
+                difficulty_mix: config.difficultyMix || null,
             });
             return {
                 success: true,
@@ -169,6 +171,17 @@ export const testService = {
     },
 };
 
+/**
+ * Put each question's shared passage back on it
+ * (test payloads send every RC/DILR passage once, in `passages`, keyed by `passageId`)
+ */
+const withPassages = (data) => {
+    const passages = data.passages || {};
+    return (data.questions || []).map(q => (
+        q.passageId ? { ...q, passage: passages[q.passageId] ?? q.passage ?? null } : q
+    ));
+};
+
 /**
  * Group questions by section for navigation
  */